@@ -2,6 +2,11 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The real-time order stream (/api/eventos/) is an async view and needs an ASGI
+server, e.g. ``gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker``
+(uvicorn is in requirements.txt). Under the WSGI entry point (backend.wsgi) the
+stream still works, but each open connection holds a whole sync worker for as
+long as the client stays connected.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
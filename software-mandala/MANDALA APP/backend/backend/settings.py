@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
+from corsheaders.defaults import default_headers
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
@@ -124,6 +125,8 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
     r"^https://mandala-proyect\.vercel\.app$",   # Permite la URL de producción principal
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Los tablets envían Idempotency-Key para que los reintentos no dupliquen pedidos
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 CSRF_TRUSTED_ORIGINS = [
     "https://mandala-proyect.vercel.app",
     "https://*.vercel.app" # Soporta dinámicamente todos los previews de Vercel
@@ -195,6 +198,26 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Hora local en la que cambia la jornada (día de negocio) de los pedidos.
+# Con 0 la jornada coincide con la fecha calendario; para una noche de 8pm a 4am usar p. ej. 6.
+JORNADA_HORA_CORTE = int(os.environ.get('JORNADA_HORA_CORTE', 0))
+
+# Broker de eventos en tiempo real (/api/eventos/). En memoria sirve para un solo proceso;
+# con varios workers definir REDIS_URL para compartir los eventos vía Redis.
+REDIS_URL = os.environ.get('REDIS_URL')
+EVENT_BROKER = os.environ.get(
+    'EVENT_BROKER',
+    'bar_app.services.event_service.RedisBroker' if REDIS_URL else 'bar_app.services.event_service.InProcessBroker'
+)
+
+# Contabilidad de stock diferida: los despachos registran deltas (DeltaStock) sin bloquear
+# Producto y `manage.py consolidar_stock` los aplica. El stock mostrado siempre es exacto.
+# Al desactivarlo, correr consolidar_stock una última vez.
+STOCK_DIFERIDO = os.environ.get('STOCK_DIFERIDO') == 'True'
+
+# Horas que se guarda la respuesta de una petición con Idempotency-Key
+IDEMPOTENCIA_TTL_HORAS = int(os.environ.get('IDEMPOTENCIA_TTL_HORAS', 24))
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
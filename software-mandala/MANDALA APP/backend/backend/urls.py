@@ -7,11 +7,12 @@ from rest_framework.routers import DefaultRouter
 from bar_app.views import ProductoViewSet
 from bar_app import views
 from bar_app.views import MovimientoViewSet, MeseraTotalPedidosView, DebugStorageView, ReporteVentasDiariasView # Importamos la nueva vista
-from bar_app.views import PedidoViewSet, MesaViewSet, MeseraViewSet, UserViewSet, EmpresaConfigViewSet
+from bar_app.views import PedidoViewSet, MesaViewSet, MeseraViewSet, UserViewSet, EmpresaConfigViewSet, ConteoViewSet
 
 router = DefaultRouter()
 router.register(r'productos', ProductoViewSet)
 router.register(r'movimientos', MovimientoViewSet, basename='movimiento')
+router.register(r'conteos', ConteoViewSet, basename='conteo')
 router.register(r'pedidos', PedidoViewSet, basename='pedido')
 router.register(r'mesas', MesaViewSet, basename='mesa')
 router.register(r'meseras', MeseraViewSet, basename='mesera')
@@ -30,9 +31,11 @@ urlpatterns = [
 
     path('api/meseras/total-pedidos/', MeseraTotalPedidosView.as_view(), name='mesera-total-pedidos'), # URL específica primero
     path('api/reportes/ventas-diarias/', ReporteVentasDiariasView.as_view(), name='reporte-ventas-diarias'),
+    path('api/reportes/tiempos-despacho/', views.tiempos_despacho, name='reporte-tiempos-despacho'),
     path('api/login/', views.LoginView.as_view(), name='login'), # Login Admin/Bartender
     path('api/verificar-codigo-mesera/', views.verificar_codigo_mesera, name='verificar-codigo-mesera'), # Verificación segura de PIN
     path('api/total-pedidos-mesera-hoy/', views.total_pedidos_mesera_hoy, name='total-pedidos-mesera-hoy'),
+    path('api/eventos/', views.eventos_pedidos, name='eventos-pedidos'), # Push en tiempo real (SSE, requiere ASGI)
     path('api/', include(router.urls)), # Restauramos el prefijo 'api/'
 ]
 
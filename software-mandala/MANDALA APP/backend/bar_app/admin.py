@@ -1,9 +1,11 @@
 from django.contrib import admin
-from .models import Producto, Mesera, Mesa, Pedido, PedidoProducto, Movimiento
+from .models import Categoria, Producto, Mesera, Mesa, Pedido, PedidoProducto, Movimiento, ConteoInventario
 
+admin.site.register(Categoria)
 admin.site.register(Producto)
 admin.site.register(Mesera)
 admin.site.register(Mesa)
 admin.site.register(Pedido)
 admin.site.register(PedidoProducto)
 admin.site.register(Movimiento)
+admin.site.register(ConteoInventario)
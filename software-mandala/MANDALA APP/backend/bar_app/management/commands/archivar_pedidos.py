@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from bar_app.services.archive_service import ArchiveService
+
+class Command(BaseCommand):
+    help = (
+        'Mueve a PedidoArchivo, por tramos, los pedidos finalizados o cancelados con más de N días. '
+        'Los reportes siguen incluyéndolos. Si se interrumpe, volver a ejecutarlo continúa donde quedó.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=ArchiveService.DIAS, help='Antigüedad mínima en jornadas.')
+        parser.add_argument('--lote', type=int, default=ArchiveService.LOTE, help='Pedidos por transacción.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa lo que se archivaría.')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1: la jornada actual nunca se archiva.')
+
+        def progreso(resumen):
+            self.stdout.write(
+                f"  {resumen['pedidos']} pedidos, {resumen['items']} items (último ID: {resumen['ultimo_pk']})"
+            )
+
+        resumen = ArchiveService.archivar(
+            dias=options['dias'], lote=options['lote'], dry_run=options['dry_run'], progreso=progreso
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Se archivarían {resumen['pedidos']} pedidos ({resumen['items']} items) "
+                f"con más de {options['dias']} días."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Se archivaron {resumen['pedidos']} pedidos ({resumen['items']} items)."
+            ))
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from bar_app.models import Pedido, PedidoProducto, Producto, Mesa, calcular_jornada
+from bar_app.views import PedidoViewSet
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide tamaño de respuesta, queries y tiempo del listado de pedidos en sus variantes '
+        '(completa, compacta, compacta con items, fields, rapido). Verifica que ?rapido=true produzca '
+        'el mismo JSON que la vista completa. Usa datos sintéticos y revierte todo al terminar.'
+    )
+
+    VARIANTES = [
+        ('completa', {}),
+        ('compacta', {'vista': 'compacta'}),
+        ('compacta+items', {'vista': 'compacta', 'expand': 'items'}),
+        ('fields=id,mesa,estado,total', {'fields': 'id,mesa,estado,total'}),
+        ('rapido', {'rapido': 'true'}),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=200, help='Pedidos sintéticos a crear.')
+        parser.add_argument('--items', type=int, default=6, help='Items por pedido.')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por variante.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._crear_datos(options['pedidos'], options['items'])
+            vista = PedidoViewSet.as_view({'get': 'list'})
+            # El host por defecto de APIRequestFactory ('testserver') no está en ALLOWED_HOSTS
+            host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+            factory = APIRequestFactory(SERVER_NAME=host, HTTP_HOST=host)
+
+            contenidos = {}
+            self.stdout.write(f"{'variante':<30}{'bytes':>10}{'queries':>10}{'ms':>10}")
+            for nombre, params in self.VARIANTES:
+                params = {**params, 'page_size': options['pedidos']}
+                tiempos = []
+                for _ in range(options['repeticiones']):
+                    request = factory.get('/api/pedidos/', params)
+                    with CaptureQueriesContext(connection) as queries:
+                        inicio = time.perf_counter()
+                        response = vista(request)
+                        response.render()
+                        tiempos.append((time.perf_counter() - inicio) * 1000)
+                # Se comparan los resultados: el enlace `next` repite los parámetros
+                contenidos[nombre] = JSONRenderer().render(response.data['results'])
+                self.stdout.write(
+                    f"{nombre:<30}{len(response.content):>10}{len(queries.captured_queries):>10}{min(tiempos):>10.1f}"
+                )
+
+            transaction.set_rollback(True)
+
+        if contenidos['rapido'] != contenidos['completa']:
+            raise CommandError('La ruta ?rapido=true no produce el mismo JSON que la vista completa.')
+        self.stdout.write(self.style.SUCCESS('Paridad OK: ?rapido=true produce el mismo JSON.'))
+
+    def _crear_datos(self, num_pedidos, num_items):
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Benchmark {i}', precio=1000 + i, stock=1000) for i in range(num_items)
+        ])
+        mesa = Mesa.objects.create(numero='BENCH')
+        jornada = calcular_jornada()
+        pedidos = Pedido.objects.bulk_create([
+            Pedido(mesa=mesa, jornada=jornada, total=0) for _ in range(num_pedidos)
+        ])
+        PedidoProducto.objects.bulk_create([
+            PedidoProducto(pedido=pedido, producto=producto, cantidad=2, precio_unitario=producto.precio)
+            for pedido in pedidos
+            for producto in productos
+        ])
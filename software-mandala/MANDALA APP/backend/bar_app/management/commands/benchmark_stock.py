@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import override_settings
+from bar_app.models import Producto, DeltaStock
+from bar_app.services.stock_service import StockService
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el throughput de N despachadores concurrentes descontando stock de los mismos '
+        'productos, en modo directo (bloqueo de Producto) y diferido (DeltaStock). '
+        'Crea productos temporales y los elimina al terminar. Pensado para PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--despachadores', type=int, default=8, help='Hilos concurrentes.')
+        parser.add_argument('--despachos', type=int, default=200, help='Despachos por hilo.')
+        parser.add_argument('--productos', type=int, default=3, help='Productos "calientes" compartidos.')
+        parser.add_argument('--trabajo-ms', type=float, default=2,
+                            help='Tiempo simulado del resto de la transacción de despacho.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and options['despachadores'] > 1:
+            # SQLite no admite escritores concurrentes ("database is locked")
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializa todas las escrituras: se usa un solo despachador y '
+                'los resultados solo verifican la exactitud del stock.'
+            ))
+            options['despachadores'] = 1
+
+        stock_inicial = 10 ** 6
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Benchmark stock {i}', stock=stock_inicial) for i in range(options['productos'])
+        ])
+        producto_ids = sorted(producto.pk for producto in productos)
+
+        try:
+            self.stdout.write(f"{'modo':<12}{'despachos/s':>14}{'segundos':>12}")
+            for modo, diferido in [('directo', False), ('diferido', True)]:
+                with override_settings(STOCK_DIFERIDO=diferido):
+                    segundos = self._medir(producto_ids, options)
+                    StockService.consolidar()
+                total = options['despachadores'] * options['despachos']
+                self.stdout.write(f"{modo:<12}{total / segundos:>14.0f}{segundos:>12.2f}")
+
+            esperado = stock_inicial - 2 * options['despachadores'] * options['despachos']
+            stocks = set(Producto.objects.filter(pk__in=producto_ids).values_list('stock', flat=True))
+            if stocks != {esperado}:
+                raise CommandError(f'Stock final inconsistente: {stocks}, esperado {esperado}')
+            self.stdout.write(self.style.SUCCESS('Stock final exacto en ambos modos.'))
+        finally:
+            DeltaStock.objects.filter(producto_id__in=producto_ids).delete()
+            Producto.objects.filter(pk__in=producto_ids).delete()
+
+    def _medir(self, producto_ids, options):
+        trabajo = options['trabajo_ms'] / 1000
+
+        def despachador():
+            try:
+                for _ in range(options['despachos']):
+                    with transaction.atomic():
+                        StockService.bloquear(producto_ids)
+                        StockService.aplicar_deltas({pk: -1 for pk in producto_ids})
+                        time.sleep(trabajo)
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['despachadores']) as pool:
+            for futuro in [pool.submit(despachador) for _ in range(options['despachadores'])]:
+                futuro.result()
+        return time.perf_counter() - inicio
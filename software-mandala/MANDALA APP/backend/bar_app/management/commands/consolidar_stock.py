@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from bar_app.services.stock_service import StockService
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica a Producto.stock los deltas de stock pendientes (modo STOCK_DIFERIDO). '
+        'Con --intervalo queda corriendo como proceso de fondo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=StockService.LOTE_CONSOLIDACION,
+                            help='Máximo de deltas por transacción.')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Segundos entre pasadas. 0 consolida todo una vez y termina.')
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                consolidados = StockService.consolidar(options['lote'])
+                total += consolidados
+                if consolidados < options['lote']:
+                    break
+
+            if not options['intervalo']:
+                self.stdout.write(self.style.SUCCESS(f'{total} deltas de stock consolidados.'))
+                return
+            if total:
+                self.stdout.write(f'{total} deltas de stock consolidados.')
+            time.sleep(options['intervalo'])
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from bar_app.models import Pedido, PedidoProducto, Producto, Mesera, Mesa
+from bar_app.models import Pedido, PedidoProducto, Producto, Mesera, Mesa, calcular_jornada
 import random
 
 class Command(BaseCommand):
@@ -48,6 +48,7 @@ class Command(BaseCommand):
 
         # 5. Actualizar la fecha del pedido a la fecha deseada
         pedido.fecha_hora = fecha_pedido
+        pedido.jornada = calcular_jornada(fecha_pedido)
         pedido.save()
         
         self.stdout.write(self.style.SUCCESS(f'✅ Pedido de prueba creado exitosamente para la fecha: {fecha_pedido.strftime("%Y-%m-%d")}'))
\ No newline at end of file
@@ -1,21 +1,58 @@
 from django.core.management.base import BaseCommand
 from bar_app.models import Pedido
+from bar_app.services.purge_service import PurgeService
 
 class Command(BaseCommand):
-    help = 'Elimina todos los pedidos de la base de datos de forma permanente.'
+    help = (
+        'Elimina pedidos de forma permanente por tramos, devolviendo el stock despachado. '
+        'Si se interrumpe, volver a ejecutarlo continúa donde quedó.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--confirmar',
             action='store_true',
-            help='Confirma la eliminación de todos los pedidos.',
+            help='Confirma la eliminación de los pedidos.',
         )
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa lo que se eliminaría.')
+        parser.add_argument('--antes-de', help='Solo pedidos con jornada anterior a esta fecha (AAAA-MM-DD).')
+        parser.add_argument('--desde-id', type=int, help='Continuar después de este ID de pedido.')
+        parser.add_argument('--lote', type=int, default=PurgeService.LOTE, help='Pedidos por transacción.')
+        parser.add_argument('--sin-stock', action='store_true', help='No devolver al stock lo despachado.')
 
     def handle(self, *args, **options):
-        if not options['confirmar']:
-            self.stdout.write(self.style.WARNING('Esta acción es irreversible y eliminará todos los pedidos.'))
+        queryset = Pedido.objects.all()
+        if options['antes_de']:
+            queryset = queryset.filter(jornada__lt=options['antes_de'])
+        alcance = f"con jornada anterior a {options['antes_de']}" if options['antes_de'] else "todos los pedidos"
+
+        if not options['confirmar'] and not options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Esta acción es irreversible y eliminará {alcance}.'))
             self.stdout.write(self.style.WARNING('Para confirmar, ejecuta el comando con la opción: --confirmar'))
+            self.stdout.write(self.style.WARNING('Para ver qué se eliminaría, usa: --dry-run'))
             return
 
-        num_pedidos, _ = Pedido.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS(f'Se eliminaron exitosamente {num_pedidos} pedidos.'))
\ No newline at end of file
+        def progreso(resumen):
+            self.stdout.write(
+                f"  {resumen['pedidos']} pedidos, {resumen['items']} items (último ID: {resumen['ultimo_pk']})"
+            )
+
+        resumen = PurgeService.purgar(
+            queryset,
+            lote=options['lote'],
+            devolver_stock=not options['sin_stock'],
+            dry_run=options['dry_run'],
+            desde_pk=options['desde_id'],
+            progreso=progreso,
+        )
+
+        unidades = sum(resumen['stock_devuelto'].values())
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Se eliminarían {resumen['pedidos']} pedidos ({resumen['items']} items) y se devolverían "
+                f"{unidades} unidades a {len(resumen['stock_devuelto'])} productos."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Se eliminaron exitosamente {resumen['pedidos']} pedidos y se devolvieron {unidades} unidades al stock."
+            ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from bar_app.services.idempotency_service import IdempotencyService
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina las claves de idempotencia guardadas hace más de IDEMPOTENCIA_TTL_HORAS. '
+        'Las de la sincronización offline se conservan.'
+    )
+
+    def handle(self, *args, **options):
+        eliminadas = IdempotencyService.limpiar_expiradas()
+        self.stdout.write(self.style.SUCCESS(f'{eliminadas} claves de idempotencia eliminadas.'))
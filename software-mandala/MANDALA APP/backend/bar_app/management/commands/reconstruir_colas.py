@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bar_app.services.station_service import StationService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la cola de items pendientes de cada estación a partir de los pedidos abiertos.'
+
+    def handle(self, *args, **options):
+        total = StationService.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Colas reconstruidas. {total} items pendientes.'))
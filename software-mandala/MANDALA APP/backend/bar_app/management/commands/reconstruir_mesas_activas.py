@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bar_app.services.order_service import OrderService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el pedido activo y el estado de cada mesa a partir de los pedidos del día.'
+
+    def handle(self, *args, **options):
+        cambios = OrderService.reconstruir_mesas_activas()
+        self.stdout.write(self.style.SUCCESS(f'Punteros reconstruidos. {cambios} mesas corregidas.'))
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from bar_app.models import calcular_jornada
+from bar_app.services.ledger_service import LedgerService
+
+
+class Command(BaseCommand):
+    help = (
+        'Guarda el stock de cada producto al cierre de una jornada (por defecto la anterior). '
+        'Programarlo una vez por jornada acota las consultas de stock histórico.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jornada', help='Jornada a guardar (AAAA-MM-DD). Por defecto, la última cerrada.')
+        parser.add_argument('--dias', type=int, default=1, help='Cantidad de jornadas hacia atrás a guardar.')
+
+    def handle(self, *args, **options):
+        try:
+            ultima = date.fromisoformat(options['jornada']) if options['jornada'] else calcular_jornada() - timedelta(days=1)
+        except ValueError:
+            raise CommandError('--jornada debe tener el formato AAAA-MM-DD.')
+
+        for atras in range(options['dias'] - 1, -1, -1):
+            jornada = ultima - timedelta(days=atras)
+            try:
+                productos = LedgerService.snapshot(jornada)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'Jornada {jornada}: stock de {productos} productos guardado.'))
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from bar_app.models import Producto
+from bar_app.services.ledger_service import LedgerService
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el stock de cada producto con el que explica el libro de movimientos '
+        '(último snapshot más movimientos posteriores), por tramos en paralelo, y opcionalmente repara.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=4, help='Tramos verificados en paralelo.')
+        parser.add_argument('--lote', type=int, default=500, help='Productos por tramo.')
+        parser.add_argument(
+            '--reparar', choices=[LedgerService.REPARAR_STOCK, LedgerService.REPARAR_LIBRO],
+            help=(
+                "'stock': deja Producto.stock como dice el libro (un UPDATE); requiere un snapshot "
+                "(snapshot_stock) como base, porque el stock inicial y los despachos anteriores al libro "
+                "no tienen movimientos. "
+                "'libro': registra Ajustes para que el libro cuadre con el stock actual (un INSERT)."
+            )
+        )
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Ignora los snapshots y usa todo el historial (detecta derivas anteriores al último snapshot).'
+        )
+        parser.add_argument('--mostrar', type=int, default=50, help='Máximo de diferencias a listar.')
+
+    def handle(self, *args, **options):
+        hilos = options['hilos']
+        if connection.vendor == 'sqlite' and hilos > 1:
+            # Cada hilo abre su propia conexión: con SQLite en memoria serían bases distintas
+            self.stdout.write(self.style.WARNING('SQLite: se verifica en un solo hilo.'))
+            hilos = 1
+
+        base = None if options['completo'] else LedgerService.base_verificacion()
+        if base is None and options['reparar'] == LedgerService.REPARAR_STOCK:
+            # Sin snapshot, el libro no incluye el stock inicial ni los despachos previos a él:
+            # "reparar" el stock lo reemplazaría por una suma incompleta
+            raise CommandError(
+                '--reparar stock necesita un snapshot de stock como base (y no se puede combinar con --completo). '
+                'Genera uno con `manage.py snapshot_stock` o usa --reparar libro.'
+            )
+        if base is None:
+            self.stdout.write(self.style.WARNING(
+                'No hay snapshots de stock: el esperado se calcula con todo el historial de movimientos, '
+                'que debe estar completo desde la creación de cada producto.'
+            ))
+
+        ids = list(Producto.objects.order_by('pk').values_list('pk', flat=True))
+        tramos = [ids[i:i + options['lote']] for i in range(0, len(ids), options['lote'])]
+
+        def verificar(tramo):
+            try:
+                return LedgerService.diferencias(Producto.objects.filter(pk__gte=tramo[0], pk__lte=tramo[-1]), base)
+            finally:
+                if hilos > 1:
+                    connections.close_all()
+
+        inicio = time.perf_counter()
+        if hilos > 1:
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                resultados = list(pool.map(verificar, tramos))
+        else:
+            resultados = [verificar(tramo) for tramo in tramos]
+        diferencias = [diferencia for resultado in resultados for diferencia in resultado]
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f'{len(ids)} productos verificados en {len(tramos)} tramos y {segundos:.2f}s: '
+            f'{len(diferencias)} con diferencias.'
+        )
+        if diferencias:
+            self.stdout.write(f"{'ID':>8}  {'producto':<30}{'real':>10}{'esperado':>10}{'diferencia':>12}")
+            for pk, nombre, real, esperado in diferencias[:options['mostrar']]:
+                self.stdout.write(f'{pk:>8}  {nombre[:30]:<30}{real:>10}{esperado:>10}{real - esperado:>+12}')
+            if len(diferencias) > options['mostrar']:
+                self.stdout.write(f'... y {len(diferencias) - options["mostrar"]} más.')
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('El stock cuadra con el libro de movimientos.'))
+        elif options['reparar']:
+            reparadas = LedgerService.reparar(
+                [pk for pk, _, _, _ in diferencias], options['reparar'], base, usuario='verificar_stock'
+            )
+            self.stdout.write(self.style.SUCCESS(f"Reparadas {len(reparadas)} diferencias (modo {options['reparar']})."))
+        else:
+            self.stdout.write(self.style.WARNING('Para corregirlas, usa --reparar stock o --reparar libro.'))
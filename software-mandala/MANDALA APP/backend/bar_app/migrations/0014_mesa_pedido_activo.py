@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def poblar_pedido_activo(apps, schema_editor):
+    Mesa = apps.get_model('bar_app', 'Mesa')
+    Pedido = apps.get_model('bar_app', 'Pedido')
+
+    activo = Pedido.objects.filter(
+        mesa=OuterRef('pk'),
+        estado__in=['pendiente', 'despachado'],
+        fecha_hora__date=timezone.localdate()
+    ).order_by('-fecha_hora')
+
+    Mesa.objects.update(pedido_activo=Subquery(activo.values('pk')[:1]))
+    Mesa.objects.filter(pedido_activo__isnull=False).update(estado='ocupada')
+    Mesa.objects.filter(pedido_activo__isnull=True).update(estado='disponible')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0013_alter_categoria_options_alter_empresaconfig_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mesa',
+            name='pedido_activo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bar_app.pedido'),
+        ),
+        migrations.RunPython(poblar_pedido_activo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:10
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+
+def poblar_jornada(apps, schema_editor):
+    Pedido = apps.get_model('bar_app', 'Pedido')
+    Pedido.objects.filter(jornada__isnull=True).update(
+        jornada=TruncDate(F('fecha_hora') - timedelta(hours=settings.JORNADA_HORA_CORTE))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0014_mesa_pedido_activo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='jornada',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(poblar_jornada, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='pedido',
+            name='jornada',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['jornada', 'estado'], name='bar_app_ped_jornada_515838_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['mesa', 'estado', 'jornada'], name='bar_app_ped_mesa_id_bde769_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['mesera', 'jornada'], name='bar_app_ped_mesera__b2767f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', 'jornada'], name='bar_app_ped_usuario_71a5ae_idx'),
+        ),
+    ]
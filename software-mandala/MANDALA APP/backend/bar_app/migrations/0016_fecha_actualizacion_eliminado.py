@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0015_pedido_jornada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mesa',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='Eliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('pedido', 'Pedido'), ('mesa', 'Mesa')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Eliminado',
+                'verbose_name_plural': 'Eliminados',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['modelo', 'fecha'], name='bar_app_eli_modelo_c421ba_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0016_fecha_actualizacion_eliminado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['-fecha', '-id'], name='bar_app_mov_fecha_a06519_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha_hora', '-id'], name='bar_app_ped_fecha_h_725dc5_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0017_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0018_pedido_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeltaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas_stock', to='bar_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Delta de stock',
+                'verbose_name_plural': 'Deltas de stock',
+            },
+        ),
+    ]
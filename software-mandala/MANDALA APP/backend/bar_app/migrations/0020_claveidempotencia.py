@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0019_deltastock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255, unique=True)),
+                ('huella', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('respuesta', models.JSONField(null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0020_claveidempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArchivo',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('mesa_numero', models.CharField(max_length=10)),
+                ('fecha_hora', models.DateTimeField()),
+                ('jornada', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('despachado', 'Despachado'), ('finalizada', 'Finalizada'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('items', models.JSONField(default=list)),
+                ('fecha_archivo', models.DateTimeField(auto_now_add=True)),
+                ('mesera', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos_archivados', to='bar_app.mesera')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos_archivados', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pedido archivado',
+                'verbose_name_plural': 'Pedidos archivados',
+                'ordering': ['-fecha_hora'],
+                'indexes': [models.Index(fields=['jornada', 'estado'], name='bar_app_ped_jornada_981e01_idx'), models.Index(fields=['mesera', 'jornada'], name='bar_app_ped_mesera__50c415_idx'), models.Index(fields=['usuario', 'jornada'], name='bar_app_ped_usuario_00d704_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def poblar_cola(apps, schema_editor):
+    PedidoProducto = apps.get_model('bar_app', 'PedidoProducto')
+    ItemPendiente = apps.get_model('bar_app', 'ItemPendiente')
+    pendientes = PedidoProducto.objects.filter(
+        pedido__estado__in=['pendiente', 'despachado'], cantidad__gt=F('cantidad_despachada')
+    ).values_list('pk', 'pedido_id', 'pedido__fecha_hora', 'producto__categoria_rel__estacion')
+    ItemPendiente.objects.bulk_create([
+        ItemPendiente(item_id=item_id, pedido_id=pedido_id, fecha=fecha, estacion=estacion or 'barra')
+        for item_id, pedido_id, fecha, estacion in pendientes.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0021_pedidoarchivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='estacion',
+            field=models.CharField(choices=[('barra', 'Barra principal'), ('barra_vip', 'Barra VIP'), ('cocina', 'Cocina')], default='barra', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ItemPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estacion', models.CharField(choices=[('barra', 'Barra principal'), ('barra_vip', 'Barra VIP'), ('cocina', 'Cocina')], max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='en_cola', to='bar_app.pedidoproducto')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bar_app.pedido')),
+            ],
+            options={
+                'verbose_name': 'Item pendiente',
+                'verbose_name_plural': 'Items pendientes',
+                'indexes': [models.Index(fields=['estacion', 'fecha', 'id'], name='bar_app_ite_estacio_8a041d_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_cola, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0022_estaciones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha_cierre',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha_despacho',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='TiempoDespacho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pedido_id', models.BigIntegerField()),
+                ('item_id', models.BigIntegerField()),
+                ('estacion', models.CharField(choices=[('barra', 'Barra principal'), ('barra_vip', 'Barra VIP'), ('cocina', 'Cocina')], max_length=20)),
+                ('jornada', models.DateField()),
+                ('solicitado', models.DateTimeField()),
+                ('despachado', models.DateTimeField()),
+                ('espera', models.PositiveIntegerField()),
+                ('mesera', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bar_app.mesera')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tiempo de despacho',
+                'verbose_name_plural': 'Tiempos de despacho',
+                'indexes': [models.Index(fields=['jornada', 'estacion'], name='bar_app_tie_jornada_9f6b96_idx'), models.Index(fields=['pedido_id'], name='bar_app_tie_pedido__263493_idx')],
+            },
+        ),
+    ]
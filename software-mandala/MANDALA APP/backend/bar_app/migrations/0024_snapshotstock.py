@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0023_tiempos_despacho'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jornada', models.DateField()),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='bar_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de stock',
+                'verbose_name_plural': 'Snapshots de stock',
+                'indexes': [models.Index(fields=['fecha'], name='bar_app_sna_fecha_7eeaf4_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'jornada'), name='snapshot_producto_jornada')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0024_snapshotstock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('abierto', 'Abierto'), ('cerrado', 'Cerrado'), ('cancelado', 'Cancelado')], default='abierto', max_length=10)),
+                ('usuario', models.CharField(max_length=100)),
+                ('notas', models.TextField(blank=True)),
+                ('fecha_apertura', models.DateTimeField()),
+                ('fecha_cierre', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Conteo de inventario',
+                'verbose_name_plural': 'Conteos de inventario',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'abierto')), fields=('estado',), name='un_conteo_abierto')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConteoLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_inicial', models.IntegerField()),
+                ('contado', models.PositiveIntegerField(blank=True, null=True)),
+                ('contado_por', models.CharField(blank=True, max_length=100)),
+                ('fecha_conteo', models.DateTimeField(blank=True, null=True)),
+                ('ajuste', models.IntegerField(blank=True, null=True)),
+                ('conteo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='bar_app.conteoinventario')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conteos', to='bar_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Línea de conteo',
+                'verbose_name_plural': 'Líneas de conteo',
+                'constraints': [models.UniqueConstraint(fields=('conteo', 'producto'), name='conteo_linea_producto')],
+            },
+        ),
+    ]
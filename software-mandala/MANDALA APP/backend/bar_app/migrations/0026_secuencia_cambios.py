@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+def crear_secuencia(apps, schema_editor):
+    SecuenciaCambios = apps.get_model('bar_app', 'SecuenciaCambios')
+    SecuenciaCambios.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bar_app', '0025_conteo_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaCambios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de cambios',
+                'verbose_name_plural': 'Secuencia de cambios',
+            },
+        ),
+        migrations.AddField(
+            model_name='eliminado',
+            name='cambio',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mesa',
+            name='cambio',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='cambio',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='eliminado',
+            index=models.Index(fields=['modelo', 'cambio'], name='bar_app_eli_modelo_f96729_idx'),
+        ),
+        migrations.RunPython(crear_secuencia, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,40 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def calcular_jornada(momento=None):
+    """
+    Retorna la jornada (día de negocio) a la que pertenece un instante.
+    Los pedidos antes de JORNADA_HORA_CORTE cuentan para el día anterior.
+    """
+    local = timezone.localtime(momento or timezone.now())
+    return (local - timedelta(hours=settings.JORNADA_HORA_CORTE)).date()
+
+
+def cierre_jornada(jornada):
+    """
+    Retorna el instante en que termina una jornada: el día siguiente a las JORNADA_HORA_CORTE.
+    """
+    return timezone.make_aware(datetime.combine(jornada + timedelta(days=1), time(hour=settings.JORNADA_HORA_CORTE)))
 
 
 class Categoria(models.Model):
+    # Estación (barra o cocina) que prepara los productos de la categoría
+    ESTACIONES = [
+        ("barra", "Barra principal"),
+        ("barra_vip", "Barra VIP"),
+        ("cocina", "Cocina"),
+    ]
+    ESTACION_DEFECTO = "barra"
+
     nombre = models.CharField(max_length=50, unique=True)
     imagen = models.ImageField(upload_to='categorias/', blank=True, null=True)
+    estacion = models.CharField(max_length=20, choices=ESTACIONES, default=ESTACION_DEFECTO)
 
     def __str__(self):
         return self.nombre
@@ -15,6 +45,21 @@ class Categoria(models.Model):
         ordering = ['nombre']
 
 
+class ProductoQuerySet(models.QuerySet):
+    def con_stock_pendiente(self):
+        """
+        Anota `stock_pendiente`: la suma de los DeltaStock aún no consolidados
+        (0 si STOCK_DIFERIDO está desactivado), para leer el stock exacto sin N+1.
+        """
+        if not settings.STOCK_DIFERIDO:
+            return self.annotate(stock_pendiente=Value(0))
+
+        pendiente = DeltaStock.objects.filter(
+            producto=OuterRef('pk')
+        ).order_by().values('producto').annotate(total=Sum('delta')).values('total')
+        return self.annotate(stock_pendiente=Coalesce(Subquery(pendiente), 0))
+
+
 class Producto(models.Model):
     nombre = models.CharField(max_length=100)
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
@@ -27,9 +72,23 @@ class Producto(models.Model):
     proveedor = models.CharField(max_length=100, blank=True, null=True)
     ubicacion = models.CharField(max_length=100, blank=True, null=True)
 
+    objects = ProductoQuerySet.as_manager()
+
     def __str__(self):
         return self.nombre
 
+    @property
+    def stock_actual(self):
+        """
+        Stock exacto: `stock` más los deltas aún no consolidados (modo STOCK_DIFERIDO).
+        """
+        if not settings.STOCK_DIFERIDO:
+            return self.stock
+        pendiente = getattr(self, 'stock_pendiente', None)
+        if pendiente is None:
+            pendiente = self.deltas_stock.aggregate(total=Sum('delta'))['total'] or 0
+        return self.stock + pendiente
+
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
@@ -49,6 +108,35 @@ class Mesera(models.Model):
         ordering = ['nombre']
 
 
+class MesaQuerySet(models.QuerySet):
+    def con_ocupacion(self):
+        """
+        Anota sobre cada mesa su pedido activo del día (id, vendedor, total y
+        número de items) siguiendo el puntero pedido_activo, en una sola query.
+        """
+        activo = Q(
+            pedido_activo__estado__in=['pendiente', 'despachado'],
+            pedido_activo__jornada=calcular_jornada()
+        )
+
+        def si_activo(campo):
+            return Case(When(activo, then=F(campo)), default=None)
+
+        items = PedidoProducto.objects.filter(
+            pedido=OuterRef('pedido_activo')
+        ).order_by().values('pedido').annotate(n=Count('pk')).values('n')
+
+        return self.annotate(
+            activo_pedido_id=si_activo('pedido_activo_id'),
+            activo_mesera_id=si_activo('pedido_activo__mesera_id'),
+            activo_mesera_nombre=si_activo('pedido_activo__mesera__nombre'),
+            activo_usuario_id=si_activo('pedido_activo__usuario_id'),
+            activo_usuario_username=si_activo('pedido_activo__usuario__username'),
+            activo_total=si_activo('pedido_activo__total'),
+            activo_items=Case(When(activo, then=Subquery(items)), default=None),
+        )
+
+
 class Mesa(models.Model):
     ESTADO_CHOICES = [
         ("disponible", "Disponible"),
@@ -58,6 +146,13 @@ class Mesa(models.Model):
     numero = models.CharField(max_length=10, unique=True)
     capacidad = models.IntegerField(default=1)
     estado = models.CharField(max_length=20, default="disponible", choices=ESTADO_CHOICES)
+    # Puntero desnormalizado al pedido abierto de la mesa. Lo mantiene OrderService.
+    pedido_activo = models.ForeignKey('Pedido', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Número de SecuenciaCambios del último cambio (lo escribe SyncService)
+    cambio = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    objects = MesaQuerySet.as_manager()
 
     def __str__(self):
         return f"Mesa {self.numero}"
@@ -81,13 +176,28 @@ class Pedido(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE)
     fecha_hora = models.DateTimeField(auto_now_add=True)
+    jornada = models.DateField(editable=False)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Se actualiza también cuando cambian sus items (lo garantiza OrderService)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+    # Número de SecuenciaCambios del último cambio, incluidos sus items (lo escribe SyncService)
+    cambio = models.BigIntegerField(default=0, db_index=True, editable=False)
+    # Se incrementa en cada cambio de estado (compare-and-swap en OrderService)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Ciclo de vida (los escribe OrderService): último despacho completo y cierre
+    fecha_despacho = models.DateTimeField(null=True, blank=True, editable=False)
+    fecha_cierre = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         vendedor = self.mesera.nombre if self.mesera else (self.usuario.username if self.usuario else "Desconocido")
         return f"Pedido #{self.id} - {vendedor} - {self.fecha_hora}"
 
+    def save(self, *args, **kwargs):
+        if self.jornada is None:
+            self.jornada = calcular_jornada(self.fecha_hora)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
@@ -97,6 +207,11 @@ class Pedido(models.Model):
             models.Index(fields=['estado']),
             models.Index(fields=['mesera']),
             models.Index(fields=['usuario']),
+            models.Index(fields=['jornada', 'estado']),
+            models.Index(fields=['mesa', 'estado', 'jornada']),
+            models.Index(fields=['mesera', 'jornada']),
+            models.Index(fields=['usuario', 'jornada']),
+            models.Index(fields=['-fecha_hora', '-id']),
         ]
 
 
@@ -128,6 +243,55 @@ class PedidoProducto(models.Model):
         ]
 
 
+class ItemPendiente(models.Model):
+    """
+    Cola de trabajo de una estación: una fila por item de pedido con unidades
+    por despachar. La mantiene StationService en cada creación, agregado,
+    despacho y cambio de estado, así cada estación lee solo lo pendiente.
+    """
+    item = models.OneToOneField(PedidoProducto, on_delete=models.CASCADE, related_name='en_cola')
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='+')
+    estacion = models.CharField(max_length=20, choices=Categoria.ESTACIONES)
+    fecha = models.DateTimeField(default=timezone.now)  # Desde cuándo espera
+
+    def __str__(self):
+        return f"{self.estacion}: item #{self.item_id} (Pedido #{self.pedido_id})"
+
+    class Meta:
+        verbose_name = "Item pendiente"
+        verbose_name_plural = "Items pendientes"
+        indexes = [
+            models.Index(fields=['estacion', 'fecha', 'id']),
+        ]
+
+
+class TiempoDespacho(models.Model):
+    """
+    Registro de cada item despachado: cuánto esperó en la cola de su estación.
+    Guarda ids sueltos del pedido y el item para sobrevivir al archivo de pedidos.
+    """
+    pedido_id = models.BigIntegerField()
+    item_id = models.BigIntegerField()
+    estacion = models.CharField(max_length=20, choices=Categoria.ESTACIONES)
+    mesera = models.ForeignKey(Mesera, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    jornada = models.DateField()
+    solicitado = models.DateTimeField()  # Desde cuándo esperaba en la cola
+    despachado = models.DateTimeField()
+    espera = models.PositiveIntegerField()  # Segundos
+
+    def __str__(self):
+        return f"{self.estacion}: item #{self.item_id} esperó {self.espera}s"
+
+    class Meta:
+        verbose_name = "Tiempo de despacho"
+        verbose_name_plural = "Tiempos de despacho"
+        indexes = [
+            models.Index(fields=['jornada', 'estacion']),
+            models.Index(fields=['pedido_id']),
+        ]
+
+
 class Movimiento(models.Model):
     TIPOS_MOVIMIENTO = [
         ("entrada", "Entrada"),
@@ -159,9 +323,133 @@ class Movimiento(models.Model):
         indexes = [
             models.Index(fields=['producto', 'fecha']),
             models.Index(fields=['tipo', 'fecha']),
+            models.Index(fields=['-fecha', '-id']),
+        ]
+
+
+class SnapshotStock(models.Model):
+    """
+    Stock de un producto al cierre de una jornada (comando snapshot_stock).
+    El stock en cualquier instante se obtiene del snapshot anterior más los
+    movimientos posteriores, sin recorrer todo el historial de Movimiento.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots')
+    jornada = models.DateField()
+    fecha = models.DateTimeField()  # Cierre de la jornada
+    stock = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.producto_id} al cierre de {self.jornada}: {self.stock}"
+
+    class Meta:
+        verbose_name = "Snapshot de stock"
+        verbose_name_plural = "Snapshots de stock"
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'jornada'], name='snapshot_producto_jornada'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha']),
+        ]
+
+
+class ConteoInventario(models.Model):
+    """
+    Sesión de conteo físico. Al abrirla se congela el stock de cada producto en
+    ConteoLinea; los contadores envían cantidades por lotes y al cerrarla las
+    diferencias se aplican como movimientos de Ajuste.
+    """
+    ESTADOS = [
+        ("abierto", "Abierto"),
+        ("cerrado", "Cerrado"),
+        ("cancelado", "Cancelado"),
+    ]
+
+    estado = models.CharField(max_length=10, choices=ESTADOS, default="abierto")
+    usuario = models.CharField(max_length=100)
+    notas = models.TextField(blank=True)
+    fecha_apertura = models.DateTimeField()
+    fecha_cierre = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Conteo #{self.pk} ({self.estado})"
+
+    class Meta:
+        verbose_name = "Conteo de inventario"
+        verbose_name_plural = "Conteos de inventario"
+        constraints = [
+            # Un solo conteo abierto a la vez
+            models.UniqueConstraint(fields=['estado'], condition=Q(estado='abierto'), name='un_conteo_abierto'),
         ]
 
 
+class ConteoLinea(models.Model):
+    """
+    Un producto dentro de un conteo: su stock al abrir y la cantidad contada.
+    `ajuste` queda guardado al cerrar (contado menos el stock esperado).
+    """
+    conteo = models.ForeignKey(ConteoInventario, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='conteos')
+    stock_inicial = models.IntegerField()
+    contado = models.PositiveIntegerField(null=True, blank=True)
+    contado_por = models.CharField(max_length=100, blank=True)
+    fecha_conteo = models.DateTimeField(null=True, blank=True)
+    ajuste = models.IntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Conteo #{self.conteo_id} - {self.producto_id}: {self.contado}"
+
+    class Meta:
+        verbose_name = "Línea de conteo"
+        verbose_name_plural = "Líneas de conteo"
+        constraints = [
+            models.UniqueConstraint(fields=['conteo', 'producto'], name='conteo_linea_producto'),
+        ]
+
+
+class Eliminado(models.Model):
+    """
+    Registro (tombstone) de objetos borrados, para que la sincronización
+    incremental pueda informar eliminaciones a los dispositivos.
+    """
+    MODELOS = [
+        ("pedido", "Pedido"),
+        ("mesa", "Mesa"),
+    ]
+
+    modelo = models.CharField(max_length=20, choices=MODELOS)
+    objeto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(auto_now_add=True)
+    cambio = models.BigIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} eliminado ({self.fecha})"
+
+    class Meta:
+        verbose_name = "Eliminado"
+        verbose_name_plural = "Eliminados"
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['modelo', 'fecha']),
+            models.Index(fields=['modelo', 'cambio']),
+        ]
+
+
+class SecuenciaCambios(models.Model):
+    """
+    Contador de cambios de la sincronización incremental (una sola fila).
+    Cada transacción que modifica pedidos o mesas lo incrementa justo antes de
+    confirmar, así que un número mayor siempre corresponde a un commit posterior.
+    """
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Cambio #{self.valor}"
+
+    class Meta:
+        verbose_name = "Secuencia de cambios"
+        verbose_name_plural = "Secuencia de cambios"
+
+
 class EmpresaConfig(models.Model):
     nombre = models.CharField(max_length=100, default="")
     nit = models.CharField(max_length=50, blank=True, null=True)
@@ -177,3 +465,76 @@ class EmpresaConfig(models.Model):
     class Meta:
         verbose_name = "Configuración de Empresa"
         verbose_name_plural = "Configuración de Empresa"
+
+
+class DeltaStock(models.Model):
+    """
+    Cambio de stock pendiente de aplicar a Producto.stock (modo STOCK_DIFERIDO).
+    Insertar un delta no bloquea la fila del producto; consolidar_stock los
+    suma y los aplica en lote.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='deltas_stock')
+    delta = models.IntegerField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.delta:+d} ({self.fecha})"
+
+    class Meta:
+        verbose_name = "Delta de stock"
+        verbose_name_plural = "Deltas de stock"
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta guardada de una petición enviada con Idempotency-Key, para que
+    los reintentos de los tablets reciban la misma respuesta sin repetir el pedido.
+    """
+    clave = models.CharField(max_length=255, unique=True)
+    huella = models.CharField(max_length=64)  # SHA-256 de método, ruta y cuerpo
+    status_code = models.PositiveSmallIntegerField()
+    respuesta = models.JSONField(null=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.clave} ({self.status_code})"
+
+    class Meta:
+        verbose_name = "Clave de idempotencia"
+        verbose_name_plural = "Claves de idempotencia"
+
+
+class PedidoArchivo(models.Model):
+    """
+    Pedido cerrado (finalizado o cancelado) que archivar_pedidos sacó de Pedido.
+    Conserva el id original y guarda sus items como JSON, para que la tabla
+    viva quede con los pedidos recientes y sus índices quepan en memoria.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    mesera = models.ForeignKey(
+        Mesera, on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos_archivados'
+    )
+    usuario = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos_archivados'
+    )
+    mesa_numero = models.CharField(max_length=10)
+    fecha_hora = models.DateTimeField()
+    jornada = models.DateField()
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # [{"producto_id", "producto_nombre", "cantidad", "cantidad_despachada", "precio_unitario"}]
+    items = models.JSONField(default=list)
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pedido archivado #{self.id} - Mesa {self.mesa_numero} - {self.fecha_hora}"
+
+    class Meta:
+        verbose_name = "Pedido archivado"
+        verbose_name_plural = "Pedidos archivados"
+        ordering = ['-fecha_hora']
+        indexes = [
+            models.Index(fields=['jornada', 'estado']),
+            models.Index(fields=['mesera', 'jornada']),
+            models.Index(fields=['usuario', 'jornada']),
+        ]
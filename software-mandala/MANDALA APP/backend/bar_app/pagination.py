@@ -0,0 +1,42 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset): la página N cuesta lo mismo que la primera.
+    Con ?paginar=false retorna la lista completa sin envolver, hasta
+    `limite_sin_paginar` filas; si hay más, pide usar la paginación.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    sin_paginar_query_param = 'paginar'
+    limite_sin_paginar = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.sin_paginar = request.query_params.get(self.sin_paginar_query_param) == 'false'
+        if not self.sin_paginar:
+            return super().paginate_queryset(queryset, request, view)
+
+        filas = list(queryset.order_by(*self.ordering)[:self.limite_sin_paginar + 1])
+        if len(filas) > self.limite_sin_paginar:
+            raise ValidationError({
+                'detail': f'La consulta supera {self.limite_sin_paginar} resultados. '
+                          f'Aplica más filtros o usa la paginación.'
+            })
+        return filas
+
+    def get_paginated_response(self, data):
+        if self.sin_paginar:
+            return Response(data)
+        return super().get_paginated_response(data)
+
+
+class PedidoPagination(KeysetPagination):
+    ordering = ('-fecha_hora', '-id')
+
+
+class MovimientoPagination(KeysetPagination):
+    ordering = ('-fecha', '-id')
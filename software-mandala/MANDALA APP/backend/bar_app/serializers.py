@@ -1,8 +1,58 @@
 from rest_framework import serializers
-from .models import Producto, Movimiento, Pedido, PedidoProducto, Mesa, Mesera, EmpresaConfig
+from .models import Producto, Movimiento, ConteoInventario, Pedido, PedidoProducto, Mesa, Mesera, EmpresaConfig
+from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+class CamposDinamicosMixin:
+    """
+    Salida configurable en lecturas (GET): ?fields=a,b limita los campos
+    y ?expand=items incluye los campos anidados opcionales (campos_expandibles).
+    """
+    campos_expandibles = {}
+
+    @staticmethod
+    def _parse_lista(valor):
+        return {v.strip() for v in (valor or '').split(',') if v.strip()}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+
+        expand = self._parse_lista(request.query_params.get('expand'))
+        for clave, campo in self.campos_expandibles.items():
+            if clave not in expand:
+                self.fields.pop(campo, None)
+
+        campos = self._parse_lista(request.query_params.get('fields'))
+        if campos:
+            for nombre in list(self.fields):
+                if nombre not in campos:
+                    self.fields.pop(nombre)
+
+
+def normalizar_categoria(nombre):
+    if not nombre:
+        return ""
+    # Normalize to match frontend filters (e.g. "Cerveza" -> "cerveza")
+    import unicodedata
+    normalized = unicodedata.normalize('NFD', nombre)
+    normalized = u"".join([c for c in normalized if not unicodedata.combining(c)])
+    # If the category is plural or singular, we try to match what frontend wants
+    # Frontend has: 'cerveza', 'vinos', 'destilados', 'cocteles', 'bebidas'
+    normalized = normalized.lower().strip()
+    # Handle some potential mismatches
+    if normalized == "cervezas":
+        normalized = "cerveza"
+    elif normalized == "vino":
+        normalized = "vinos"
+    elif normalized == "coctel":
+        normalized = "cocteles"
+    return normalized
+
+
 class ProductoSerializer(serializers.ModelSerializer):
     imagen = serializers.ImageField(required=False, allow_null=True)
     categoria = serializers.SerializerMethodField()
@@ -12,29 +62,35 @@ class ProductoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_categoria(self, obj):
-        if obj.categoria_rel and obj.categoria_rel.nombre:
-            # Normalize to match frontend filters (e.g. "Cerveza" -> "cerveza")
-            import unicodedata
-            normalized = unicodedata.normalize('NFD', obj.categoria_rel.nombre)
-            normalized = u"".join([c for c in normalized if not unicodedata.combining(c)])
-            # If the category is plural or singular, we try to match what frontend wants
-            # Frontend has: 'cerveza', 'vinos', 'destilados', 'cocteles', 'bebidas'
-            normalized = normalized.lower().strip()
-            # Handle some potential mismatches
-            if normalized == "cervezas":
-                normalized = "cerveza"
-            elif normalized == "vino":
-                normalized = "vinos"
-            elif normalized == "coctel":
-                normalized = "cocteles"
-            return normalized
+        if obj.categoria_rel:
+            return normalizar_categoria(obj.categoria_rel.nombre)
         return ""
 
+    def update(self, instance, validated_data):
+        # Guardar solo los campos enviados: `stock` cambia con cada despacho y
+        # reescribir el valor leído antes de la edición perdería esos descuentos
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Incluye los deltas aún no consolidados (modo STOCK_DIFERIDO)
+        data['stock'] = instance.stock_actual
+        return data
+
 class MovimientoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Movimiento
         fields = '__all__'
 
+class ConteoInventarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConteoInventario
+        fields = '__all__'
+        read_only_fields = ['estado', 'usuario', 'fecha_apertura', 'fecha_cierre']
+
 class MeseraSerializer(serializers.ModelSerializer):
     class Meta:
         model = Mesera
@@ -52,10 +108,8 @@ class MeseraSerializer(serializers.ModelSerializer):
         return value
 
 class PedidoProductoWriteSerializer(serializers.Serializer):
-    producto_id = serializers.PrimaryKeyRelatedField(
-        queryset=Producto.objects.all(),
-        source='producto'
-    )
+    # Se resuelve en bloque en PedidoSerializer.validate_productos (una sola query)
+    producto_id = serializers.IntegerField()
     cantidad = serializers.IntegerField(min_value=1)
 
 class PedidoProductoReadSerializer(serializers.ModelSerializer):
@@ -71,7 +125,7 @@ class PedidoProductoReadSerializer(serializers.ModelSerializer):
         model = PedidoProducto
         fields = ['id', 'cantidad', 'cantidad_despachada', 'producto_nombre', 'producto_precio']
 
-class PedidoSerializer(serializers.ModelSerializer):
+class PedidoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     productos = PedidoProductoWriteSerializer(many=True, write_only=True)
     productos_detalle = PedidoProductoReadSerializer(source='items', many=True, read_only=True)
     mesa_numero = serializers.CharField(source='mesa.numero', read_only=True)
@@ -87,12 +141,12 @@ class PedidoSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'mesera', 'usuario', 'mesa', 'estado', 'productos',
             'productos_detalle', 'mesera_nombre', 'mesa_numero',
-            'total', 'fecha_hora', 'fecha', 'hora'
+            'total', 'fecha_hora', 'fecha', 'hora', 'version'
         ]
         read_only_fields = [
             'fecha_hora', 'productos_detalle', 
             'mesera_nombre', 'mesa_numero',
-            'fecha', 'hora'
+            'fecha', 'hora', 'version'
         ]
 
     def get_mesera_nombre(self, obj):
@@ -102,17 +156,35 @@ class PedidoSerializer(serializers.ModelSerializer):
             return obj.usuario.username.upper()
         return "N/A"
 
+    @staticmethod
+    def _fecha_hora_local(obj):
+        # Se convierte una sola vez por pedido y se reutiliza en fecha y hora
+        if not hasattr(obj, '_local_dt'):
+            obj._local_dt = timezone.localtime(obj.fecha_hora) if obj.fecha_hora else None
+        return obj._local_dt
+
     def get_fecha(self, obj):
-        if obj.fecha_hora:
-            local_dt = timezone.localtime(obj.fecha_hora)
-            return local_dt.date()
-        return None
+        local_dt = self._fecha_hora_local(obj)
+        return local_dt.date() if local_dt else None
 
     def get_hora(self, obj):
-        if obj.fecha_hora:
-            local_dt = timezone.localtime(obj.fecha_hora)
-            return local_dt.time()
-        return None
+        local_dt = self._fecha_hora_local(obj)
+        return local_dt.time() if local_dt else None
+
+    def validate_productos(self, value):
+        """
+        Resuelve todos los producto_id con una sola query en lugar de una por línea.
+        """
+        ids = {item['producto_id'] for item in value}
+        productos = Producto.objects.in_bulk(ids)
+        faltantes = sorted(ids - productos.keys())
+        if faltantes:
+            raise serializers.ValidationError(
+                f'Invalid pk "{faltantes[0]}" - object does not exist.'
+            )
+        for item in value:
+            item['producto'] = productos[item.pop('producto_id')]
+        return value
 
     def create(self, validated_data):
         productos_data = validated_data.pop('productos', [])
@@ -127,61 +199,96 @@ class PedidoSerializer(serializers.ModelSerializer):
             # producto.save()
 
         validated_data['total'] = total
-        pedido = Pedido.objects.create(**validated_data)
-        for item in productos_data:
-            PedidoProducto.objects.create(
-                pedido=pedido,
-                producto=item['producto'],
-                cantidad=item['cantidad'],
-                precio_unitario=item['producto'].precio
-            )
+        with transaction.atomic():
+            pedido = Pedido.objects.create(**validated_data)
+            items = PedidoProducto.objects.bulk_create([
+                PedidoProducto(
+                    pedido=pedido,
+                    producto=item['producto'],
+                    cantidad=item['cantidad'],
+                    precio_unitario=item['producto'].precio
+                )
+                for item in productos_data
+            ])
+
+        # La respuesta se construye con los objetos ya en memoria, sin releer items
+        pedido._prefetched_objects_cache = {'items': items}
         return pedido
 
+class PedidoOfflineSerializer(serializers.Serializer):
+    """
+    Pedido tomado sin conexión y subido en lote a /api/pedidos/sync/.
+    Solo valida formato; las referencias se resuelven en bloque en OfflineSyncService.
+    """
+    uuid = serializers.UUIDField()
+    fecha_hora = serializers.DateTimeField()
+    mesa = serializers.IntegerField()
+    mesera = serializers.IntegerField(required=False, allow_null=True)
+    usuario = serializers.IntegerField(required=False, allow_null=True)
+    productos = PedidoProductoWriteSerializer(many=True, allow_empty=False)
+    force_append = serializers.BooleanField(default=True)
+
+class PedidoListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Representación compacta para listados (vista de mesas, tableros).
+    Los items solo se incluyen con ?expand=items.
+    """
+    mesa_numero = serializers.CharField(source='mesa.numero', read_only=True)
+    productos_detalle = PedidoProductoReadSerializer(source='items', many=True, read_only=True)
+
+    campos_expandibles = {'items': 'productos_detalle'}
+
+    class Meta:
+        model = Pedido
+        fields = ['id', 'mesa', 'mesa_numero', 'estado', 'total', 'fecha_hora', 'productos_detalle']
+        read_only_fields = fields
+
+
 from datetime import timedelta
 
 class MesaSerializer(serializers.ModelSerializer):
+    """
+    Lee la ocupación de las anotaciones de Mesa.objects.con_ocupacion();
+    no consulta pedidos por cada mesa.
+    """
     ocupada_por = serializers.SerializerMethodField()
     ocupada_por_id = serializers.SerializerMethodField()
     ocupada_por_tipo = serializers.SerializerMethodField()
+    pedido_activo_total = serializers.DecimalField(source='activo_total', max_digits=10, decimal_places=2, read_only=True)
+    pedido_activo_items = serializers.IntegerField(source='activo_items', read_only=True)
 
     class Meta:
         model = Mesa
-        fields = ['id', 'numero', 'capacidad', 'estado', 'ocupada_por', 'ocupada_por_id', 'ocupada_por_tipo']
+        fields = [
+            'id', 'numero', 'capacidad', 'estado', 'ocupada_por', 'ocupada_por_id', 'ocupada_por_tipo',
+            'pedido_activo_total', 'pedido_activo_items'
+        ]
 
-    def get_active_order(self, obj):
-        # Helper: Busca el primer pedido activo (no finalizado ni cancelado)
-        # Limitamos a pedidos DE LA FECHA ACTUAL para evitar bloqueos por pedidos de dias anteriores
-        today = timezone.localdate()
-        return obj.pedido_set.filter(
-            estado__in=['pendiente', 'despachado'],
-            fecha_hora__date=today
-        ).first()
+    def to_representation(self, instance):
+        # Instancias recién creadas/actualizadas no vienen anotadas
+        if not hasattr(instance, 'activo_pedido_id'):
+            instance = Mesa.objects.con_ocupacion().get(pk=instance.pk)
+        return super().to_representation(instance)
 
     def get_ocupada_por(self, obj):
-        order = self.get_active_order(obj)
-        if order:
-            if order.mesera:
-                return order.mesera.nombre
-            elif order.usuario:
-                return order.usuario.username.upper()
+        if obj.activo_mesera_id:
+            return obj.activo_mesera_nombre
+        if obj.activo_usuario_id:
+            return obj.activo_usuario_username.upper()
         return None
 
     def get_ocupada_por_id(self, obj):
-        order = self.get_active_order(obj)
-        if order:
-            if order.mesera:
-                return f"m{order.mesera.id}"
-            elif order.usuario:
-                return f"u{order.usuario.id}"
+        if obj.activo_mesera_id:
+            return f"m{obj.activo_mesera_id}"
+        if obj.activo_usuario_id:
+            return f"u{obj.activo_usuario_id}"
         return None
 
     def get_ocupada_por_tipo(self, obj):
-        order = self.get_active_order(obj)
-        if order:
-            if order.mesera:
-                return 'mesera'
-            elif order.usuario:
-                return 'usuario'
+        if obj.activo_mesera_id:
+            return 'mesera'
+        if obj.activo_usuario_id:
+            return 'usuario'
         return None
 
     def validate_numero(self, value):
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from django.db.models import F
+from ..models import Pedido, PedidoProducto, PedidoArchivo, Mesa, calcular_jornada
+from .order_service import OrderService
+from .purge_service import PurgeService
+from .sync_service import SyncService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveService:
+    """
+    Mueve los pedidos cerrados antiguos de Pedido/PedidoProducto a PedidoArchivo
+    por tramos de pk. Cada tramo es una transacción corta: lee los pedidos y sus
+    items, los inserta en el archivo con un INSERT y los borra con PurgeService.borrar_pedidos.
+    El stock no cambia (el pedido ya está cerrado), así que volver a correrlo
+    simplemente continúa donde quedó.
+    """
+    DIAS = 30
+    LOTE = 1000
+
+    @staticmethod
+    def archivables(dias=None):
+        """
+        Pedidos finalizados o cancelados con jornada de hace más de `dias` días.
+        """
+        dias = ArchiveService.DIAS if dias is None else dias
+        limite = calcular_jornada() - timedelta(days=dias)
+        return Pedido.objects.filter(estado__in=OrderService.ESTADOS_CERRADOS, jornada__lt=limite)
+
+    @staticmethod
+    def archivar(dias=None, lote=None, dry_run=False, progreso=None):
+        """
+        Archiva los pedidos de archivables(dias) en tramos de `lote` pedidos.
+        `progreso(resumen)` se llama después de cada tramo.
+        Con dry_run no modifica nada y reporta lo que se archivaría.
+
+        Returns:
+            dict: pedidos, items y ultimo_pk
+        """
+        lote = lote or ArchiveService.LOTE
+        resumen = {"pedidos": 0, "items": 0, "ultimo_pk": None}
+        ids_queryset = ArchiveService.archivables(dias).order_by('pk').values_list('pk', flat=True)
+
+        while True:
+            tramo = ids_queryset
+            if resumen["ultimo_pk"] is not None:
+                tramo = tramo.filter(pk__gt=resumen["ultimo_pk"])
+            ids = list(tramo[:lote])
+            if not ids:
+                break
+
+            if dry_run:
+                pedidos, items = len(ids), PedidoProducto.objects.filter(pedido_id__in=ids).count()
+            else:
+                pedidos, items = ArchiveService._archivar_tramo(ids)
+
+            resumen["pedidos"] += pedidos
+            resumen["items"] += items
+            resumen["ultimo_pk"] = ids[-1]
+            if progreso:
+                progreso(resumen)
+
+        logger.info(
+            f"Archivo {'simulado' if dry_run else 'completado'}: {resumen['pedidos']} pedidos, "
+            f"{resumen['items']} items, último pk {resumen['ultimo_pk']}"
+        )
+        return resumen
+
+    @staticmethod
+    def _archivar_tramo(ids):
+        with SyncService.transaccion():
+            # Se vuelve a filtrar por estado bajo bloqueo: un pedido reabierto mientras
+            # tanto se queda en la tabla viva
+            pedidos = list(
+                Pedido.objects.select_for_update().filter(
+                    pk__in=ids, estado__in=OrderService.ESTADOS_CERRADOS
+                ).order_by('pk').values(
+                    'id', 'mesera_id', 'usuario_id', 'fecha_hora', 'jornada', 'estado', 'total',
+                    mesa_numero=F('mesa__numero')
+                )
+            )
+            if not pedidos:
+                return 0, 0
+            ids = [pedido['id'] for pedido in pedidos]
+
+            items_por_pedido = {pk: [] for pk in ids}
+            items = PedidoProducto.objects.filter(pedido_id__in=ids)
+            for item in items.order_by('pk').values(
+                'pedido_id', 'producto_id', 'cantidad', 'cantidad_despachada', 'precio_unitario',
+                producto_nombre=F('producto__nombre')
+            ):
+                items_por_pedido[item.pop('pedido_id')].append({
+                    **item, 'precio_unitario': str(item['precio_unitario'])
+                })
+
+            PedidoArchivo.objects.bulk_create([
+                PedidoArchivo(**pedido, items=items_por_pedido[pedido['id']]) for pedido in pedidos
+            ])
+
+            # Un pedido cerrado no debería seguir siendo el activo de su mesa, pero por si acaso
+            OrderService._liberar_mesas(Mesa.objects.filter(pedido_activo__in=ids))
+            SyncService.registrar_eliminados(SyncService.MODELO_PEDIDO, ids)
+            # Los TiempoDespacho se conservan para las estadísticas de espera
+            num_items = PurgeService.borrar_pedidos(ids)
+
+        return len(pedidos), num_items
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+import asyncio
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """
+    Broker de eventos en memoria. Suficiente para un único proceso
+    (runserver o un solo worker ASGI).
+    """
+    MAX_PENDIENTES = 100
+
+    def __init__(self, **options):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entregar(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Suscriptor lento: se descarta un evento")
+
+    def publish(self, message):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for loop, queue in suscriptores:
+            loop.call_soon_threadsafe(self._entregar, queue, message)
+
+    async def subscribe(self, timeout=None):
+        """
+        Generador asíncrono de mensajes. Produce None si pasan `timeout`
+        segundos sin eventos, para que el llamador pueda enviar un heartbeat.
+        """
+        suscriptor = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.MAX_PENDIENTES))
+        with self._lock:
+            self._suscriptores.add(suscriptor)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(suscriptor[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._suscriptores.discard(suscriptor)
+
+
+class RedisBroker:
+    """
+    Broker de eventos sobre Redis pub/sub. Necesario con varios workers
+    de gunicorn, ya que cada proceso tiene su propia memoria.
+    """
+
+    def __init__(self, url=None, channel='mandala:eventos', **options):
+        import redis
+
+        self.url = url or settings.REDIS_URL
+        self.channel = channel
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, message):
+        self._client.publish(self.channel, json.dumps(message, default=str))
+
+    async def subscribe(self, timeout=None):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                yield json.loads(message['data']) if message else None
+        finally:
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+class EventService:
+    """
+    Publica los cambios de pedidos hacia las pantallas de bartender y meseras.
+    """
+    # Tipos de evento
+    PEDIDO_CREADO = 'pedido_creado'
+    PRODUCTOS_AGREGADOS = 'productos_agregados'
+    PRODUCTO_DESPACHADO = 'producto_despachado'
+    ESTADO_CAMBIADO = 'estado_cambiado'
+
+    # Roles que reciben todos los eventos
+    ROLES_GLOBALES = ['admin', 'bartender']
+
+    _broker = None
+
+    @staticmethod
+    def rol(user):
+        """Rol del usuario, con el mismo criterio que UserSerializer."""
+        if user.is_superuser:
+            return 'admin'
+        if user.groups.filter(name='Bartender').exists():
+            return 'bartender'
+        return 'usuario'
+
+    @staticmethod
+    def get_broker():
+        if EventService._broker is None:
+            broker_class = import_string(settings.EVENT_BROKER)
+            EventService._broker = broker_class(**getattr(settings, 'EVENT_BROKER_OPTIONS', {}))
+        return EventService._broker
+
+    @staticmethod
+    def publicar(tipo, pedido, **extra):
+        """
+        Publica un evento de pedido cuando la transacción actual se confirma,
+        para que ningún cliente vea cambios que luego se revierten.
+        """
+        message = {
+            'tipo': tipo,
+            'pedido_id': pedido.id,
+            'mesa_id': pedido.mesa_id,
+            'mesera_id': pedido.mesera_id,
+            'usuario_id': pedido.usuario_id,
+            'estado': pedido.estado,
+            **extra
+        }
+
+        def enviar():
+            try:
+                EventService.get_broker().publish(message)
+            except Exception as e:
+                # Un broker caído no debe romper la operación sobre el pedido
+                logger.error(f"Error al publicar evento {tipo} del pedido #{pedido.id}: {e}")
+
+        transaction.on_commit(enviar)
+
+    @staticmethod
+    def coincide(message, filtros):
+        """
+        Indica si un evento corresponde a la suscripción (rol, mesera, usuario o mesa).
+        El rol lo asigna la vista a partir del usuario autenticado, nunca del cliente.
+        """
+        if filtros.get('rol') in EventService.ROLES_GLOBALES:
+            return True
+        for campo in ('mesera', 'usuario', 'mesa'):
+            valor = filtros.get(campo)
+            if valor is not None and str(message.get(f'{campo}_id')) != str(valor):
+                return False
+        return True
+
+    @staticmethod
+    async def suscribir(filtros, heartbeat=15):
+        """
+        Generador asíncrono con los eventos que corresponden a los filtros.
+        Produce None cada `heartbeat` segundos sin eventos.
+        """
+        async for message in EventService.get_broker().subscribe(timeout=heartbeat):
+            if message is None or EventService.coincide(message, filtros):
+                yield message
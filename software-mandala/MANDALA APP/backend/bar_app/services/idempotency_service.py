@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from ..models import ClaveIdempotencia
+from .offline_service import OfflineSyncService
+from .sync_service import SyncService
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _NoGuardar(Exception):
+    """Revierte la operación y la clave cuando la respuesta es un error del servidor."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class IdempotencyService:
+    """
+    Soporte para el header Idempotency-Key: la primera petición con una clave
+    se ejecuta y su respuesta se guarda; los reintentos con la misma clave
+    reciben esa respuesta sin volver a tocar pedidos ni stock.
+    """
+    HEADER = 'Idempotency-Key'
+    HEADER_REPETIDA = 'Idempotent-Replayed'
+
+    @staticmethod
+    def ttl():
+        return timedelta(hours=settings.IDEMPOTENCIA_TTL_HORAS)
+
+    @staticmethod
+    def _huella(request):
+        contenido = json.dumps(request.data, sort_keys=True, default=str)
+        return hashlib.sha256(f"{request.method} {request.path}\n{contenido}".encode()).hexdigest()
+
+    @staticmethod
+    def _repetir(registro, huella):
+        if registro.huella != huella:
+            return Response(
+                {"detail": "La Idempotency-Key ya se usó con una petición distinta."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        response = Response(registro.respuesta, status=registro.status_code)
+        response[IdempotencyService.HEADER_REPETIDA] = 'true'
+        return response
+
+    @staticmethod
+    def ejecutar(request, operacion):
+        """
+        Ejecuta `operacion()` (que retorna un Response) de forma idempotente.
+        Sin header la ejecuta sin más. La clave se inserta al inicio de la misma
+        transacción: un reintento concurrente espera el índice único y luego
+        recibe la respuesta guardada. Los errores 5xx no se guardan, para que
+        el cliente pueda reintentar. Las claves con el prefijo de la sincronización
+        offline se rechazan: comparten la tabla y repetirían el resultado de un lote.
+        """
+        clave = request.headers.get(IdempotencyService.HEADER)
+        if not clave:
+            return operacion()
+        if len(clave) > 255:
+            return Response(
+                {"detail": f"{IdempotencyService.HEADER} no puede superar 255 caracteres."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if clave.startswith(OfflineSyncService.PREFIJO_CLAVE):
+            return Response(
+                {"detail": f"{IdempotencyService.HEADER} no puede empezar con '{OfflineSyncService.PREFIJO_CLAVE}'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        huella = IdempotencyService._huella(request)
+        limite = timezone.now() - IdempotencyService.ttl()
+
+        registro = ClaveIdempotencia.objects.filter(clave=clave, fecha__gte=limite).first()
+        if registro:
+            logger.info(f"Idempotency-Key {clave}: se repite la respuesta guardada")
+            return IdempotencyService._repetir(registro, huella)
+
+        try:
+            # SyncService.transaccion: el número de cambio de la operación se toma al final de todo
+            with SyncService.transaccion():
+                ClaveIdempotencia.objects.filter(clave=clave, fecha__lt=limite).delete()
+                try:
+                    with transaction.atomic():
+                        registro = ClaveIdempotencia.objects.create(clave=clave, huella=huella, status_code=0)
+                except IntegrityError:
+                    # Otro reintento con la misma clave confirmó primero
+                    registro = None
+
+                if registro is None:
+                    registro = ClaveIdempotencia.objects.filter(clave=clave).first()
+                    if registro is None:
+                        return Response(
+                            {"detail": "Petición con la misma Idempotency-Key en curso. Reintenta."},
+                            status=status.HTTP_409_CONFLICT
+                        )
+                    return IdempotencyService._repetir(registro, huella)
+
+                response = operacion()
+                if response.status_code >= 500:
+                    raise _NoGuardar(response)
+
+                registro.status_code = response.status_code
+                registro.respuesta = json.loads(JSONRenderer().render(response.data) or 'null')
+                registro.save(update_fields=['status_code', 'respuesta'])
+            return response
+
+        except _NoGuardar as e:
+            return e.response
+
+    @staticmethod
+    def limpiar_expiradas():
+        """
+        Elimina las claves con más de IDEMPOTENCIA_TTL_HORAS. Las de la sincronización
+        offline no expiran: son el único registro de qué pedidos ya se subieron, y un
+        tablet puede reenviar su cola días después.
+        """
+        eliminadas, _ = ClaveIdempotencia.objects.filter(
+            fecha__lt=timezone.now() - IdempotencyService.ttl()
+        ).exclude(clave__startswith=OfflineSyncService.PREFIJO_CLAVE).delete()
+        logger.info(f"Eliminadas {eliminadas} claves de idempotencia expiradas")
+        return eliminadas
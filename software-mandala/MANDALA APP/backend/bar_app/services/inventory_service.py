@@ -1,3 +1,4 @@
+from collections import defaultdict
 from django.db import transaction
 from django.db import models
 from django.shortcuts import get_object_or_404
@@ -6,6 +7,7 @@ from decimal import Decimal, InvalidOperation
 from rest_framework import status
 from rest_framework.response import Response
 from ..serializers import MovimientoSerializer, ProductoSerializer
+from .stock_service import StockService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,6 +18,27 @@ class InventoryService:
     TIPO_SALIDA = 'salida'
     
     TIPOS_VALIDOS = [TIPO_ENTRADA, TIPO_SALIDA]
+
+    MOTIVO_AJUSTE = 'Ajuste'
+
+    # Máximo de líneas por POST /api/movimientos/lote/
+    MAX_LOTE = 500
+
+    @staticmethod
+    def registrar_ajuste(producto, diferencia, user=None):
+        """
+        Deja en el libro de movimientos un cambio de stock hecho editando el producto,
+        para que el stock histórico (LedgerService) cuadre con el stock real.
+        """
+        if not diferencia:
+            return None
+        return Movimiento.objects.create(
+            producto=producto,
+            tipo=InventoryService.TIPO_ENTRADA if diferencia > 0 else InventoryService.TIPO_SALIDA,
+            cantidad=abs(diferencia),
+            motivo=InventoryService.MOTIVO_AJUSTE,
+            usuario=user.username if user else 'Sistema'
+        )
     
     @staticmethod
     def create_movement(data, user=None):
@@ -66,20 +89,23 @@ class InventoryService:
 
         try:
             with transaction.atomic():
-                # Bloquear producto para actualización segura
-                producto = Producto.objects.select_for_update().get(pk=producto.pk)
+                # Bloquear producto para actualización segura. En modo diferido las
+                # entradas solo insertan un delta y no necesitan el bloqueo.
+                if tipo == InventoryService.TIPO_SALIDA or not StockService.diferido():
+                    producto = Producto.objects.select_for_update().get(pk=producto.pk)
+                stock_actual = producto.stock_actual
                 
                 # Calcular nuevo stock
                 if tipo == InventoryService.TIPO_ENTRADA:
-                    nuevo_stock = producto.stock + cantidad
+                    nuevo_stock = stock_actual + cantidad
                 else:  # salida
-                    nuevo_stock = producto.stock - cantidad
+                    nuevo_stock = stock_actual - cantidad
                 
                 # Validar stock suficiente para salidas
                 if nuevo_stock < 0:
-                    logger.warning(f"Stock insuficiente para {producto.nombre}: stock actual={producto.stock}, cantidad solicitada={cantidad}")
+                    logger.warning(f"Stock insuficiente para {producto.nombre}: stock actual={stock_actual}, cantidad solicitada={cantidad}")
                     return Response(
-                        {'detail': f'Stock insuficiente. Stock actual: {producto.stock}'}, 
+                        {'detail': f'Stock insuficiente. Stock actual: {stock_actual}'}, 
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
@@ -93,8 +119,7 @@ class InventoryService:
                 )
 
                 # Actualizar stock del producto
-                producto.stock = nuevo_stock
-                producto.save(update_fields=['stock'])
+                StockService.aplicar_deltas({producto.pk: int(nuevo_stock - stock_actual)})
                 
                 logger.info(f"Movimiento creado: {tipo.upper()} de {cantidad} unidades de {producto.nombre} por {usuario_nombre}")
 
@@ -114,8 +139,129 @@ class InventoryService:
             {
                 'movimiento': mov_ser.data, 
                 'producto': prod_ser.data,
-                'nuevo_stock': producto.stock
+                'nuevo_stock': producto.stock_actual
             }, 
             status=status.HTTP_201_CREATED
         )
 
+
+    @staticmethod
+    def _validar_linea(linea, user=None):
+        """
+        Valida una línea de create_movements_batch con las reglas de create_movement.
+        Retorna (datos, None) o (None, mensaje de error).
+        """
+        if not isinstance(linea, dict):
+            return None, 'Cada línea debe ser un objeto'
+        producto_id = linea.get('producto') or linea.get('producto_id')
+        tipo = (linea.get('tipo') or '').lower()
+        motivo = linea.get('descripcion') or linea.get('motivo') or linea.get('detalle') or linea.get('observacion')
+
+        if not producto_id:
+            return None, 'El ID del producto es requerido'
+        try:
+            producto_id = int(producto_id)
+        except (TypeError, ValueError):
+            return None, 'El ID del producto debe ser numérico'
+        if tipo not in InventoryService.TIPOS_VALIDOS:
+            return None, f'Tipo inválido. Debe ser "{InventoryService.TIPO_ENTRADA}" o "{InventoryService.TIPO_SALIDA}"'
+        try:
+            cantidad = int(Decimal(str(linea.get('cantidad'))))
+            if cantidad <= 0:
+                raise ValueError
+        except (InvalidOperation, ValueError):
+            return None, 'La cantidad debe ser un número positivo'
+
+        return {
+            'producto_id': producto_id,
+            'tipo': tipo,
+            'cantidad': cantidad,
+            'motivo': motivo or 'Sin especificar',
+            'usuario': linea.get('usuario') or (user.username if user else 'Sistema'),
+        }, None
+
+    @staticmethod
+    def create_movements_batch(lineas, user=None):
+        """
+        Registra muchos movimientos (p. ej. la entrega de un proveedor) en una sola
+        transacción, todo o nada. Valida todas las líneas antes de escribir, bloquea
+        los productos una vez y en orden de pk, inserta los movimientos con un INSERT
+        y actualiza el stock con un UPDATE.
+
+        Returns:
+            Response: Por línea, el movimiento creado y el stock resultante; o los errores
+        """
+        if not isinstance(lineas, list) or not lineas:
+            return Response({'detail': "Se requiere una lista 'movimientos' no vacía"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lineas) > InventoryService.MAX_LOTE:
+            return Response(
+                {'detail': f'El lote supera {InventoryService.MAX_LOTE} movimientos. Divídelo en varios envíos.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        validas, errores = [], []
+        for indice, linea in enumerate(lineas):
+            datos, error = InventoryService._validar_linea(linea, user)
+            if error:
+                errores.append({'linea': indice, 'detail': error})
+            validas.append(datos)
+
+        producto_ids = {datos['producto_id'] for datos in validas if datos}
+        existentes = set(Producto.objects.filter(pk__in=producto_ids).values_list('pk', flat=True))
+        for indice, datos in enumerate(validas):
+            if datos and datos['producto_id'] not in existentes:
+                errores.append({'linea': indice, 'detail': 'Producto no encontrado'})
+        if errores:
+            logger.warning(f"Lote de movimientos rechazado: {len(errores)} líneas inválidas")
+            return Response(
+                {'detail': 'El lote tiene líneas inválidas; no se registró nada.', 'errores': sorted(errores, key=lambda e: e['linea'])},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with transaction.atomic():
+                # Mismo criterio que create_movement: en modo diferido las entradas no bloquean
+                hay_salidas = any(datos['tipo'] == InventoryService.TIPO_SALIDA for datos in validas)
+                productos = Producto.objects.filter(pk__in=producto_ids).order_by('pk')
+                if hay_salidas or not StockService.diferido():
+                    productos = productos.select_for_update()
+                stock = {
+                    pk: actual + pendiente
+                    for pk, actual, pendiente in productos.con_stock_pendiente().values_list('pk', 'stock', 'stock_pendiente')
+                }
+
+                # Las líneas se aplican en orden: una salida puede usar lo que entró antes en el mismo lote
+                deltas = defaultdict(int)
+                resultado = []
+                for indice, datos in enumerate(validas):
+                    signo = 1 if datos['tipo'] == InventoryService.TIPO_ENTRADA else -1
+                    stock[datos['producto_id']] += signo * datos['cantidad']
+                    if stock[datos['producto_id']] < 0:
+                        errores.append({
+                            'linea': indice,
+                            'detail': f"Stock insuficiente. Stock actual: {stock[datos['producto_id']] + datos['cantidad']}"
+                        })
+                    deltas[datos['producto_id']] += signo * datos['cantidad']
+                    resultado.append({'linea': indice, 'producto': datos['producto_id'], 'stock': stock[datos['producto_id']]})
+
+                if errores:
+                    logger.warning(f"Lote de movimientos rechazado por stock insuficiente en {len(errores)} líneas")
+                    return Response(
+                        {'detail': 'Stock insuficiente; no se registró nada.', 'errores': errores},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                movimientos = Movimiento.objects.bulk_create([Movimiento(**datos) for datos in validas])
+                StockService.aplicar_deltas(deltas)
+
+        except Exception as e:
+            logger.error(f"Error al registrar lote de movimientos: {e}", exc_info=True)
+            return Response(
+                {'detail': 'Error interno al procesar el lote de movimientos'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        for fila, movimiento in zip(resultado, movimientos):
+            fila['id'] = movimiento.pk
+        logger.info(f"Lote de movimientos registrado: {len(movimientos)} líneas en {len(deltas)} productos")
+        return Response({'movimientos': resultado}, status=status.HTTP_201_CREATED)
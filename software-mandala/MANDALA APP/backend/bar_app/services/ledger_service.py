@@ -0,0 +1,181 @@
+from django.db import models, transaction
+from django.db.models import F, Case, When, Sum, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Producto, Movimiento, SnapshotStock, cierre_jornada
+from .stock_service import StockService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerService:
+    """
+    Stock histórico a partir del libro de movimientos. El stock en un instante
+    es el último snapshot anterior más el neto de los movimientos desde entonces,
+    así cada consulta recorre a lo sumo los movimientos desde el último snapshot.
+    """
+
+    @staticmethod
+    def _neto():
+        """Entradas menos salidas."""
+        return Sum(Case(
+            When(tipo='entrada', then=F('cantidad')),
+            default=-F('cantidad'),
+            output_field=models.IntegerField()
+        ))
+
+    @staticmethod
+    def _neto_por_producto(movimientos):
+        return dict(
+            movimientos.order_by().values('producto_id').annotate(neto=LedgerService._neto())
+            .values_list('producto_id', 'neto')
+        )
+
+    @staticmethod
+    def snapshot(jornada):
+        """
+        Guarda el stock de todos los productos al cierre de `jornada` (reemplaza uno
+        anterior de la misma jornada). Se calcula desde el stock actual restando los
+        movimientos posteriores al cierre, en un solo SELECT para leer ambos consistentes.
+
+        Raises:
+            ValueError: Si la jornada aún no ha cerrado
+
+        Returns:
+            int: Número de productos guardados
+        """
+        cierre = cierre_jornada(jornada)
+        if cierre > timezone.now():
+            raise ValueError(f"La jornada {jornada} aún no ha cerrado ({timezone.localtime(cierre)}).")
+
+        posteriores = Movimiento.objects.filter(producto=OuterRef('pk'), fecha__gt=cierre).order_by().values(
+            'producto'
+        ).annotate(neto=LedgerService._neto()).values('neto')
+        filas = Producto.objects.con_stock_pendiente().annotate(
+            neto=Coalesce(Subquery(posteriores), 0)
+        ).values_list('pk', 'stock', 'stock_pendiente', 'neto')
+
+        snapshots = [
+            SnapshotStock(producto_id=pk, jornada=jornada, fecha=cierre, stock=stock + pendiente - neto)
+            for pk, stock, pendiente, neto in filas
+        ]
+        SnapshotStock.objects.bulk_create(
+            snapshots, update_conflicts=True, unique_fields=['producto', 'jornada'], update_fields=['fecha', 'stock']
+        )
+        logger.info(f"Snapshot de stock de la jornada {jornada}: {len(snapshots)} productos")
+        return len(snapshots)
+
+    @staticmethod
+    def stock_en(momento, producto_ids=None):
+        """
+        Stock de los productos (todos, o los de `producto_ids`) en el instante `momento`.
+        Parte del último snapshot anterior y suma los movimientos hasta `momento`; si no
+        hay snapshot anterior, parte del stock actual y resta los movimientos posteriores.
+
+        Returns:
+            list: {producto, nombre, stock} por producto
+        """
+        productos = Producto.objects.all()
+        if producto_ids is not None:
+            productos = productos.filter(pk__in=producto_ids)
+        movimientos = Movimiento.objects.all()
+        if producto_ids is not None:
+            movimientos = movimientos.filter(producto_id__in=producto_ids)
+
+        base = SnapshotStock.objects.filter(fecha__lte=momento).aggregate(fecha=Max('fecha'))['fecha']
+        if base is not None:
+            nombres = dict(productos.values_list('pk', 'nombre'))
+            inicial = dict(
+                SnapshotStock.objects.filter(fecha=base, producto_id__in=nombres.keys())
+                .values_list('producto_id', 'stock')
+            )
+            neto = LedgerService._neto_por_producto(movimientos.filter(fecha__gt=base, fecha__lte=momento))
+            stock = {pk: inicial.get(pk, 0) + neto.get(pk, 0) for pk in nombres}
+        else:
+            posteriores = movimientos.filter(producto=OuterRef('pk'), fecha__gt=momento).order_by().values(
+                'producto'
+            ).annotate(neto=LedgerService._neto()).values('neto')
+            filas = productos.con_stock_pendiente().annotate(
+                neto=Coalesce(Subquery(posteriores), 0)
+            ).values_list('pk', 'nombre', 'stock', 'stock_pendiente', 'neto')
+            nombres, stock = {}, {}
+            for pk, nombre, actual, pendiente, neto in filas:
+                nombres[pk] = nombre
+                stock[pk] = actual + pendiente - neto
+
+        return [{"producto": pk, "nombre": nombres[pk], "stock": stock[pk]} for pk in sorted(nombres)]
+
+    @staticmethod
+    def stock_al_cierre(jornada):
+        """
+        Stock de todos los productos al cierre de `jornada`. Si existe el snapshot
+        de esa jornada no hay movimientos que sumar.
+        """
+        return LedgerService.stock_en(cierre_jornada(jornada))
+
+    # Modos de reparar()
+    REPARAR_STOCK = 'stock'  # Producto.stock pasa a lo que dice el libro
+    REPARAR_LIBRO = 'libro'  # Un Ajuste por la diferencia: el libro pasa a lo que dice Producto.stock
+
+    @staticmethod
+    def base_verificacion():
+        """Fecha del último snapshot, punto de partida del stock esperado (None si no hay)."""
+        return SnapshotStock.objects.aggregate(fecha=Max('fecha'))['fecha']
+
+    @staticmethod
+    def diferencias(productos, base=None):
+        """
+        Compara el stock real de `productos` (queryset) con el esperado según el libro:
+        el snapshot `base` (0 si el producto no estaba) más el neto de los movimientos
+        posteriores. Stock real y esperado se leen en un solo SELECT, así un despacho
+        que confirma en medio no produce diferencias falsas.
+
+        Returns:
+            list: (producto_id, nombre, stock real, stock esperado) de los que no cuadran
+        """
+        movimientos = Movimiento.objects.filter(producto=OuterRef('pk'))
+        inicial = models.Value(0)
+        if base is not None:
+            movimientos = movimientos.filter(fecha__gt=base)
+            inicial = Coalesce(
+                Subquery(SnapshotStock.objects.filter(producto=OuterRef('pk'), fecha=base).values('stock')[:1]), 0
+            )
+        neto = movimientos.order_by().values('producto').annotate(neto=LedgerService._neto()).values('neto')
+
+        filas = productos.con_stock_pendiente().annotate(
+            inicial=inicial, neto=Coalesce(Subquery(neto), 0)
+        ).values_list('pk', 'nombre', 'stock', 'stock_pendiente', 'inicial', 'neto')
+        return [
+            (pk, nombre, stock + pendiente, inicial + neto)
+            for pk, nombre, stock, pendiente, inicial, neto in filas
+            if stock + pendiente != inicial + neto
+        ]
+
+    @staticmethod
+    def reparar(producto_ids, modo, base=None, usuario='Sistema'):
+        """
+        Corrige los productos dados en una transacción. Bloquea y vuelve a calcular
+        las diferencias (pudieron cambiar desde la verificación) y las aplica con un
+        solo UPDATE de stock (REPARAR_STOCK) o un solo INSERT de Ajustes (REPARAR_LIBRO).
+
+        Returns:
+            list: Las diferencias corregidas
+        """
+        with transaction.atomic():
+            list(Producto.objects.select_for_update().filter(pk__in=producto_ids).order_by('pk').values_list('pk'))
+            diferencias = LedgerService.diferencias(Producto.objects.filter(pk__in=producto_ids), base)
+
+            if modo == LedgerService.REPARAR_STOCK:
+                StockService.aplicar_deltas({pk: esperado - real for pk, _, real, esperado in diferencias})
+            else:
+                Movimiento.objects.bulk_create([
+                    Movimiento(
+                        producto_id=pk, tipo='entrada' if real > esperado else 'salida',
+                        cantidad=abs(real - esperado), motivo='Ajuste', usuario=usuario
+                    )
+                    for pk, _, real, esperado in diferencias
+                ])
+
+        logger.warning(f"Reparadas {len(diferencias)} diferencias de stock (modo {modo})")
+        return diferencias
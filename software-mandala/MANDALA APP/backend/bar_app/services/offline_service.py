@@ -0,0 +1,309 @@
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.db import models, IntegrityError
+from django.db.models import F, Q, Case, When, Value
+from django.utils import timezone
+from rest_framework import status
+from ..models import Pedido, PedidoProducto, Producto, Mesa, Mesera, ClaveIdempotencia, calcular_jornada
+from ..serializers import PedidoOfflineSerializer
+from .event_service import EventService
+from .order_service import OrderService
+from .station_service import StationService
+from .sync_service import SyncService
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _MesasCambiaron(Exception):
+    """Otro pedido ocupó o liberó una mesa del lote entre la lectura y el bloqueo."""
+
+
+class OfflineSyncService:
+    """
+    Sube en lote los pedidos que los tablets tomaron sin conexión.
+    Todo el lote se aplica en una transacción con un número fijo de queries,
+    sin importar cuántos pedidos traiga. Cada pedido se identifica por el UUID
+    generado en el tablet y se registra como ClaveIdempotencia, así que subir
+    el mismo lote otra vez no duplica nada.
+    """
+    MAX_LOTE = 500
+    PREFIJO_CLAVE = 'sync:'
+    # Reintentos cuando otro dispositivo cambia una mesa del lote mientras se aplica
+    INTENTOS = 3
+
+    # Resultado por pedido
+    CREADO = 'creado'
+    AGREGADO = 'agregado'
+    DUPLICADO = 'duplicado'
+    ERROR = 'error'
+
+    @staticmethod
+    def _no_existe(pk):
+        return [f'Invalid pk "{pk}" - object does not exist.']
+
+    @staticmethod
+    def sincronizar(pedidos_data):
+        """
+        Aplica una lista de pedidos offline (ver PedidoOfflineSerializer) con la
+        semántica de PedidoSerializer/OrderService: si la mesa tiene un pedido activo
+        del día y `force_append` es verdadero, los productos se agregan a ese pedido.
+        Retorna un resultado por pedido, en el mismo orden recibido.
+        """
+        if len(pedidos_data) > OfflineSyncService.MAX_LOTE:
+            return {
+                "error": f"El lote supera {OfflineSyncService.MAX_LOTE} pedidos. Divídelo en varios envíos.",
+                "status": status.HTTP_400_BAD_REQUEST
+            }
+
+        resultados = [None] * len(pedidos_data)
+        validos = []
+        vistos = set()
+        for indice, datos in enumerate(pedidos_data):
+            serializer = PedidoOfflineSerializer(data=datos)
+            if not serializer.is_valid():
+                uuid = datos.get('uuid') if isinstance(datos, dict) else None
+                resultados[indice] = {"uuid": uuid, "estado": OfflineSyncService.ERROR, "errores": serializer.errors}
+                continue
+            uuid = str(serializer.validated_data['uuid'])
+            if uuid in vistos:
+                resultados[indice] = {
+                    "uuid": uuid, "estado": OfflineSyncService.ERROR,
+                    "errores": {"uuid": ["UUID repetido en el lote."]}
+                }
+                continue
+            vistos.add(uuid)
+            validos.append((indice, uuid, datos, serializer.validated_data))
+
+        # Pedidos ya subidos en un envío anterior
+        ya_subidos = {
+            registro.clave[len(OfflineSyncService.PREFIJO_CLAVE):]: registro.respuesta
+            for registro in ClaveIdempotencia.objects.filter(
+                clave__in=[OfflineSyncService.PREFIJO_CLAVE + uuid for _, uuid, _, _ in validos]
+            )
+        }
+        pendientes = []
+        for indice, uuid, datos, validado in validos:
+            if uuid in ya_subidos:
+                resultados[indice] = {**ya_subidos[uuid], "estado": OfflineSyncService.DUPLICADO}
+            else:
+                pendientes.append((indice, uuid, datos, validado))
+
+        # Resolver todas las referencias en bloque
+        mesas = Mesa.objects.in_bulk({v['mesa'] for _, _, _, v in pendientes})
+        meseras = Mesera.objects.in_bulk({v['mesera'] for _, _, _, v in pendientes if v.get('mesera')})
+        usuarios = User.objects.in_bulk({v['usuario'] for _, _, _, v in pendientes if v.get('usuario')})
+        productos = Producto.objects.in_bulk(
+            {item['producto_id'] for _, _, _, v in pendientes for item in v['productos']}
+        )
+
+        aplicables = []
+        for indice, uuid, datos, validado in pendientes:
+            errores = {}
+            if validado['mesa'] not in mesas:
+                errores['mesa'] = OfflineSyncService._no_existe(validado['mesa'])
+            if validado.get('mesera') and validado['mesera'] not in meseras:
+                errores['mesera'] = OfflineSyncService._no_existe(validado['mesera'])
+            if validado.get('usuario') and validado['usuario'] not in usuarios:
+                errores['usuario'] = OfflineSyncService._no_existe(validado['usuario'])
+            faltantes = sorted({item['producto_id'] for item in validado['productos']} - productos.keys())
+            if faltantes:
+                errores['productos'] = OfflineSyncService._no_existe(faltantes[0])
+            if errores:
+                resultados[indice] = {"uuid": uuid, "estado": OfflineSyncService.ERROR, "errores": errores}
+            else:
+                aplicables.append((indice, uuid, datos, validado))
+
+        if aplicables:
+            for intento in range(1, OfflineSyncService.INTENTOS + 1):
+                try:
+                    OfflineSyncService._aplicar(aplicables, productos, resultados)
+                    break
+                except _MesasCambiaron:
+                    if intento == OfflineSyncService.INTENTOS:
+                        return {
+                            "error": "Las mesas del lote están cambiando desde otros dispositivos. Reintenta.",
+                            "status": status.HTTP_409_CONFLICT
+                        }
+                    logger.info("Sincronización offline: una mesa del lote cambió, se reintenta")
+                except IntegrityError:
+                    # Otro envío con los mismos UUID confirmó primero; al reintentar saldrán como duplicados
+                    logger.warning("Sincronización offline concurrente con UUID repetidos")
+                    return {
+                        "error": "Otro envío con los mismos pedidos está en curso. Reintenta.",
+                        "status": status.HTTP_409_CONFLICT
+                    }
+
+        logger.info(
+            f"Sincronización offline: {len(pedidos_data)} pedidos, "
+            f"{sum(1 for r in resultados if r['estado'] == OfflineSyncService.ERROR)} con error"
+        )
+        return {"resultados": resultados, "status": status.HTTP_200_OK}
+
+    @staticmethod
+    def _aplicar(aplicables, productos, resultados):
+        """
+        Aplica los pedidos válidos en una transacción.
+
+        Raises:
+            _MesasCambiaron: Si el puntero de alguna mesa cambió antes de bloquearla
+        """
+        ahora = timezone.now()
+        hoy = calcular_jornada()
+        mesa_ids = {validado['mesa'] for _, _, _, validado in aplicables}
+        leidos = dict(Mesa.objects.filter(pk__in=mesa_ids).values_list('pk', 'pedido_activo_id'))
+
+        with SyncService.transaccion():
+            marca = SyncService.marca()
+            # Orden de bloqueo global de OrderService: pedidos y luego mesas, cada uno por pk
+            # (no se cambia stock aquí). Los pedidos se toman de los punteros leídos antes;
+            # si con las mesas ya bloqueadas algún puntero cambió, se reintenta el lote
+            activos = {
+                pedido.pk: pedido
+                for pedido in Pedido.objects.select_for_update().filter(
+                    pk__in=[pedido_id for pedido_id in leidos.values() if pedido_id],
+                    estado__in=OrderService.ESTADOS_ACTIVOS,
+                    jornada=hoy
+                ).order_by('pk')
+            }
+            mesas = {mesa.pk: mesa for mesa in Mesa.objects.select_for_update().filter(pk__in=mesa_ids).order_by('pk')}
+            if {pk: mesa.pedido_activo_id for pk, mesa in mesas.items()} != leidos:
+                raise _MesasCambiaron
+            activo_por_mesa = {
+                mesa.pk: activos[mesa.pedido_activo_id]
+                for mesa in mesas.values() if mesa.pedido_activo_id in activos
+            }
+
+            nuevos = []
+            lineas = {}  # id(pedido) -> (pedido, {producto_id: cantidad})
+            aplicados = []  # (indice, uuid, datos, pedido, estado)
+
+            # Se aplican en el orden en que se tomaron, para que los agregados sigan al pedido original
+            for indice, uuid, datos, validado in sorted(aplicables, key=lambda a: a[3]['fecha_hora']):
+                fecha_hora = min(validado['fecha_hora'], ahora)
+                jornada = calcular_jornada(fecha_hora)
+                if validado['mesa'] not in mesas:
+                    # La mesa se eliminó después de validar el lote
+                    resultados[indice] = {
+                        "uuid": uuid, "estado": OfflineSyncService.ERROR,
+                        "errores": {"mesa": OfflineSyncService._no_existe(validado['mesa'])}
+                    }
+                    continue
+                activo = activo_por_mesa.get(validado['mesa']) if jornada == hoy else None
+
+                if activo is not None and not validado['force_append']:
+                    resultados[indice] = {
+                        "uuid": uuid, "estado": OfflineSyncService.ERROR,
+                        "errores": {"mesa": [f"Ya existe un pedido activo para la Mesa #{mesas[validado['mesa']].numero}."]}
+                    }
+                    continue
+
+                if activo is not None:
+                    pedido, estado = activo, OfflineSyncService.AGREGADO
+                else:
+                    pedido = Pedido(
+                        mesa_id=validado['mesa'], mesera_id=validado.get('mesera'), usuario_id=validado.get('usuario'),
+                        estado=OrderService.ESTADO_PENDIENTE, jornada=jornada, total=0, cambio=marca
+                    )
+                    pedido.fecha_hora = fecha_hora
+                    nuevos.append(pedido)
+                    estado = OfflineSyncService.CREADO
+                    if jornada == hoy:
+                        activo_por_mesa[validado['mesa']] = pedido
+
+                cantidades = lineas.setdefault(id(pedido), (pedido, defaultdict(int)))[1]
+                for item in validado['productos']:
+                    cantidades[item['producto_id']] += item['cantidad']
+                aplicados.append((indice, uuid, datos, pedido, estado))
+
+            # Pedidos nuevos: un INSERT. auto_now_add pisa fecha_hora, así que la hora
+            # del tablet se restaura con un solo UPDATE
+            fechas_cliente = {id(pedido): pedido.fecha_hora for pedido in nuevos}
+            Pedido.objects.bulk_create(nuevos)
+            if nuevos:
+                Pedido.objects.filter(pk__in=[pedido.pk for pedido in nuevos]).update(fecha_hora=Case(
+                    *[When(pk=pedido.pk, then=Value(fechas_cliente[id(pedido)])) for pedido in nuevos],
+                    output_field=models.DateTimeField()
+                ))
+                for pedido in nuevos:
+                    pedido.fecha_hora = fechas_cliente[id(pedido)]
+
+            # Pedidos activos existentes: marcar lo ya despachado y hacer upsert de items
+            existentes = [pedido for pedido in activos.values() if id(pedido) in lineas]
+            PedidoProducto.objects.filter(
+                pedido__in=[pedido.pk for pedido in existentes if pedido.estado == OrderService.ESTADO_DESPACHADO],
+                cantidad__gt=F('cantidad_despachada')
+            ).update(cantidad_despachada=F('cantidad'))
+
+            items_existentes = {}
+            for item in PedidoProducto.objects.filter(
+                pedido__in=[pedido.pk for pedido in existentes]
+            ).order_by('-pk'):
+                items_existentes[(item.pedido_id, item.producto_id)] = item
+
+            actualizar, crear = [], []
+            for pedido, cantidades in lineas.values():
+                for producto_id, cantidad in cantidades.items():
+                    item = items_existentes.get((pedido.pk, producto_id))
+                    if item is not None:
+                        item.cantidad += cantidad
+                        actualizar.append(item)
+                    else:
+                        crear.append(PedidoProducto(
+                            pedido=pedido, producto_id=producto_id, cantidad=cantidad,
+                            precio_unitario=productos[producto_id].precio
+                        ))
+                    pedido.total += productos[producto_id].precio * cantidad
+            PedidoProducto.objects.bulk_update(actualizar, ['cantidad'])
+            PedidoProducto.objects.bulk_create(crear)
+
+            # Totales: los nuevos y los agregados (que vuelven a 'pendiente' como en OrderService)
+            for pedido in existentes:
+                pedido.estado = OrderService.ESTADO_PENDIENTE
+                pedido.version += 1
+                pedido.fecha_actualizacion = ahora
+                pedido.cambio = marca
+            Pedido.objects.bulk_update(nuevos, ['total'])
+            Pedido.objects.bulk_update(existentes, ['total', 'estado', 'version', 'fecha_actualizacion', 'cambio'])
+            StationService.sincronizar([pedido.pk for pedido, _ in lineas.values()])
+
+            # Punteros de mesa hacia los pedidos nuevos del día. Como en
+            # OrderService._sincronizar_mesa, nunca se pisa otro pedido activo del día
+            punteros = {
+                mesa_id: pedido.pk for mesa_id, pedido in activo_por_mesa.items()
+                if pedido.pk not in activos
+            }
+            if punteros:
+                Mesa.objects.filter(pk__in=punteros.keys()).filter(
+                    Q(pedido_activo__isnull=True) | ~Q(pedido_activo__in=Pedido.objects.filter(
+                        estado__in=OrderService.ESTADOS_ACTIVOS, jornada=hoy
+                    ))
+                ).update(
+                    pedido_activo=Case(
+                        *[When(pk=mesa_id, then=Value(pedido_id)) for mesa_id, pedido_id in punteros.items()],
+                        output_field=models.IntegerField()
+                    ),
+                    estado=OrderService.MESA_OCUPADA,
+                    fecha_actualizacion=ahora,
+                    cambio=marca
+                )
+
+            claves = []
+            for indice, uuid, datos, pedido, estado in aplicados:
+                resultado = {"uuid": uuid, "estado": estado, "pedido_id": pedido.pk}
+                resultados[indice] = resultado
+                claves.append(ClaveIdempotencia(
+                    clave=OfflineSyncService.PREFIJO_CLAVE + uuid,
+                    huella=hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest(),
+                    status_code=status.HTTP_201_CREATED if estado == OfflineSyncService.CREADO else status.HTTP_200_OK,
+                    respuesta=resultado
+                ))
+                if estado == OfflineSyncService.CREADO:
+                    EventService.publicar(EventService.PEDIDO_CREADO, pedido)
+                else:
+                    EventService.publicar(
+                        EventService.PRODUCTOS_AGREGADOS, pedido, items_agregados=len(datos.get('productos', []))
+                    )
+            ClaveIdempotencia.objects.bulk_create(claves)
@@ -1,15 +1,39 @@
 from django.db import transaction, models
-from django.db.models import F
+from django.db.models import F, Q, Sum, OuterRef, Subquery, Exists, prefetch_related_objects
 from django.utils import timezone
 from datetime import timedelta
-from ..models import Pedido, PedidoProducto, Producto, Mesa
-from ..serializers import PedidoSerializer
+from collections import defaultdict
+from ..models import Pedido, PedidoProducto, Producto, Mesa, calcular_jornada
+from ..serializers import PedidoSerializer, PedidoProductoWriteSerializer
+from .event_service import EventService
+from .sync_service import SyncService
+from .stock_service import StockService
+from .station_service import StationService
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.serializers import raise_errors_on_nested_writes
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class ConflictoEstado(APIException):
+    """
+    El pedido cambió de estado en otro dispositivo; la respuesta (409)
+    incluye el estado y la versión actuales para que el cliente reintente.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'conflicto_estado'
+
+    def __init__(self, pedido):
+        # Se asigna directamente para que `version` conserve su tipo en el JSON
+        self.detail = {
+            "detail": f"El pedido #{pedido.id} cambió de estado en otro dispositivo.",
+            "estado": pedido.estado,
+            "version": pedido.version
+        }
+
 class OrderService:
     # Constantes de estado
     ESTADO_PENDIENTE = 'pendiente'
@@ -19,26 +43,169 @@ class OrderService:
     
     ESTADOS_ACTIVOS = [ESTADO_PENDIENTE, ESTADO_DESPACHADO]
     ESTADOS_CERRADOS = [ESTADO_CANCELADO, ESTADO_FINALIZADA]
+
+    # Estados de mesa
+    MESA_DISPONIBLE = 'disponible'
+    MESA_OCUPADA = 'ocupada'
+
+    @staticmethod
+    def get_pedido_activo(mesa_id):
+        """
+        Retorna el pedido activo de la mesa siguiendo el puntero Mesa.pedido_activo
+        (búsqueda por clave primaria). Ignora punteros a pedidos de jornadas anteriores.
+        """
+        mesa = Mesa.objects.select_related('pedido_activo').filter(pk=mesa_id).first()
+        pedido = mesa.pedido_activo if mesa else None
+
+        if not pedido or pedido.estado not in OrderService.ESTADOS_ACTIVOS:
+            return None
+        if pedido.jornada != calcular_jornada():
+            return None
+
+        pedido.mesa = mesa
+        return pedido
+
+    @staticmethod
+    def _liberar_mesas(mesas):
+        """
+        Limpia el puntero de pedido activo de las mesas dadas y las marca disponibles.
+        """
+        return mesas.update(
+            pedido_activo=None, estado=OrderService.MESA_DISPONIBLE,
+            fecha_actualizacion=timezone.now(), cambio=SyncService.marca()
+        )
+
+    @staticmethod
+    def _sincronizar_mesa(pedido):
+        """
+        Mantiene Mesa.pedido_activo y Mesa.estado coherentes con el estado del pedido.
+        Debe llamarse dentro de la misma transacción que modifica el pedido.
+        """
+        if pedido.estado in OrderService.ESTADOS_ACTIVOS:
+            # Si el pedido cambió de mesa, liberar la anterior
+            OrderService._liberar_mesas(
+                Mesa.objects.filter(pedido_activo=pedido).exclude(pk=pedido.mesa_id)
+            )
+            # Ocupar la mesa solo si no tiene otro pedido activo
+            Mesa.objects.filter(pk=pedido.mesa_id).filter(
+                Q(pedido_activo__isnull=True) | ~Q(pedido_activo__estado__in=OrderService.ESTADOS_ACTIVOS)
+            ).update(
+                pedido_activo=pedido, estado=OrderService.MESA_OCUPADA,
+                fecha_actualizacion=timezone.now(), cambio=SyncService.marca()
+            )
+        else:
+            OrderService._liberar_mesas(Mesa.objects.filter(pedido_activo=pedido))
+
+    @staticmethod
+    def create_order(serializer):
+        """
+        Guarda un pedido nuevo y lo registra como pedido activo de su mesa.
+        """
+        with SyncService.transaccion():
+            pedido = serializer.save(cambio=SyncService.marca())
+            Mesa.objects.filter(pk=pedido.mesa_id).update(
+                pedido_activo=pedido, estado=OrderService.MESA_OCUPADA,
+                fecha_actualizacion=timezone.now(), cambio=SyncService.marca()
+            )
+            StationService.sincronizar([pedido.pk])
+            EventService.publicar(EventService.PEDIDO_CREADO, pedido)
+        logger.info(f"Pedido #{pedido.id} creado para mesa {pedido.mesa_id}")
+        return pedido
+
+    @staticmethod
+    def delete_order(pedido):
+        """
+        Elimina un pedido liberando su mesa si era el pedido activo.
+        """
+        with SyncService.transaccion():
+            OrderService._liberar_mesas(Mesa.objects.filter(pedido_activo=pedido))
+            SyncService.registrar_eliminados(SyncService.MODELO_PEDIDO, [pedido.pk])
+            pedido.delete()
+
+    @staticmethod
+    def reconstruir_mesas_activas():
+        """
+        Reconstruye Mesa.pedido_activo y Mesa.estado a partir de los pedidos de la jornada.
+        Útil tras una caída o una modificación manual de la base de datos.
+
+        Returns:
+            int: Número de mesas cuyo puntero cambió
+        """
+        with SyncService.transaccion():
+            antes = dict(Mesa.objects.select_for_update().values_list('pk', 'pedido_activo_id'))
+
+            activo = Pedido.objects.filter(
+                mesa=OuterRef('pk'),
+                estado__in=OrderService.ESTADOS_ACTIVOS,
+                jornada=calcular_jornada()
+            ).order_by('-fecha_hora')
+
+            Mesa.objects.update(
+                pedido_activo=Subquery(activo.values('pk')[:1]),
+                fecha_actualizacion=timezone.now(), cambio=SyncService.marca()
+            )
+            Mesa.objects.filter(pedido_activo__isnull=False).update(estado=OrderService.MESA_OCUPADA)
+            Mesa.objects.filter(pedido_activo__isnull=True).update(estado=OrderService.MESA_DISPONIBLE)
+
+            despues = dict(Mesa.objects.values_list('pk', 'pedido_activo_id'))
+
+        cambios = sum(1 for pk, pedido_id in despues.items() if antes.get(pk) != pedido_id)
+        logger.info(f"Punteros de pedido activo reconstruidos: {cambios} mesas corregidas")
+        return cambios
     
+    @staticmethod
+    def _bloquear_items(items):
+        """
+        Bloquea los productos y luego los items de un queryset de items, cada uno en
+        orden de pk (orden global: pedidos, productos, items). Así quien lee después
+        las cantidades despachadas ve lo que confirmó un despacho o una cancelación
+        concurrente. Retorna los pk de los items bloqueados.
+        """
+        StockService.bloquear(items.values('producto_id'))
+        return list(items.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+    @staticmethod
+    def _descontar_stock_items(items):
+        """
+        Descuenta del stock lo pendiente de despachar de un queryset de items
+        y los marca como despachados. Número fijo de queries sin importar
+        cuántos items haya.
+        """
+        OrderService._bloquear_items(items)
+        items_pendientes = items.filter(cantidad__gt=F('cantidad_despachada'))
+        cantidades = list(items_pendientes.order_by().values('pedido_id', 'producto_id').annotate(
+            pendiente=Sum(F('cantidad') - F('cantidad_despachada'))
+        ).values_list('pedido_id', 'producto_id', 'pendiente'))
+        if not cantidades:
+            return 0
+
+        StockService.aplicar_items(cantidades, StockService.MOTIVO_VENTA)
+        return items_pendientes.update(cantidad_despachada=F('cantidad'))
+
+    @staticmethod
+    def _devolver_stock_items(items):
+        """
+        Devuelve al stock lo despachado de un queryset de items y resetea
+        su contador para evitar doble devolución.
+        """
+        OrderService._bloquear_items(items)
+        items_despachados = items.filter(cantidad_despachada__gt=0)
+        cantidades = list(items_despachados.order_by().values('pedido_id', 'producto_id').annotate(
+            despachado=Sum('cantidad_despachada')
+        ).values_list('pedido_id', 'producto_id', 'despachado'))
+        if not cantidades:
+            return 0
+
+        StockService.aplicar_items(cantidades, StockService.MOTIVO_DEVOLUCION)
+        return items_despachados.update(cantidad_despachada=0)
+
     @staticmethod
     def _descontar_stock_pendiente(pedido):
         """
         Descuenta del stock la cantidad pendiente de despachar de cada item.
         Usado cuando un pedido pasa a estado 'despachado'.
         """
-        items_actualizados = 0
-        for item in pedido.items.select_related('producto'):
-            pendiente_de_despacho = item.pendiente_despacho
-            
-            if pendiente_de_despacho > 0:
-                producto = item.producto
-                producto.stock -= pendiente_de_despacho
-                producto.save(update_fields=['stock'])
-                
-                item.cantidad_despachada = item.cantidad
-                item.save(update_fields=['cantidad_despachada'])
-                items_actualizados += 1
-        
+        items_actualizados = OrderService._descontar_stock_items(pedido.items.all())
         logger.info(f"Pedido #{pedido.id}: Stock descontado para {items_actualizados} items")
         return items_actualizados
     
@@ -48,41 +215,97 @@ class OrderService:
         Devuelve al stock la cantidad que había sido despachada.
         Usado cuando un pedido se cancela.
         """
-        items_revertidos = 0
-        for item in pedido.items.select_related('producto'):
-            if item.cantidad_despachada > 0:
-                producto = item.producto
-                producto.stock += item.cantidad_despachada
-                producto.save(update_fields=['stock'])
-                
-                # Resetear contador para evitar doble devolución
-                item.cantidad_despachada = 0
-                item.save(update_fields=['cantidad_despachada'])
-                items_revertidos += 1
-        
+        items_revertidos = OrderService._devolver_stock_items(pedido.items.all())
         logger.info(f"Pedido #{pedido.id}: Stock devuelto para {items_revertidos} items")
         return items_revertidos
     
     @staticmethod
-    def process_order_update(instance, previous_estado):
+    def update_order(serializer, version=None):
+        """
+        Guarda los cambios de un pedido. El cambio de estado pasa primero por
+        transicionar_estado (compare-and-swap); si pierde, no se escribe nada.
+        Después se guardan solo los demás campos enviados: un save() completo
+        escribiría el estado y la versión leídos antes y desharía el compare-and-swap.
+
+        Raises:
+            ConflictoEstado: Si otro dispositivo cambió el estado antes
         """
-        Maneja actualizaciones de estado:
+        pedido = serializer.instance
+        campos = dict(serializer.validated_data)
+        nuevo_estado = campos.pop('estado', None)
+        raise_errors_on_nested_writes('update', serializer, campos)
+
+        with SyncService.transaccion():
+            if nuevo_estado is not None:
+                OrderService.transicionar_estado(pedido, nuevo_estado, version=version)
+            if campos:
+                for campo, valor in campos.items():
+                    setattr(pedido, campo, valor)
+                pedido.cambio = SyncService.marca()
+                # fecha_actualizacion es auto_now: se escribe la hora actual, no la leída
+                pedido.save(update_fields=[*campos, 'fecha_actualizacion', 'cambio'])
+                if nuevo_estado is None:
+                    pedido.refresh_from_db(fields=['estado', 'version'])
+                OrderService._sincronizar_mesa(pedido)
+        return pedido
+
+    @staticmethod
+    def transicionar_estado(pedido, nuevo_estado, version=None, estado_esperado=None):
+        """
+        Cambia el estado con un UPDATE condicional (WHERE id AND estado [AND version]),
+        sin bloquear la fila del pedido. Solo si el UPDATE gana se aplican los efectos:
         1. Si pasa a 'despachado': Descuenta stock de lo pendiente.
         2. Si pasa a 'cancelado': Devuelve stock de lo que se había despachado.
+        En todos los casos mantiene sincronizado el pedido activo de la mesa.
+
+        Raises:
+            ConflictoEstado: Si el pedido ya no está en `estado_esperado` (por defecto
+            el estado leído en `pedido`) o su versión no coincide
         """
-        if instance.estado == previous_estado:
-            return  # Sin cambio de estado
-        
-        with transaction.atomic():
+        previous_estado = estado_esperado or pedido.estado
+        filtro = Q(pk=pedido.pk, estado=previous_estado)
+        if version is not None:
+            filtro &= Q(version=version)
+
+        ahora = timezone.now()
+        cambios = {'estado': nuevo_estado, 'version': F('version') + 1, 'fecha_actualizacion': ahora}
+        if nuevo_estado == OrderService.ESTADO_DESPACHADO:
+            cambios['fecha_despacho'] = ahora
+        elif nuevo_estado in OrderService.ESTADOS_CERRADOS:
+            cambios['fecha_cierre'] = ahora
+
+        with SyncService.transaccion():
+            gano = Pedido.objects.filter(filtro).update(**cambios, cambio=SyncService.marca())
+            pedido.refresh_from_db(fields=['estado', 'version', 'fecha_actualizacion', 'fecha_despacho', 'fecha_cierre'])
+            if not gano:
+                logger.warning(
+                    f"Pedido #{pedido.id}: conflicto al pasar de {previous_estado} a {nuevo_estado} "
+                    f"(actual: {pedido.estado}, versión {pedido.version})"
+                )
+                raise ConflictoEstado(pedido)
+
+            OrderService._sincronizar_mesa(pedido)
+
+            if nuevo_estado == previous_estado:
+                return pedido  # Sin cambio de estado
+
+            EventService.publicar(EventService.ESTADO_CAMBIADO, pedido, estado_anterior=previous_estado)
+
             # CASO 1: COMPLETAR / DESPACHAR
-            if instance.estado == OrderService.ESTADO_DESPACHADO and previous_estado != OrderService.ESTADO_DESPACHADO:
-                logger.info(f"Pedido #{instance.id}: Cambiando a DESPACHADO desde {previous_estado}")
-                OrderService._descontar_stock_pendiente(instance)
+            if nuevo_estado == OrderService.ESTADO_DESPACHADO:
+                logger.info(f"Pedido #{pedido.id}: Cambiando a DESPACHADO desde {previous_estado}")
+                OrderService._descontar_stock_pendiente(pedido)
+                StationService.despachar(pedido_id=pedido.pk)
 
             # CASO 2: CANCELAR
-            elif instance.estado == OrderService.ESTADO_CANCELADO and previous_estado != OrderService.ESTADO_CANCELADO:
-                logger.warning(f"Pedido #{instance.id}: CANCELANDO desde {previous_estado}")
-                OrderService._devolver_stock_despachado(instance)
+            elif nuevo_estado == OrderService.ESTADO_CANCELADO:
+                logger.warning(f"Pedido #{pedido.id}: CANCELANDO desde {previous_estado}")
+                OrderService._devolver_stock_despachado(pedido)
+
+            # Lo despachado sale de la cola de su estación; un pedido cerrado sale completo
+            StationService.sincronizar([pedido.pk])
+
+        return pedido
 
     @staticmethod
     def add_products_to_existing_order(mesa_id, products_data, serializer_context):
@@ -90,72 +313,86 @@ class OrderService:
         Agrega productos a un pedido existente activo.
         """
         # Buscar pedido activo para esta mesa (del día actual)
-        today = timezone.localdate()
-        pedido_activo = Pedido.objects.filter(
-            mesa_id=mesa_id,
-            fecha_hora__date=today,
-            estado__in=OrderService.ESTADOS_ACTIVOS
-        ).select_related('mesa').order_by('-fecha_hora').first()
+        pedido_activo = OrderService.get_pedido_activo(mesa_id)
 
         if not pedido_activo:
             logger.warning(f"No se encontró pedido activo para mesa {mesa_id} con force_append=True.")
             return None
 
         logger.info(f"Agregando productos al pedido existente #{pedido_activo.id}")
-        
+
+        lineas = PedidoProductoWriteSerializer(data=products_data, many=True)
+        if not lineas.is_valid():
+            logger.warning(f"Productos inválidos al agregar a pedido #{pedido_activo.id}: {lineas.errors}")
+            return Response({"productos": lineas.errors}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            with transaction.atomic():
-                # Bloquear el pedido para edición segura
+            # Agrupar las líneas por producto (el cliente puede repetir un producto)
+            cantidades = defaultdict(int)
+            for item in lineas.validated_data:
+                cantidades[item['producto_id']] += item['cantidad']
+            items_agregados = len(lineas.validated_data)
+
+            with SyncService.transaccion():
+                # Orden de bloqueo global: pedidos y luego productos, cada uno por pk.
+                # Así dos meseras agregando productos en común no se bloquean mutuamente.
                 pedido = Pedido.objects.select_for_update().get(pk=pedido_activo.id)
-                
+                if pedido.estado not in OrderService.ESTADOS_ACTIVOS:
+                    logger.info(f"Pedido #{pedido.id} se cerró antes de agregar productos")
+                    return None
+
+                productos = {
+                    producto.pk: producto
+                    for producto in Producto.objects.select_for_update().filter(
+                        pk__in=cantidades.keys()
+                    ).order_by('pk').only('pk', 'precio')
+                }
+                if len(productos) != len(cantidades):
+                    raise Producto.DoesNotExist
+
                 # Si el pedido estaba "despachado", marcar items viejos como despachados
                 # para que no aparezcan como nuevos
                 if pedido.estado == OrderService.ESTADO_DESPACHADO:
-                    for old_item in pedido.items.all():
-                        if old_item.cantidad_despachada < old_item.cantidad:
-                            old_item.cantidad_despachada = old_item.cantidad
-                            old_item.save(update_fields=['cantidad_despachada'])
+                    pedido.items.filter(cantidad__gt=F('cantidad_despachada')).update(
+                        cantidad_despachada=F('cantidad')
+                    )
 
-                total_agregado = 0
-                items_agregados = 0
-                
-                for item in products_data:
-                    producto_id = item.get('producto_id')
-                    cantidad = int(item.get('cantidad', 0))
-                    
-                    if cantidad <= 0:
-                        continue
-
-                    producto = Producto.objects.select_for_update().get(pk=producto_id)
-                    
-                    # Buscar si el producto ya está en el pedido
-                    pedido_producto, created = PedidoProducto.objects.get_or_create(
-                        pedido=pedido,
-                        producto=producto,
-                        defaults={
-                            'cantidad': 0,
-                            'precio_unitario': producto.precio
-                        }
+                # Upsert de items: un UPDATE para los existentes y un INSERT para los nuevos
+                existentes = {}
+                for pedido_producto in pedido.items.filter(producto_id__in=cantidades.keys()).order_by('-pk'):
+                    existentes[pedido_producto.producto_id] = pedido_producto
+
+                for producto_id, pedido_producto in existentes.items():
+                    pedido_producto.cantidad += cantidades[producto_id]
+                PedidoProducto.objects.bulk_update(existentes.values(), ['cantidad'])
+                PedidoProducto.objects.bulk_create([
+                    PedidoProducto(
+                        pedido=pedido, producto_id=producto_id, cantidad=cantidad,
+                        precio_unitario=productos[producto_id].precio
                     )
-                    
-                    # Actualizar cantidad en el pedido
-                    pedido_producto.cantidad += cantidad
-                    pedido_producto.save(update_fields=['cantidad'])
-                    
-                    # Sumar al total
-                    total_agregado += producto.precio * cantidad
-                    items_agregados += 1
+                    for producto_id, cantidad in cantidades.items() if producto_id not in existentes
+                ])
+
+                total_agregado = sum(
+                    productos[producto_id].precio * cantidad for producto_id, cantidad in cantidades.items()
+                )
 
                 # Actualizar total del pedido
                 pedido.total += total_agregado
                 
                 # IMPORTANTE: Resetear estado a 'pendiente' para que el bartender lo vea de nuevo
                 pedido.estado = OrderService.ESTADO_PENDIENTE
-                pedido.save(update_fields=['total', 'estado'])
+                pedido.version = F('version') + 1
+                pedido.cambio = SyncService.marca()
+                pedido.save(update_fields=['total', 'estado', 'version', 'fecha_actualizacion', 'cambio'])
+                pedido.refresh_from_db(fields=['version'])
+                StationService.sincronizar([pedido.pk])
+                EventService.publicar(EventService.PRODUCTOS_AGREGADOS, pedido, items_agregados=items_agregados)
                 
                 logger.info(f"Pedido #{pedido.id}: Agregados {items_agregados} items, total agregado: ${total_agregado}")
                 
                 # Serializar y devolver
+                prefetch_related_objects([pedido], 'items__producto')
                 serializer = PedidoSerializer(pedido, context=serializer_context)
                 return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -173,46 +410,49 @@ class OrderService:
             )
 
     @staticmethod
-    def delete_order_history(queryset):
+    def _completar_despachados(pedido_ids):
         """
-        Elimina pedidos del historial y devuelve el stock despachado.
+        Pasa a 'despachado' los pedidos pendientes que ya no tienen unidades por
+        despachar y marca los demás como modificados (sincronización incremental).
+        Se llama después de confirmar el despacho, sin bloqueos de productos o items
+        tomados: el pedido va primero en el orden global y aquí solo se bloquean
+        pedidos, brevemente y en orden de pk.
+
+        Returns:
+            list: pk de los pedidos completados
         """
-        if not queryset.exists():
-            return Response(
-                {"detail": "No hay pedidos que coincidan con los filtros para eliminar."}, 
-                status=status.HTTP_404_NOT_FOUND
+        ahora = timezone.now()
+        por_despachar = PedidoProducto.objects.filter(pedido=OuterRef('pk'), cantidad__gt=F('cantidad_despachada'))
+        with SyncService.transaccion():
+            marca = SyncService.marca()
+            filas = list(
+                Pedido.objects.select_for_update().filter(pk__in=pedido_ids).order_by('pk')
+                .annotate(por_despachar=Exists(por_despachar)).values_list('pk', 'estado', 'por_despachar')
             )
-
-        try:
-            with transaction.atomic():
-                pedidos_a_eliminar = list(queryset)
-                count = len(pedidos_a_eliminar)
-
-                for pedido in pedidos_a_eliminar:
-                    # Devolver stock SOLO de lo que se haya despachado
-                    OrderService._devolver_stock_despachado(pedido)
-                
-                # Después de revertir el stock, eliminamos los pedidos
-                queryset.delete()
-                
-                logger.info(f"Eliminados {count} pedidos del historial")
-                
-            return Response(
-                {"detail": f"Se eliminaron {count} pedidos exitosamente y se restauró el stock."}, 
-                status=status.HTTP_200_OK
+            completos = [
+                pk for pk, estado, pendientes in filas
+                if estado == OrderService.ESTADO_PENDIENTE and not pendientes
+            ]
+            Pedido.objects.filter(pk__in=completos).update(
+                estado=OrderService.ESTADO_DESPACHADO, version=F('version') + 1,
+                fecha_actualizacion=ahora, fecha_despacho=ahora, cambio=marca
             )
-        except Exception as e:
-            logger.error(f"Error al intentar borrar el historial de pedidos: {e}", exc_info=True)
-            return Response(
-                {"detail": "Ocurrió un error al intentar eliminar el historial. No se realizaron cambios."}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            Pedido.objects.filter(pk__in=pedido_ids).exclude(pk__in=completos).update(
+                fecha_actualizacion=ahora, cambio=marca
             )
+            for pedido in Pedido.objects.filter(pk__in=completos):
+                EventService.publicar(
+                    EventService.ESTADO_CAMBIADO, pedido, estado_anterior=OrderService.ESTADO_PENDIENTE
+                )
+        return completos
 
     @staticmethod
     def despachar_producto(pedido, item_id):
         """
         Marca un producto específico de un pedido como despachado.
         Si todos los productos están despachados, cambia el estado del pedido a 'despachado'.
+        Solo bloquea el producto y el item: mientras tanto se pueden seguir agregando
+        productos al pedido, y su cambio de estado es un compare-and-swap al final.
         """
         try:
             item = PedidoProducto.objects.select_related('producto').get(id=item_id, pedido=pedido)
@@ -222,33 +462,113 @@ class OrderService:
 
         try:
             with transaction.atomic():
+                if not OrderService._bloquear_items(PedidoProducto.objects.filter(pk=item.pk)):
+                    return {"error": "Producto no encontrado en este pedido", "status": status.HTTP_404_NOT_FOUND}
+                # El estado se lee con el item ya bloqueado: una cancelación confirmada antes se ve aquí,
+                # y una posterior espera al item y devuelve también lo que se despache ahora
+                estado = Pedido.objects.filter(pk=pedido.pk).values_list('estado', flat=True).first()
+                if estado is None:
+                    return {"error": "Pedido no encontrado", "status": status.HTTP_404_NOT_FOUND}
+                if estado not in OrderService.ESTADOS_ACTIVOS:
+                    logger.warning(f"Pedido #{pedido.id}: no se despacha el item {item.id}, el pedido está {estado}")
+                    return {"error": f"El pedido está {estado}.", "status": status.HTTP_409_CONFLICT}
+
                 # Descontar stock del item si aún falta por despachar
+                item.refresh_from_db(fields=['cantidad', 'cantidad_despachada'])
                 pendiente = item.pendiente_despacho
                 if pendiente > 0:
-                    producto = Producto.objects.select_for_update().get(pk=item.producto.id)
-                    producto.stock -= pendiente
-                    producto.save(update_fields=['stock'])
-                    
-                    logger.info(f"Item #{item.id}: Descontado {pendiente} unidades de {producto.nombre}")
+                    StockService.aplicar_items([(pedido.pk, item.producto_id, pendiente)], StockService.MOTIVO_VENTA)
+                    logger.info(f"Item #{item.id}: Descontado {pendiente} unidades de {item.producto.nombre}")
 
                 # Actualizar cantidad despachada
                 item.cantidad_despachada = item.cantidad
                 item.save(update_fields=['cantidad_despachada'])
-                
-                # Verificar si todos los productos del pedido han sido despachados
-                all_dispatched = not pedido.items.filter(cantidad__gt=F('cantidad_despachada')).exists()
-                
-                if all_dispatched:
-                    pedido.estado = OrderService.ESTADO_DESPACHADO
-                    pedido.save(update_fields=['estado'])
-                    msg = "Producto despachado. Pedido completado."
-                    logger.info(f"Pedido #{pedido.id}: COMPLETADO - Todos los items despachados")
-                else:
-                    msg = "Producto despachado."
-                    
+                StationService.despachar(item=item)
+                EventService.publicar(EventService.PRODUCTO_DESPACHADO, pedido, item_id=item.id)
+
+            # UPDATE condicional: si otro dispositivo ya cambió el estado, no se pisa
+            completado = OrderService._completar_despachados([pedido.pk])
+            pedido.refresh_from_db(fields=['estado', 'version', 'fecha_actualizacion', 'fecha_despacho'])
+            if completado:
+                msg = "Producto despachado. Pedido completado."
+                logger.info(f"Pedido #{pedido.id}: COMPLETADO - Todos los items despachados")
+            else:
+                msg = "Producto despachado."
+
             return {"detail": msg, "pedido_estado": pedido.estado, "status": status.HTTP_200_OK}
-            
+
         except Exception as e:
             logger.error(f"Error al despachar producto: {e}", exc_info=True)
             return {"error": "Error interno al despachar producto", "status": status.HTTP_500_INTERNAL_SERVER_ERROR}
 
+
+    # Resultados por item de despachar_lote
+    LOTE_DESPACHADO = 'despachado'
+    LOTE_NO_ENCONTRADO = 'no_encontrado'
+    LOTE_PEDIDO_CERRADO = 'pedido_cerrado'
+
+    @staticmethod
+    def despachar_lote(pares):
+        """
+        Despacha muchos items (posiblemente de varios pedidos) en una sola transacción.
+        `pares` es una lista de (pedido_id, item_id). Bloquea solo los productos y los
+        items afectados, una vez y en orden de pk (evita deadlocks entre barras y no
+        frena a las meseras que agregan productos), descuenta el stock con un único
+        UPDATE y al confirmar pasa a 'despachado' los pedidos que quedaron completos.
+        Retorna el resultado de cada item y el estado final de cada pedido tocado.
+        """
+        pedidos_por_item = defaultdict(set)
+        for pedido_id, item_id in pares:
+            pedidos_por_item[int(item_id)].add(int(pedido_id))
+        resultados = {item_id: OrderService.LOTE_NO_ENCONTRADO for item_id in pedidos_por_item}
+
+        try:
+            with transaction.atomic():
+                candidatos = PedidoProducto.objects.filter(pk__in=pedidos_por_item.keys())
+                OrderService._bloquear_items(candidatos)
+                items = {
+                    item_id: pedido_id
+                    for item_id, pedido_id in candidatos.values_list('pk', 'pedido_id')
+                    if pedido_id in pedidos_por_item[item_id]
+                }
+
+                # El estado se lee con los items ya bloqueados para no despachar un pedido recién cancelado
+                estados = dict(Pedido.objects.filter(pk__in=set(items.values())).values_list('pk', 'estado'))
+                validos = []
+                for item_id, pedido_id in items.items():
+                    estado = estados.get(pedido_id)
+                    if estado is None:
+                        continue  # Pedido eliminado mientras tanto: queda como no encontrado
+                    if estado in OrderService.ESTADOS_CERRADOS:
+                        resultados[item_id] = OrderService.LOTE_PEDIDO_CERRADO
+                    else:
+                        resultados[item_id] = OrderService.LOTE_DESPACHADO
+                        validos.append(item_id)
+
+                if not validos:
+                    return {"resultados": resultados, "pedidos": {}, "status": status.HTTP_200_OK}
+
+                pedido_ids = {items[item_id] for item_id in validos}
+                items_actualizados = OrderService._descontar_stock_items(PedidoProducto.objects.filter(pk__in=validos))
+                StationService.despachar(item_id__in=validos)
+
+                pedidos = Pedido.objects.in_bulk(pedido_ids)
+                for item_id in validos:
+                    EventService.publicar(EventService.PRODUCTO_DESPACHADO, pedidos[items[item_id]], item_id=item_id)
+
+            completos = OrderService._completar_despachados(pedido_ids)
+            pedidos = Pedido.objects.in_bulk(pedido_ids)
+
+            logger.info(
+                f"Despacho en lote: {len(validos)} items de {len(pedido_ids)} pedidos "
+                f"({items_actualizados} con stock descontado, {len(completos)} pedidos completados)"
+            )
+            return {
+                "resultados": resultados,
+                "pedidos": {pedido_id: pedido.estado for pedido_id, pedido in pedidos.items()},
+                "status": status.HTTP_200_OK
+            }
+
+        except Exception as e:
+            logger.error(f"Error en despacho en lote: {e}", exc_info=True)
+            return {"error": "Error interno al despachar el lote", "status": status.HTTP_500_INTERNAL_SERVER_ERROR}
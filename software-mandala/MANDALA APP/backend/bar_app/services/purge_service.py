@@ -0,0 +1,114 @@
+from collections import Counter
+from django.db.models import Sum
+from ..models import Pedido, PedidoProducto, TiempoDespacho, Mesa
+from .order_service import OrderService
+from .stock_service import StockService
+from .sync_service import SyncService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeService:
+    """
+    Borrado masivo de pedidos por tramos de pk. Cada tramo es una transacción
+    corta: devuelve el stock despachado con un GROUP BY, un UPDATE y un INSERT
+    de movimientos de Devolución, y borra con QuerySet.delete() sobre los pk del
+    tramo (ver borrar_pedidos). Como cada tramo confirma por separado, volver a correr
+    la purga con el mismo filtro continúa donde quedó.
+    """
+    LOTE = 1000
+
+    @staticmethod
+    def purgar(queryset, lote=None, devolver_stock=True, dry_run=False, desde_pk=None, progreso=None):
+        """
+        Elimina los pedidos de `queryset` en tramos de `lote` pedidos, en orden de pk.
+        `progreso(resumen)` se llama después de cada tramo.
+        Con dry_run no modifica nada y reporta lo que se eliminaría.
+
+        Returns:
+            dict: pedidos, items, ultimo_pk y stock devuelto por producto
+        """
+        lote = lote or PurgeService.LOTE
+        resumen = {"pedidos": 0, "items": 0, "ultimo_pk": desde_pk, "stock_devuelto": Counter()}
+        ids_queryset = queryset.order_by('pk').values_list('pk', flat=True)
+
+        while True:
+            tramo = ids_queryset
+            if resumen["ultimo_pk"] is not None:
+                tramo = tramo.filter(pk__gt=resumen["ultimo_pk"])
+            ids = list(tramo[:lote])
+            if not ids:
+                break
+
+            if dry_run:
+                items, deltas = PurgeService._contar_tramo(ids, devolver_stock)
+            else:
+                items, deltas = PurgeService._purgar_tramo(ids, devolver_stock)
+
+            resumen["pedidos"] += len(ids)
+            resumen["items"] += items
+            resumen["ultimo_pk"] = ids[-1]
+            resumen["stock_devuelto"].update(deltas)
+            if progreso:
+                progreso(resumen)
+
+        logger.info(
+            f"Purga {'simulada' if dry_run else 'completada'}: {resumen['pedidos']} pedidos, "
+            f"{resumen['items']} items, último pk {resumen['ultimo_pk']}"
+        )
+        resumen["stock_devuelto"] = dict(resumen["stock_devuelto"])
+        return resumen
+
+    @staticmethod
+    def borrar_pedidos(ids):
+        """
+        Borra los pedidos `ids` con QuerySet.delete(), que sigue las FK hacia Pedido:
+        PedidoProducto e ItemPendiente (CASCADE) y Mesa.pedido_activo (SET_NULL; las
+        mesas se liberan antes con OrderService._liberar_mesas). El colector de Django
+        solo carga los pk de un tramo, así que basta con tramos de LOTE pedidos.
+        TiempoDespacho guarda el pedido_id sin FK y no se toca aquí.
+
+        Returns:
+            int: Número de items borrados
+        """
+        _, borrados = Pedido.objects.filter(pk__in=ids).delete()
+        return borrados.get(PedidoProducto._meta.label, 0)
+
+    @staticmethod
+    def _despachado_tramo(items):
+        """Unidades despachadas por (pedido_id, producto_id), con un GROUP BY."""
+        return list(
+            items.filter(cantidad_despachada__gt=0).order_by().values('pedido_id', 'producto_id').annotate(
+                total=Sum('cantidad_despachada')
+            ).values_list('pedido_id', 'producto_id', 'total')
+        )
+
+    @staticmethod
+    def _contar_tramo(ids, devolver_stock):
+        items = PedidoProducto.objects.filter(pedido_id__in=ids)
+        deltas = Counter()
+        if devolver_stock:
+            for _, producto_id, total in PurgeService._despachado_tramo(items):
+                deltas[producto_id] += total
+        return items.count(), deltas
+
+    @staticmethod
+    def _purgar_tramo(ids, devolver_stock):
+        with SyncService.transaccion():
+            # Orden de bloqueo global de OrderService: pedidos y luego productos
+            list(Pedido.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk'))
+            OrderService._liberar_mesas(Mesa.objects.filter(pedido_activo__in=ids))
+
+            items = PedidoProducto.objects.filter(pedido_id__in=ids)
+            deltas = {}
+            if devolver_stock:
+                despachado = PurgeService._despachado_tramo(items)
+                StockService.bloquear({producto_id for _, producto_id, _ in despachado})
+                deltas = StockService.aplicar_items(despachado, StockService.MOTIVO_DEVOLUCION)
+
+            SyncService.registrar_eliminados(SyncService.MODELO_PEDIDO, ids)
+            TiempoDespacho.objects.filter(pedido_id__in=ids).delete()
+            num_items = PurgeService.borrar_pedidos(ids)
+
+        return num_items, deltas
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from django.utils import timezone
+from rest_framework import serializers
+from ..models import PedidoProducto, Producto
+from ..serializers import normalizar_categoria
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReadService:
+    """
+    Ruta rápida de lectura (opt-in con ?rapido=true) para los listados más usados.
+    Construye las respuestas directamente desde filas .values(), sin instanciar
+    ModelSerializer por objeto. El JSON resultante es idéntico al de
+    PedidoSerializer, ProductoSerializer y MesaSerializer; la paridad la
+    verifica bar_app/tests/test_lectura_rapida.py.
+    """
+    PARAM = 'rapido'
+
+    # Campos de DRF reutilizados solo para formatear igual que los serializers
+    _decimal = serializers.DecimalField(max_digits=10, decimal_places=2)
+    _fecha_hora = serializers.DateTimeField()
+
+    CAMPOS_PEDIDO = [
+        'id', 'mesera_id', 'usuario_id', 'mesa_id', 'estado', 'total', 'fecha_hora',
+        'mesa__numero', 'mesera__nombre', 'usuario__username', 'version',
+    ]
+    CAMPOS_PRODUCTO = [
+        'id', 'imagen', 'categoria_rel__nombre', 'nombre', 'stock', 'stock_minimo', 'stock_maximo',
+        'precio', 'unidad', 'proveedor', 'ubicacion', 'categoria_rel_id', 'stock_pendiente',
+    ]
+    CAMPOS_MESA = [
+        'id', 'numero', 'capacidad', 'estado', 'activo_mesera_id', 'activo_mesera_nombre',
+        'activo_usuario_id', 'activo_usuario_username', 'activo_total', 'activo_items',
+    ]
+
+    @staticmethod
+    def solicitada(request):
+        """
+        La ruta rápida solo aplica a la representación completa por defecto.
+        """
+        params = request.query_params
+        return params.get(ReadService.PARAM) == 'true' and not any(
+            params.get(p) for p in ('fields', 'expand', 'vista')
+        )
+
+    @staticmethod
+    def _decimal_o_none(valor):
+        return None if valor is None else ReadService._decimal.to_representation(valor)
+
+    @staticmethod
+    def pedidos(filas):
+        """
+        Equivalente a PedidoSerializer(many=True).data para filas de CAMPOS_PEDIDO.
+        Los items de todos los pedidos se leen con una sola query.
+        """
+        filas = list(filas)
+        items_por_pedido = defaultdict(list)
+        items = PedidoProducto.objects.filter(
+            pedido_id__in=[fila['id'] for fila in filas]
+        ).order_by('pk').values_list(
+            'pedido_id', 'id', 'cantidad', 'cantidad_despachada',
+            'producto__nombre', 'precio_unitario', 'producto__precio'
+        )
+        for pedido_id, item_id, cantidad, despachada, nombre, precio_unitario, precio in items:
+            items_por_pedido[pedido_id].append({
+                'id': item_id,
+                'cantidad': cantidad,
+                'cantidad_despachada': despachada,
+                'producto_nombre': nombre,
+                'producto_precio': precio_unitario if precio_unitario and precio_unitario > 0 else precio,
+            })
+
+        resultado = []
+        for fila in filas:
+            if fila['mesera_id']:
+                mesera_nombre = fila['mesera__nombre']
+            elif fila['usuario_id']:
+                mesera_nombre = fila['usuario__username'].upper()
+            else:
+                mesera_nombre = "N/A"
+
+            local_dt = timezone.localtime(fila['fecha_hora']) if fila['fecha_hora'] else None
+            resultado.append({
+                'id': fila['id'],
+                'mesera': fila['mesera_id'],
+                'usuario': fila['usuario_id'],
+                'mesa': fila['mesa_id'],
+                'estado': fila['estado'],
+                'productos_detalle': items_por_pedido[fila['id']],
+                'mesera_nombre': mesera_nombre,
+                'mesa_numero': fila['mesa__numero'],
+                'total': ReadService._decimal_o_none(fila['total']),
+                'fecha_hora': ReadService._fecha_hora.to_representation(fila['fecha_hora']) if local_dt else None,
+                'fecha': local_dt.date() if local_dt else None,
+                'hora': local_dt.time() if local_dt else None,
+                'version': fila['version'],
+            })
+        return resultado
+
+    @staticmethod
+    def productos(filas, request=None):
+        """
+        Equivalente a ProductoSerializer(many=True).data para filas de CAMPOS_PRODUCTO
+        (queryset anotado con Producto.objects.con_stock_pendiente()).
+        """
+        storage = Producto._meta.get_field('imagen').storage
+        categorias = {}
+        resultado = []
+        for fila in filas:
+            imagen = None
+            if fila['imagen']:
+                imagen = storage.url(fila['imagen'])
+                if request is not None:
+                    imagen = request.build_absolute_uri(imagen)
+
+            nombre_categoria = fila['categoria_rel__nombre']
+            if nombre_categoria not in categorias:
+                categorias[nombre_categoria] = normalizar_categoria(nombre_categoria)
+
+            resultado.append({
+                'id': fila['id'],
+                'imagen': imagen,
+                'categoria': categorias[nombre_categoria],
+                'nombre': fila['nombre'],
+                'stock': fila['stock'] + fila['stock_pendiente'],
+                'stock_minimo': fila['stock_minimo'],
+                'stock_maximo': fila['stock_maximo'],
+                'precio': ReadService._decimal_o_none(fila['precio']),
+                'unidad': fila['unidad'],
+                'proveedor': fila['proveedor'],
+                'ubicacion': fila['ubicacion'],
+                'categoria_rel': fila['categoria_rel_id'],
+            })
+        return resultado
+
+    @staticmethod
+    def mesas(filas):
+        """
+        Equivalente a MesaSerializer(many=True).data para filas de CAMPOS_MESA
+        (queryset anotado con Mesa.objects.con_ocupacion()).
+        """
+        resultado = []
+        for fila in filas:
+            if fila['activo_mesera_id']:
+                ocupada_por = fila['activo_mesera_nombre']
+                ocupada_por_id = f"m{fila['activo_mesera_id']}"
+                ocupada_por_tipo = 'mesera'
+            elif fila['activo_usuario_id']:
+                ocupada_por = fila['activo_usuario_username'].upper()
+                ocupada_por_id = f"u{fila['activo_usuario_id']}"
+                ocupada_por_tipo = 'usuario'
+            else:
+                ocupada_por = ocupada_por_id = ocupada_por_tipo = None
+
+            resultado.append({
+                'id': fila['id'],
+                'numero': fila['numero'],
+                'capacidad': fila['capacidad'],
+                'estado': fila['estado'],
+                'ocupada_por': ocupada_por,
+                'ocupada_por_id': ocupada_por_id,
+                'ocupada_por_tipo': ocupada_por_tipo,
+                'pedido_activo_total': ReadService._decimal_o_none(fila['activo_total']),
+                'pedido_activo_items': fila['activo_items'],
+            })
+        return resultado
@@ -1,10 +1,12 @@
 from django.db import models
-from django.db.models import Sum, Value, F, Q, Count
-from django.db.models.functions import Coalesce, TruncDate
+from django.db.models import Sum, Value, F, Q, Count, OuterRef, Subquery, Window, ExpressionWrapper
+from django.db.models.functions import Coalesce, ExtractHour, RowNumber
 from django.utils import timezone
 from django.contrib.auth.models import User
-from ..models import Mesera, Pedido
+from ..models import Mesera, Pedido, PedidoArchivo, TiempoDespacho, calcular_jornada
 from decimal import Decimal
+from functools import reduce
+from operator import or_
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,31 +14,47 @@ logger = logging.getLogger(__name__)
 class ReportService:
     """
     Servicio centralizado para generación de reportes y estadísticas.
+    Los reportes históricos suman Pedido y PedidoArchivo (ver archivar_pedidos).
     """
-    
+    # Tablas con pedidos: la viva y el archivo de pedidos cerrados
+    TABLAS_PEDIDOS = (Pedido, PedidoArchivo)
+    # Percentiles de espera reportados por get_tiempos_despacho
+    PERCENTILES = (50, 90, 99)
+
+    @staticmethod
+    def _total_vendido(campo, fecha=None):
+        """
+        Total vendido por el vendedor de la fila externa en ambas tablas.
+        Se usan subconsultas: dos JOIN en el mismo query multiplicarían las filas.
+        """
+        totales = []
+        for modelo in ReportService.TABLAS_PEDIDOS:
+            pedidos = modelo.objects.filter(**{campo: OuterRef('pk')})
+            if fecha:
+                pedidos = pedidos.filter(jornada=fecha)
+            totales.append(Coalesce(
+                Subquery(pedidos.order_by().values(campo).annotate(total=Sum('total')).values('total')),
+                Value(0),
+                output_field=models.DecimalField()
+            ))
+        return sum(totales[1:], totales[0])
+
     @staticmethod
     def get_ventas_por_vendedor(fecha=None):
         """
         Obtiene el total de ventas agrupado por vendedor (meseras y usuarios).
         
         Args:
-            fecha: Fecha específica para filtrar (opcional). Si es None, incluye todas las fechas.
+            fecha: Jornada específica para filtrar (opcional). Si es None, incluye todas las fechas.
             
         Returns:
             list: Lista de diccionarios con información de ventas por vendedor
         """
         logger.info(f"Generando reporte de ventas por vendedor{f' para fecha {fecha}' if fecha else ''}")
         
-        # Filtro de fecha
-        fecha_filter = Q(pedido__fecha_hora__date=fecha) if fecha else Q()
-        
         # 1. Ventas por Meseras
         meseras_ventas = Mesera.objects.annotate(
-            total_vendido=Coalesce(
-                Sum('pedido__total', filter=fecha_filter),
-                Value(0),
-                output_field=models.DecimalField()
-            )
+            total_vendido=ReportService._total_vendido('mesera', fecha)
         ).values(
             'total_vendido',
             mesera_id=F('id'),
@@ -46,13 +64,10 @@ class ReportService:
         
         # 2. Ventas por Usuarios del Sistema
         usuarios_ventas_raw = User.objects.filter(
-            Q(groups__name='Bartender') | Q(is_superuser=True) | Q(is_staff=True) | Q(pedido__isnull=False)
+            Q(groups__name='Bartender') | Q(is_superuser=True) | Q(is_staff=True) |
+            Q(pedido__isnull=False) | Q(pedidos_archivados__isnull=False)
         ).distinct().annotate(
-            total_vendido=Coalesce(
-                Sum('pedido__total', filter=fecha_filter),
-                Value(0),
-                output_field=models.DecimalField()
-            )
+            total_vendido=ReportService._total_vendido('usuario', fecha)
         ).values('total_vendido', 'id', 'username')
         
         # Formatear nombres de usuarios
@@ -80,12 +95,12 @@ class ReportService:
     @staticmethod
     def get_ventas_por_vendedor_hoy():
         """
-        Obtiene el total de ventas del día actual por vendedor.
+        Obtiene el total de ventas de la jornada actual por vendedor.
         
         Returns:
             list: Lista de diccionarios con información de ventas de hoy
         """
-        hoy = timezone.now().date()
+        hoy = calcular_jornada()
         return ReportService.get_ventas_por_vendedor(fecha=hoy)
     
     @staticmethod
@@ -98,44 +113,51 @@ class ReportService:
             end_date: Fecha final del rango (opcional)
             
         Returns:
-            QuerySet: Ventas agrupadas por fecha con totales
+            list: Ventas agrupadas por fecha con totales, de la más reciente a la más antigua
         """
         logger.info(f"Generando reporte de ventas diarias (desde: {start_date}, hasta: {end_date})")
         
-        queryset = Pedido.objects.exclude(estado='cancelado')
-        
-        # Aplicar filtros de fecha
-        if start_date:
-            queryset = queryset.filter(fecha_hora__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(fecha_hora__date__lte=end_date)
+        ventas_por_fecha = {}
+        for modelo in ReportService.TABLAS_PEDIDOS:
+            queryset = modelo.objects.exclude(estado='cancelado')
+            
+            # Aplicar filtros de fecha
+            if start_date:
+                queryset = queryset.filter(jornada__gte=start_date)
+            if end_date:
+                queryset = queryset.filter(jornada__lte=end_date)
+            
+            # Agrupar por jornada; una jornada puede estar repartida entre ambas tablas
+            for fila in queryset.order_by().values(fecha=F('jornada')).annotate(
+                total_ventas=Sum('total'),
+                cantidad_pedidos=Count('id')
+            ):
+                acumulado = ventas_por_fecha.setdefault(
+                    fila['fecha'], {'fecha': fila['fecha'], 'total_ventas': Decimal('0'), 'cantidad_pedidos': 0}
+                )
+                acumulado['total_ventas'] += fila['total_ventas']
+                acumulado['cantidad_pedidos'] += fila['cantidad_pedidos']
         
-        # Agrupar por fecha
-        ventas_diarias = queryset.annotate(
-            fecha=TruncDate('fecha_hora')
-        ).values('fecha').annotate(
-            total_ventas=Sum('total'),
-            cantidad_pedidos=Count('id')
-        ).order_by('-fecha')
+        ventas_diarias = sorted(ventas_por_fecha.values(), key=lambda fila: fila['fecha'], reverse=True)
         
-        logger.info(f"Reporte generado: {ventas_diarias.count()} días con ventas")
+        logger.info(f"Reporte generado: {len(ventas_diarias)} días con ventas")
         return ventas_diarias
     
     @staticmethod
     def get_total_pedidos_mesera_hoy():
         """
-        Calcula el total de pedidos para cada mesera y usuario en el día actual.
+        Calcula el total de pedidos para cada mesera y usuario en la jornada actual.
         Formato compatible con el endpoint existente.
         
         Returns:
             list: Lista de diccionarios con id, nombre y total_vendido
         """
-        hoy = timezone.now().date()
+        hoy = calcular_jornada()
         
         # 1. Ventas Meseras
         ventas_por_mesera = Mesera.objects.annotate(
             total_vendido=Coalesce(
-                Sum('pedido__total', filter=Q(pedido__fecha_hora__date=hoy)),
+                Sum('pedido__total', filter=Q(pedido__jornada=hoy)),
                 Value(0),
                 output_field=models.DecimalField()
             )
@@ -144,7 +166,7 @@ class ReportService:
         # 2. Ventas Usuarios Sistema
         ventas_por_usuario = User.objects.filter(pedido__isnull=False).annotate(
             total_vendido=Coalesce(
-                Sum('pedido__total', filter=Q(pedido__fecha_hora__date=hoy)),
+                Sum('pedido__total', filter=Q(pedido__jornada=hoy)),
                 Value(0),
                 output_field=models.DecimalField()
             )
@@ -167,23 +189,33 @@ class ReportService:
         Obtiene estadísticas generales del sistema.
         
         Args:
-            fecha: Fecha específica para filtrar (opcional)
+            fecha: Jornada específica para filtrar (opcional)
             
         Returns:
             dict: Diccionario con estadísticas generales
         """
-        fecha_filter = {'fecha_hora__date': fecha} if fecha else {}
-        
-        pedidos = Pedido.objects.filter(**fecha_filter).exclude(estado='cancelado')
+        fecha_filter = {'jornada': fecha} if fecha else {}
         
         estadisticas = {
-            'total_ventas': pedidos.aggregate(total=Sum('total'))['total'] or Decimal('0'),
-            'cantidad_pedidos': pedidos.count(),
-            'pedidos_pendientes': pedidos.filter(estado='pendiente').count(),
-            'pedidos_despachados': pedidos.filter(estado='despachado').count(),
-            'pedidos_finalizados': pedidos.filter(estado='finalizada').count(),
+            'total_ventas': Decimal('0'),
+            'cantidad_pedidos': 0,
+            'pedidos_pendientes': 0,
+            'pedidos_despachados': 0,
+            'pedidos_finalizados': 0,
             'ticket_promedio': Decimal('0')
         }
+        # Un aggregate por tabla (el archivo solo tiene pedidos finalizados o cancelados)
+        for modelo in ReportService.TABLAS_PEDIDOS:
+            pedidos = modelo.objects.filter(**fecha_filter).exclude(estado='cancelado')
+            totales = pedidos.aggregate(
+                total_ventas=Sum('total'),
+                cantidad_pedidos=Count('id'),
+                pedidos_pendientes=Count('id', filter=Q(estado='pendiente')),
+                pedidos_despachados=Count('id', filter=Q(estado='despachado')),
+                pedidos_finalizados=Count('id', filter=Q(estado='finalizada')),
+            )
+            for clave, valor in totales.items():
+                estadisticas[clave] += valor or 0
         
         # Calcular ticket promedio
         if estadisticas['cantidad_pedidos'] > 0:
@@ -192,3 +224,75 @@ class ReportService:
         logger.info(f"Estadísticas generadas: ${estadisticas['total_ventas']} en {estadisticas['cantidad_pedidos']} pedidos")
         
         return estadisticas
+
+    @staticmethod
+    def _rango_percentil(despachos, percentil):
+        """Posición (desde 1) del percentil por rango más cercano: ceil(n * p / 100)."""
+        return (despachos * percentil + 99) // 100
+
+    @staticmethod
+    def _percentiles_espera(registros, campos):
+        """
+        Calcula en la base de datos los percentiles de `espera` agrupando por `campos`.
+        Numera las esperas de cada grupo con funciones de ventana y solo trae las
+        filas que caen en algún percentil (a lo más tres por grupo), así el costo
+        en Python no depende de cuántos despachos haya.
+        """
+        particion = [F(campo) for campo in campos]
+        filas = registros.annotate(
+            posicion=Window(RowNumber(), partition_by=particion, order_by=[F('espera').asc(), F('pk').asc()]),
+            despachos=Window(Count('pk'), partition_by=particion),
+        ).filter(reduce(or_, [
+            # Misma fórmula que _rango_percentil; entre enteros `/` es división entera en SQL
+            Q(posicion=ExpressionWrapper(
+                (F('despachos') * percentil + 99) / 100, output_field=models.IntegerField()
+            ))
+            for percentil in ReportService.PERCENTILES
+        ])).values(*campos, 'posicion', 'despachos', 'espera')
+
+        grupos = {}
+        for fila in filas:
+            grupo = grupos.setdefault(
+                tuple(fila[campo] for campo in campos),
+                {**{campo: fila[campo] for campo in campos}, 'despachos': fila['despachos']}
+            )
+            for percentil in ReportService.PERCENTILES:
+                if fila['posicion'] == ReportService._rango_percentil(fila['despachos'], percentil):
+                    grupo[f'p{percentil}'] = fila['espera']
+        return list(grupos.values())
+
+    @staticmethod
+    def get_tiempos_despacho(fecha=None):
+        """
+        Percentiles (p50/p90/p99, en segundos) de la espera de los items en la cola
+        de su estación, por estación, por hora del pedido y por vendedor.
+
+        Args:
+            fecha: Jornada a reportar. Si es None, la jornada actual.
+
+        Returns:
+            dict: jornada y listas por_estacion, por_hora y por_vendedor
+        """
+        fecha = fecha or calcular_jornada()
+        logger.info(f"Generando reporte de tiempos de despacho para {fecha}")
+        registros = TiempoDespacho.objects.filter(jornada=fecha)
+
+        por_estacion = ReportService._percentiles_espera(registros, ['estacion'])
+        por_hora = ReportService._percentiles_espera(registros.annotate(hora=ExtractHour('solicitado')), ['hora'])
+        por_vendedor = []
+        for grupo in ReportService._percentiles_espera(
+            registros, ['mesera_id', 'usuario_id', 'mesera__nombre', 'usuario__username']
+        ):
+            nombre = grupo.pop('mesera__nombre')
+            username = grupo.pop('usuario__username')
+            por_vendedor.append({
+                'mesera_nombre': nombre or (username.upper() if username else 'N/A'),
+                **grupo
+            })
+
+        return {
+            'jornada': fecha,
+            'por_estacion': sorted(por_estacion, key=lambda grupo: grupo['estacion']),
+            'por_hora': sorted(por_hora, key=lambda grupo: grupo['hora']),
+            'por_vendedor': sorted(por_vendedor, key=lambda grupo: grupo['mesera_nombre']),
+        }
@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models import F, Value, OuterRef, Exists, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..models import Categoria, PedidoProducto, ItemPendiente, TiempoDespacho
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StationService:
+    """
+    Enrutamiento de productos a estaciones (según la estación de su categoría)
+    y mantenimiento de la cola ItemPendiente de cada una.
+    """
+    # Un item está en cola mientras su pedido siga abierto y le falten unidades
+    ESTADOS_EN_COLA = ['pendiente', 'despachado']
+
+    @staticmethod
+    def es_valida(estacion):
+        return estacion in dict(Categoria.ESTACIONES)
+
+    @staticmethod
+    def sincronizar(pedido_ids):
+        """
+        Deja la cola de los pedidos dados igual a sus items con unidades por despachar.
+        Los items que siguen pendientes conservan su fecha (su antigüedad en la cola).
+        Número fijo de queries sin importar cuántos pedidos o items haya.
+        Debe llamarse dentro de la misma transacción que modifica los pedidos.
+        """
+        pedido_ids = list(pedido_ids)
+        if not pedido_ids:
+            return
+
+        pendientes = PedidoProducto.objects.filter(
+            pedido_id__in=pedido_ids,
+            pedido__estado__in=StationService.ESTADOS_EN_COLA,
+            cantidad__gt=F('cantidad_despachada')
+        )
+        ItemPendiente.objects.filter(pedido_id__in=pedido_ids).exclude(
+            item_id__in=pendientes.values('pk')
+        ).delete()
+
+        faltantes = pendientes.filter(~Exists(ItemPendiente.objects.filter(item=OuterRef('pk')))).values_list(
+            'pk', 'pedido_id', Coalesce('producto__categoria_rel__estacion', Value(Categoria.ESTACION_DEFECTO))
+        )
+        # ignore_conflicts: otra transacción pudo encolar el mismo item al mismo tiempo
+        ItemPendiente.objects.bulk_create([
+            ItemPendiente(item_id=item_id, pedido_id=pedido_id, estacion=estacion)
+            for item_id, pedido_id, estacion in faltantes
+        ], ignore_conflicts=True)
+
+    @staticmethod
+    def despachar(**filtro):
+        """
+        Saca de la cola los items que cumplen `filtro` (p. ej. item_id__in=...) y
+        registra en TiempoDespacho cuánto esperó cada uno. Tres queries en total.
+        Debe llamarse dentro de la transacción que marca los items como despachados.
+        """
+        ahora = timezone.now()
+        en_cola = list(ItemPendiente.objects.filter(**filtro).values_list(
+            'pk', 'pedido_id', 'item_id', 'estacion', 'fecha',
+            'pedido__mesera_id', 'pedido__usuario_id', 'pedido__jornada'
+        ))
+        if not en_cola:
+            return 0
+
+        TiempoDespacho.objects.bulk_create([
+            TiempoDespacho(
+                pedido_id=pedido_id, item_id=item_id, estacion=estacion,
+                mesera_id=mesera_id, usuario_id=usuario_id, jornada=jornada,
+                solicitado=fecha, despachado=ahora, espera=max(0, int((ahora - fecha).total_seconds()))
+            )
+            for _, pedido_id, item_id, estacion, fecha, mesera_id, usuario_id, jornada in en_cola
+        ])
+        ItemPendiente.objects.filter(pk__in=[fila[0] for fila in en_cola]).delete()
+        return len(en_cola)
+
+    @staticmethod
+    def cola(estacion):
+        """
+        Items pendientes de una estación, del más antiguo al más reciente.
+        Lee solo la cola (índice estacion, fecha), no los pedidos.
+        """
+        return list(
+            ItemPendiente.objects.filter(estacion=estacion).order_by('fecha', 'id').values(
+                'fecha', 'pedido_id', 'item_id',
+                mesa_numero=F('pedido__mesa__numero'),
+                producto_id=F('item__producto_id'),
+                producto_nombre=F('item__producto__nombre'),
+                cantidad=F('item__cantidad'),
+                cantidad_despachada=F('item__cantidad_despachada'),
+            )
+        )
+
+    @staticmethod
+    def reconstruir():
+        """
+        Reconstruye la cola completa a partir de los pedidos abiertos y vuelve a
+        enrutar los items ya encolados (por si cambió la estación de una categoría).
+        Útil tras una caída o una modificación manual de la base de datos.
+
+        Returns:
+            int: Número de items en cola
+        """
+        with transaction.atomic():
+            abiertos = PedidoProducto.objects.filter(
+                pedido__estado__in=StationService.ESTADOS_EN_COLA
+            ).values_list('pedido_id', flat=True).distinct()
+            ItemPendiente.objects.exclude(pedido_id__in=abiertos).delete()
+            StationService.sincronizar(abiertos)
+            ItemPendiente.objects.update(estacion=Coalesce(
+                Subquery(Categoria.objects.filter(productos__pedidoproducto=OuterRef('item')).values('estacion')[:1]),
+                Value(Categoria.ESTACION_DEFECTO)
+            ))
+            total = ItemPendiente.objects.count()
+        logger.info(f"Cola de estaciones reconstruida: {total} items pendientes")
+        return total
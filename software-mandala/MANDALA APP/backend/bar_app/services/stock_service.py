@@ -0,0 +1,132 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction, models
+from django.db.models import F, Case, When, Value, Sum
+from ..models import Producto, DeltaStock, Movimiento
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StockService:
+    """
+    Punto único para modificar Producto.stock.
+    Con STOCK_DIFERIDO los cambios se registran como DeltaStock (un INSERT, sin
+    bloquear Producto) y consolidar() los aplica después; sin él se aplican
+    directamente con un UPDATE.
+    """
+    LOTE_CONSOLIDACION = 5000
+
+    # Movimientos que dejan los pedidos en el inventario
+    MOTIVO_VENTA = 'Venta'
+    MOTIVO_DEVOLUCION = 'Devolución'
+
+    @staticmethod
+    def diferido():
+        return settings.STOCK_DIFERIDO
+
+    @staticmethod
+    def bloquear(producto_ids):
+        """
+        Bloquea los productos en orden de pk antes de modificar su stock.
+        En modo diferido no hace falta: los deltas se insertan sin tocar Producto.
+        """
+        if StockService.diferido() or not producto_ids:
+            return
+        list(Producto.objects.select_for_update().filter(pk__in=producto_ids).order_by('pk').values_list('pk'))
+
+    @staticmethod
+    def aplicar_deltas(deltas):
+        """
+        Aplica los cambios de stock {producto_id: delta}.
+        Directo: un solo UPDATE con F() + Case para sumar sobre el valor actual.
+        Diferido: un solo INSERT de DeltaStock.
+        """
+        deltas = {producto_id: delta for producto_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        if StockService.diferido():
+            DeltaStock.objects.bulk_create([
+                DeltaStock(producto_id=producto_id, delta=delta) for producto_id, delta in deltas.items()
+            ])
+            return len(deltas)
+
+        return StockService._actualizar_stock(deltas)
+
+    @staticmethod
+    def aplicar_items(cantidades, motivo):
+        """
+        Aplica al stock cantidades de items de pedido, dadas como filas
+        (pedido_id, producto_id, cantidad), y deja un Movimiento por fila:
+        Venta descuenta (salida) y Devolución suma (entrada).
+        Una escritura de stock y un INSERT de movimientos, sin importar cuántas filas.
+        Debe llamarse dentro de la transacción que modifica los items.
+        """
+        salida = motivo == StockService.MOTIVO_VENTA
+        deltas = defaultdict(int)
+        movimientos = []
+        for pedido_id, producto_id, cantidad in cantidades:
+            if not cantidad:
+                continue
+            deltas[producto_id] += -cantidad if salida else cantidad
+            movimientos.append(Movimiento(
+                producto_id=producto_id, tipo='salida' if salida else 'entrada', cantidad=cantidad,
+                motivo=motivo, usuario=f"Pedido #{pedido_id}"
+            ))
+
+        StockService.aplicar_deltas(deltas)
+        Movimiento.objects.bulk_create(movimientos)
+        return deltas
+
+    @staticmethod
+    def _actualizar_stock(deltas):
+        return Producto.objects.filter(pk__in=deltas.keys()).update(
+            stock=F('stock') + Case(
+                *[When(pk=producto_id, then=Value(delta)) for producto_id, delta in deltas.items()],
+                default=Value(0),
+                output_field=models.IntegerField()
+            )
+        )
+
+    @staticmethod
+    def consolidar(lote=None):
+        """
+        Aplica a Producto.stock hasta `lote` deltas pendientes y los elimina,
+        en una transacción: los lectores ven el stock antes o después, nunca a medias.
+        Retorna la cantidad de deltas consolidados.
+        """
+        lote = lote or StockService.LOTE_CONSOLIDACION
+        with transaction.atomic():
+            # Se consolidan IDs concretos: un delta que confirma durante la consolidación
+            # queda para la siguiente pasada en vez de borrarse sin aplicar
+            ids = list(DeltaStock.objects.order_by('pk').values_list('pk', flat=True)[:lote])
+            if not ids:
+                return 0
+
+            deltas = dict(
+                DeltaStock.objects.filter(pk__in=ids).order_by().values('producto_id').annotate(
+                    total=Sum('delta')
+                ).values_list('producto_id', 'total')
+            )
+            list(Producto.objects.select_for_update().filter(pk__in=deltas.keys()).order_by('pk').values_list('pk'))
+            StockService._actualizar_stock(deltas)
+            DeltaStock.objects.filter(pk__in=ids).delete()
+
+        logger.info(f"Consolidados {len(ids)} deltas de stock en {len(deltas)} productos")
+        return len(ids)
+
+    @staticmethod
+    def consolidar_producto(producto_id):
+        """
+        Aplica los deltas pendientes de un producto. Se usa antes de escribir su
+        stock absoluto (edición manual) para no sumar deltas ya reflejados.
+        """
+        with transaction.atomic():
+            list(Producto.objects.select_for_update().filter(pk=producto_id).values_list('pk'))
+            ids = list(DeltaStock.objects.filter(producto_id=producto_id).values_list('pk', flat=True))
+            if not ids:
+                return
+            pendientes = DeltaStock.objects.filter(pk__in=ids)
+            StockService._actualizar_stock({producto_id: pendientes.aggregate(total=Sum('delta'))['total']})
+            pendientes.delete()
@@ -0,0 +1,239 @@
+from decimal import Decimal, InvalidOperation
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import status
+from ..models import Producto, Movimiento, ConteoInventario, ConteoLinea
+from .inventory_service import InventoryService
+from .ledger_service import LedgerService
+from .stock_service import StockService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StocktakeService:
+    """
+    Conteo físico de inventario por sesiones. Abrir congela el stock de todo el
+    catálogo en ConteoLinea; los contadores envían cantidades por lotes; el stock
+    esperado de cada línea es el congelado más los movimientos entre la apertura
+    y el momento en que se contó, calculado en SQL. Cerrar aplica todas las
+    diferencias con un UPDATE de líneas, un INSERT de Ajustes y una escritura de stock.
+    """
+    ESTADO_ABIERTO = 'abierto'
+    ESTADO_CERRADO = 'cerrado'
+    ESTADO_CANCELADO = 'cancelado'
+
+    # Máximo de cantidades por envío de un contador
+    MAX_LOTE = 2000
+
+    @staticmethod
+    def abrir(notas='', user=None):
+        """
+        Abre un conteo y congela el stock de cada producto. El stock se lee en un solo
+        SELECT junto con los movimientos posteriores a la apertura, como en
+        LedgerService.snapshot, para que quede consistente con el libro.
+        """
+        try:
+            with transaction.atomic():
+                conteo = ConteoInventario.objects.create(
+                    usuario=user.username if user else 'Sistema', notas=notas or '', fecha_apertura=timezone.now()
+                )
+                posteriores = Movimiento.objects.filter(
+                    producto=OuterRef('pk'), fecha__gt=conteo.fecha_apertura
+                ).order_by().values('producto').annotate(neto=LedgerService._neto()).values('neto')
+                filas = Producto.objects.con_stock_pendiente().annotate(
+                    neto=Coalesce(Subquery(posteriores), 0)
+                ).values_list('pk', 'stock', 'stock_pendiente', 'neto')
+                ConteoLinea.objects.bulk_create([
+                    ConteoLinea(conteo=conteo, producto_id=pk, stock_inicial=stock + pendiente - neto)
+                    for pk, stock, pendiente, neto in filas
+                ])
+        except IntegrityError:
+            return {"error": "Ya hay un conteo abierto. Ciérralo o cancélalo primero.", "status": status.HTTP_409_CONFLICT}
+
+        logger.info(f"Conteo #{conteo.pk} abierto por {conteo.usuario}")
+        return {"conteo": conteo, "status": status.HTTP_201_CREATED}
+
+    @staticmethod
+    def _bloquear_abierto(conteo_id):
+        """Bloquea el conteo; retorna (conteo, None) o (None, error) si no existe o no está abierto."""
+        conteo = ConteoInventario.objects.select_for_update().filter(pk=conteo_id).first()
+        if conteo is None:
+            return None, {"error": "Conteo no encontrado.", "status": status.HTTP_404_NOT_FOUND}
+        if conteo.estado != StocktakeService.ESTADO_ABIERTO:
+            return None, {"error": f"El conteo está {conteo.estado}.", "status": status.HTTP_409_CONFLICT}
+        return conteo, None
+
+    @staticmethod
+    def registrar(conteo_id, lineas, user=None):
+        """
+        Guarda las cantidades contadas [{producto, cantidad}, ...] con un solo upsert.
+        Volver a contar un producto reemplaza la cantidad anterior, así que reenviar
+        un lote no duplica nada. Varios contadores pueden enviar a la vez: cada envío
+        bloquea el conteo solo mientras dura el upsert.
+        Los productos creados después de abrir entran con stock inicial 0 (su stock
+        inicial quedó como movimiento de Ajuste).
+        """
+        if not isinstance(lineas, list) or not lineas:
+            return {"error": "Se requiere una lista 'lineas' no vacía.", "status": status.HTTP_400_BAD_REQUEST}
+        if len(lineas) > StocktakeService.MAX_LOTE:
+            return {
+                "error": f"El lote supera {StocktakeService.MAX_LOTE} líneas. Divídelo en varios envíos.",
+                "status": status.HTTP_400_BAD_REQUEST
+            }
+
+        contados, errores = {}, []
+        for indice, linea in enumerate(lineas):
+            try:
+                producto_id = int(linea.get('producto') or linea.get('producto_id'))
+            except (AttributeError, TypeError, ValueError):
+                errores.append({"linea": indice, "detail": "El ID del producto es requerido y debe ser numérico"})
+                continue
+            try:
+                cantidad = Decimal(str(linea.get('cantidad')))
+                if cantidad < 0 or cantidad != cantidad.to_integral_value():
+                    raise ValueError
+            except (InvalidOperation, ValueError):
+                errores.append({"linea": indice, "detail": "La cantidad debe ser un entero mayor o igual a 0"})
+                continue
+            # Si un producto viene repetido en el lote vale la última cantidad
+            contados[producto_id] = (indice, int(cantidad))
+
+        existentes = set(Producto.objects.filter(pk__in=contados.keys()).values_list('pk', flat=True))
+        errores += [
+            {"linea": indice, "detail": "Producto no encontrado"}
+            for producto_id, (indice, _) in contados.items() if producto_id not in existentes
+        ]
+        if errores:
+            return {
+                "error": "El lote tiene líneas inválidas; no se registró nada.",
+                "errores": sorted(errores, key=lambda e: e["linea"]),
+                "status": status.HTTP_400_BAD_REQUEST
+            }
+
+        with transaction.atomic():
+            conteo, error = StocktakeService._bloquear_abierto(conteo_id)
+            if error:
+                return error
+            ahora = timezone.now()
+            contador = user.username if user else 'Sistema'
+            ConteoLinea.objects.bulk_create(
+                [
+                    ConteoLinea(
+                        conteo=conteo, producto_id=producto_id, stock_inicial=0,
+                        contado=cantidad, contado_por=contador, fecha_conteo=ahora
+                    )
+                    for producto_id, (_, cantidad) in contados.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['conteo', 'producto'],
+                update_fields=['contado', 'contado_por', 'fecha_conteo']
+            )
+
+        return {"registradas": len(contados), "status": status.HTTP_200_OK}
+
+    @staticmethod
+    def _esperado(conteo):
+        """
+        Stock esperado de cada línea al momento en que se contó: el congelado más el
+        neto de los movimientos entre la apertura y fecha_conteo.
+        """
+        durante = Movimiento.objects.filter(
+            producto=OuterRef('producto'), fecha__gt=conteo.fecha_apertura, fecha__lte=OuterRef('fecha_conteo')
+        ).order_by().values('producto').annotate(neto=LedgerService._neto()).values('neto')
+        return F('stock_inicial') + Coalesce(Subquery(durante), 0)
+
+    @staticmethod
+    def diferencias(conteo_id):
+        """
+        Productos contados cuya cantidad no coincide con el stock esperado, en un
+        solo SELECT. En un conteo ya cerrado muestra los ajustes que se aplicaron.
+        """
+        conteo = ConteoInventario.objects.filter(pk=conteo_id).first()
+        if conteo is None:
+            return {"error": "Conteo no encontrado.", "status": status.HTTP_404_NOT_FOUND}
+
+        lineas = conteo.lineas.filter(contado__isnull=False)
+        if conteo.estado == StocktakeService.ESTADO_ABIERTO:
+            lineas = lineas.annotate(esperado=StocktakeService._esperado(conteo)).annotate(
+                diferencia=F('contado') - F('esperado')
+            )
+        else:
+            lineas = lineas.filter(ajuste__isnull=False).annotate(
+                esperado=F('contado') - F('ajuste'), diferencia=F('ajuste')
+            )
+        diferencias = list(
+            lineas.exclude(diferencia=0).order_by('producto_id').values(
+                'producto_id', 'stock_inicial', 'esperado', 'contado', 'diferencia', 'contado_por', 'fecha_conteo',
+                nombre=F('producto__nombre')
+            )
+        )
+        resumen = conteo.lineas.aggregate(
+            productos=Count('pk'), contados=Count('pk', filter=Q(contado__isnull=False))
+        )
+        return {
+            "conteo": conteo.pk, "estado": conteo.estado, **resumen,
+            "diferencias": diferencias, "status": status.HTTP_200_OK
+        }
+
+    @staticmethod
+    def cerrar(conteo_id, user=None):
+        """
+        Cierra el conteo y aplica las diferencias: un UPDATE que guarda el ajuste de
+        cada línea contada (calculado en SQL), un INSERT de movimientos de Ajuste y
+        una escritura de stock. Los productos sin contar no se tocan.
+        No bloquea Producto: los ajustes son deltas y no dependen del stock actual.
+        """
+        with transaction.atomic():
+            conteo, error = StocktakeService._bloquear_abierto(conteo_id)
+            if error:
+                return error
+
+            contadas = conteo.lineas.filter(contado__isnull=False)
+            contadas.update(ajuste=F('contado') - StocktakeService._esperado(conteo))
+            ajustes = dict(contadas.exclude(ajuste=0).values_list('producto_id', 'ajuste'))
+
+            Movimiento.objects.bulk_create([
+                Movimiento(
+                    producto_id=producto_id,
+                    tipo=InventoryService.TIPO_ENTRADA if ajuste > 0 else InventoryService.TIPO_SALIDA,
+                    cantidad=abs(ajuste),
+                    motivo=InventoryService.MOTIVO_AJUSTE,
+                    usuario=f"Conteo #{conteo.pk}"
+                )
+                for producto_id, ajuste in ajustes.items()
+            ])
+            StockService.aplicar_deltas(ajustes)
+
+            conteo.estado = StocktakeService.ESTADO_CERRADO
+            conteo.fecha_cierre = timezone.now()
+            conteo.save(update_fields=['estado', 'fecha_cierre'])
+            sin_contar = conteo.lineas.filter(contado__isnull=True).count()
+
+        logger.warning(
+            f"Conteo #{conteo.pk} cerrado por {user.username if user else 'Sistema'}: "
+            f"{len(ajustes)} ajustes, {sin_contar} productos sin contar"
+        )
+        return {
+            "conteo": conteo.pk,
+            "ajustes": len(ajustes),
+            "unidades_entrada": sum(ajuste for ajuste in ajustes.values() if ajuste > 0),
+            "unidades_salida": -sum(ajuste for ajuste in ajustes.values() if ajuste < 0),
+            "sin_contar": sin_contar,
+            "status": status.HTTP_200_OK
+        }
+
+    @staticmethod
+    def cancelar(conteo_id):
+        """Descarta un conteo abierto sin tocar el stock."""
+        with transaction.atomic():
+            conteo, error = StocktakeService._bloquear_abierto(conteo_id)
+            if error:
+                return error
+            conteo.estado = StocktakeService.ESTADO_CANCELADO
+            conteo.fecha_cierre = timezone.now()
+            conteo.save(update_fields=['estado', 'fecha_cierre'])
+        logger.info(f"Conteo #{conteo.pk} cancelado")
+        return {"conteo": conteo.pk, "status": status.HTTP_200_OK}
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import F
+from ..models import Eliminado, Mesa, Pedido, SecuenciaCambios
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+
+class SyncService:
+    """
+    Soporte para la sincronización incremental (delta-sync) de los dispositivos.
+
+    El cursor es un número de SecuenciaCambios, no una hora: una marca de tiempo se
+    escribe antes del commit y una transacción lenta podía confirmar filas con una
+    hora anterior al cursor que el cliente ya recibió. Aquí el contador se incrementa
+    como último paso de cada transacción (SyncService.transaccion), con la fila del
+    contador bloqueada hasta el commit; así todo número menor o igual al cursor leído
+    pertenece a una transacción ya confirmada.
+    """
+    MODELO_PEDIDO = 'pedido'
+    MODELO_MESA = 'mesa'
+
+    @staticmethod
+    @contextmanager
+    def transaccion():
+        """
+        transaction.atomic() que numera al final los cambios marcados con marca().
+        Anidada solo abre un savepoint: numera la más externa, justo antes del commit.
+        Toda escritura de pedidos, mesas o tombstones debe ir dentro, y ninguna
+        transacción exterior debe tomar bloqueos después de que esta termine.
+        """
+        conexion = transaction.get_connection()
+        if getattr(conexion, 'sync_abierta', False):
+            with transaction.atomic():
+                yield
+            return
+
+        conexion.sync_abierta, conexion.sync_marca = True, None
+        try:
+            with transaction.atomic():
+                yield
+                if conexion.sync_marca is not None:
+                    SyncService._numerar(conexion.sync_marca)
+        finally:
+            conexion.sync_abierta, conexion.sync_marca = False, None
+
+    @staticmethod
+    def marca():
+        """
+        Valor provisional para el campo `cambio` de las filas escritas en la transacción.
+        Es negativo y propio de la transacción: al final se reemplaza por el número
+        definitivo con un UPDATE que solo alcanza filas que ella ya tiene bloqueadas.
+        """
+        conexion = transaction.get_connection()
+        if not getattr(conexion, 'sync_abierta', False):
+            raise RuntimeError("SyncService.marca() debe usarse dentro de SyncService.transaccion()")
+        if conexion.sync_marca is None:
+            conexion.sync_marca = -secrets.randbits(62) - 1
+        return conexion.sync_marca
+
+    @staticmethod
+    def _siguiente():
+        """
+        Incrementa el contador y retorna el nuevo valor. El UPDATE bloquea su fila
+        hasta el commit, por eso se toma al final (después de pedidos, mesas, productos e items).
+        """
+        if not SecuenciaCambios.objects.filter(pk=1).update(valor=F('valor') + 1):
+            SecuenciaCambios.objects.get_or_create(pk=1)
+            SecuenciaCambios.objects.filter(pk=1).update(valor=F('valor') + 1)
+        return SecuenciaCambios.objects.values_list('valor', flat=True).get(pk=1)
+
+    @staticmethod
+    def _numerar(marca):
+        valor = SyncService._siguiente()
+        Pedido.objects.filter(cambio=marca).update(cambio=valor)
+        Mesa.objects.filter(cambio=marca).update(cambio=valor)
+        # modelo__in para usar el índice (modelo, cambio)
+        Eliminado.objects.filter(
+            modelo__in=[SyncService.MODELO_PEDIDO, SyncService.MODELO_MESA], cambio=marca
+        ).update(cambio=valor)
+
+    @staticmethod
+    def cursor_actual():
+        """
+        Último número confirmado. Debe leerse antes de consultar las filas cambiadas.
+        """
+        return SecuenciaCambios.objects.filter(pk=1).values_list('valor', flat=True).first() or 0
+
+    @staticmethod
+    def parse_cursor(valor):
+        """
+        Convierte el parámetro `since` en un número de cambio. Los cursores con fecha
+        de versiones anteriores se rechazan: el cliente debe sincronizar completo.
+
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        try:
+            cursor = int(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Cursor inválido: {valor}")
+        if cursor < 0:
+            raise ValueError(f"Cursor inválido: {valor}")
+        return cursor
+
+    @staticmethod
+    def registrar_eliminados(modelo, ids):
+        """
+        Guarda tombstones para los objetos eliminados con un solo INSERT.
+        Debe llamarse dentro de SyncService.transaccion().
+        """
+        ids = list(ids)
+        marca = SyncService.marca()
+        Eliminado.objects.bulk_create([Eliminado(modelo=modelo, objeto_id=pk, cambio=marca) for pk in ids])
+        logger.info(f"Registrados {len(ids)} tombstones de {modelo}")
+
+    @staticmethod
+    def eliminados_desde(modelo, desde):
+        return list(
+            Eliminado.objects.filter(modelo=modelo, cambio__gt=desde).values_list('objeto_id', flat=True)
+        )
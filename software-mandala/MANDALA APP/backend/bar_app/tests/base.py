@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from ..models import Categoria, Producto, Mesa, Mesera
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BarTestCase(TestCase):
+    """
+    Datos mínimos del bar: un admin autenticado en self.client, productos con
+    stock 10, mesas y una mesera.
+    """
+    STOCK = 10
+
+    def setUp(self):
+        cache.clear()  # Los throttles de DRF usan la caché
+        self.admin = User.objects.create_superuser('admin', 'admin@bar.com', 'clave')
+        self.categoria = Categoria.objects.create(nombre='Cervezas')
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', stock=self.STOCK, precio=1000 + i, categoria_rel=self.categoria)
+            for i in range(3)
+        ]
+        self.mesas = [Mesa.objects.create(numero=str(i + 1)) for i in range(3)]
+        self.mesera = Mesera.objects.create(nombre='Ana', codigo='1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def crear_pedido(self, mesa=None, cantidades=None, **extra):
+        """Crea un pedido por la API. `cantidades` es {indice de producto: cantidad}."""
+        cantidades = cantidades or {0: 2}
+        respuesta = self.client.post('/api/pedidos/', {
+            'mesa': (mesa or self.mesas[0]).pk,
+            'mesera': self.mesera.pk,
+            'productos': [
+                {'producto_id': self.productos[i].pk, 'cantidad': cantidad} for i, cantidad in cantidades.items()
+            ],
+            **extra,
+        }, format='json')
+        self.assertIn(respuesta.status_code, (200, 201), respuesta.data)
+        return respuesta.data
+
+    def stock(self, indice=0):
+        """Stock exacto del producto, incluidos los deltas sin consolidar."""
+        return Producto.objects.get(pk=self.productos[indice].pk).stock_actual
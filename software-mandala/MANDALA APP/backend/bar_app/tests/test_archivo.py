@@ -0,0 +1,59 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from ..models import Pedido, PedidoProducto, PedidoArchivo, ItemPendiente, TiempoDespacho, calcular_jornada
+from ..services.archive_service import ArchiveService
+from ..services.report_service import ReportService
+from .base import BarTestCase
+
+
+class ArchivoTests(BarTestCase):
+    """Archivo de pedidos cerrados antiguos (ArchiveService, archivar_pedidos)."""
+
+    def setUp(self):
+        super().setUp()
+        viejo = calcular_jornada() - timedelta(days=ArchiveService.DIAS + 1)
+        self.finalizado = self.crear_pedido(self.mesas[0], {0: 2, 1: 1})
+        self.client.patch(f"/api/pedidos/{self.finalizado['id']}/", {'estado': 'despachado'}, format='json')
+        self.client.patch(f"/api/pedidos/{self.finalizado['id']}/", {'estado': 'finalizada'}, format='json')
+        self.abierto = self.crear_pedido(self.mesas[1], {0: 1})
+        Pedido.objects.filter(pk__in=[self.finalizado['id'], self.abierto['id']]).update(jornada=viejo)
+        self.cursor = self.client.get('/api/pedidos/changes/').data['cursor']
+
+    def test_archiva_solo_los_cerrados_sin_tocar_el_stock(self):
+        resumen = ArchiveService.archivar()
+
+        self.assertEqual((resumen['pedidos'], resumen['items']), (1, 2))
+        self.assertEqual(list(Pedido.objects.values_list('pk', flat=True)), [self.abierto['id']])
+        self.assertFalse(PedidoProducto.objects.filter(pedido_id=self.finalizado['id']).exists())
+        # La cola del pedido abierto sigue; los tiempos de despacho del archivado se conservan
+        self.assertEqual(list(ItemPendiente.objects.values_list('pedido_id', flat=True)), [self.abierto['id']])
+        self.assertEqual(TiempoDespacho.objects.filter(pedido_id=self.finalizado['id']).count(), 2)
+        archivado = PedidoArchivo.objects.get(pk=self.finalizado['id'])
+        self.assertEqual((archivado.estado, archivado.mesera_id, archivado.mesa_numero), ('finalizada', self.mesera.pk, '1'))
+        self.assertEqual(
+            sorted((item['producto_nombre'], item['cantidad_despachada']) for item in archivado.items),
+            [('Producto 0', 2), ('Producto 1', 1)]
+        )
+        self.assertEqual((self.stock(0), self.stock(1)), (self.STOCK - 2, self.STOCK - 1))
+
+    def test_deja_tombstones_y_los_reportes_siguen_sumando(self):
+        total = sum(v['total_vendido'] for v in ReportService.get_ventas_por_vendedor())
+        ArchiveService.archivar()
+
+        cambios = self.client.get('/api/pedidos/changes/', {'since': self.cursor}).data
+        self.assertEqual(cambios['eliminados'], [self.finalizado['id']])
+        self.assertEqual(sum(v['total_vendido'] for v in ReportService.get_ventas_por_vendedor()), total)
+
+    def test_comando_dry_run_y_reanudacion(self):
+        salida = StringIO()
+        call_command('archivar_pedidos', dry_run=True, stdout=salida)
+        self.assertFalse(PedidoArchivo.objects.exists())
+
+        call_command('archivar_pedidos', stdout=salida)
+        call_command('archivar_pedidos', stdout=salida)
+        self.assertEqual(PedidoArchivo.objects.count(), 1)
+
+        with self.assertRaises(CommandError):
+            call_command('archivar_pedidos', dias=0, stdout=salida)
@@ -0,0 +1,53 @@
+from datetime import timedelta
+from django.utils import timezone
+from ..models import Pedido, Mesa
+from .base import BarTestCase
+
+
+class CambiosTests(BarTestCase):
+    """Sincronización incremental por /changes/ con el cursor de SyncService."""
+
+    def setUp(self):
+        super().setUp()
+        self.pedido = self.crear_pedido(self.mesas[0], {0: 1})
+        self.otro = self.crear_pedido(self.mesas[1], {1: 1})
+        self.cursor = self.client.get('/api/pedidos/changes/').data['cursor']
+        self.cursor_mesas = self.client.get('/api/mesas/changes/').data['cursor']
+
+    def cambios(self, url, cursor):
+        respuesta = self.client.get(url, {'since': cursor})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_solo_trae_lo_cambiado_despues_del_cursor(self):
+        self.client.patch(f"/api/pedidos/{self.pedido['id']}/", {'estado': 'cancelado'}, format='json')
+
+        cambios = self.cambios('/api/pedidos/changes/', self.cursor)
+        self.assertEqual([pedido['id'] for pedido in cambios['pedidos']], [self.pedido['id']])
+        self.assertGreater(cambios['cursor'], self.cursor)
+        self.assertEqual(self.cambios('/api/pedidos/changes/', cambios['cursor'])['pedidos'], [])
+
+        mesas = self.cambios('/api/mesas/changes/', self.cursor_mesas)
+        self.assertEqual([mesa['id'] for mesa in mesas['mesas']], [self.mesas[0].pk])
+
+    def test_cambio_confirmado_tarde_con_hora_anterior_al_cursor_no_se_pierde(self):
+        self.client.patch(f"/api/pedidos/{self.pedido['id']}/", {'estado': 'cancelado'}, format='json')
+        # Una transacción lenta escribe la hora al empezar y confirma después de que el cliente leyó
+        antes = timezone.now() - timedelta(minutes=1)
+        Pedido.objects.filter(pk=self.pedido['id']).update(fecha_actualizacion=antes)
+        Mesa.objects.filter(pk=self.mesas[0].pk).update(fecha_actualizacion=antes)
+
+        cambios = self.cambios('/api/pedidos/changes/', self.cursor)
+        self.assertEqual([pedido['id'] for pedido in cambios['pedidos']], [self.pedido['id']])
+        mesas = self.cambios('/api/mesas/changes/', self.cursor_mesas)
+        self.assertEqual([mesa['id'] for mesa in mesas['mesas']], [self.mesas[0].pk])
+
+    def test_eliminados_y_cursor_invalido(self):
+        self.client.delete(f"/api/pedidos/{self.otro['id']}/")
+
+        cambios = self.cambios('/api/pedidos/changes/', self.cursor)
+        self.assertEqual(cambios['eliminados'], [self.otro['id']])
+        self.assertEqual(cambios['pedidos'], [])
+        # Los cursores con fecha de versiones anteriores obligan a sincronizar completo
+        respuesta = self.client.get('/api/pedidos/changes/', {'since': timezone.now().isoformat()})
+        self.assertEqual(respuesta.status_code, 400)
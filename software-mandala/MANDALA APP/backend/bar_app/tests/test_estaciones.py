@@ -0,0 +1,65 @@
+from ..models import Categoria, ItemPendiente, TiempoDespacho
+from ..services.station_service import StationService
+from .base import BarTestCase
+
+
+class ColasEstacionTests(BarTestCase):
+    """Enrutamiento por estación y mantenimiento de la cola ItemPendiente (StationService)."""
+
+    def setUp(self):
+        super().setUp()
+        # Producto 2 va a la cocina; los demás a la barra por defecto
+        cocina = Categoria.objects.create(nombre='Comidas', estacion='cocina')
+        self.productos[2].categoria_rel = cocina
+        self.productos[2].save()
+
+    def cola(self, estacion):
+        respuesta = self.client.get('/api/pedidos/cola/', {'estacion': estacion})
+        self.assertEqual(respuesta.status_code, 200)
+        return [(item['pedido_id'], item['producto_id']) for item in respuesta.data['items']]
+
+    def test_items_se_enrutan_a_su_estacion_en_orden_de_llegada(self):
+        primero = self.crear_pedido(self.mesas[0], {0: 1, 2: 1})
+        segundo = self.crear_pedido(self.mesas[1], {1: 1})
+
+        self.assertEqual(self.cola('barra'), [
+            (primero['id'], self.productos[0].pk), (segundo['id'], self.productos[1].pk)
+        ])
+        self.assertEqual(self.cola('cocina'), [(primero['id'], self.productos[2].pk)])
+        self.assertEqual(self.cola('barra_vip'), [])
+
+    def test_estacion_invalida_responde_400(self):
+        respuesta = self.client.get('/api/pedidos/cola/', {'estacion': 'terraza'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_despachar_saca_de_la_cola_y_registra_la_espera(self):
+        pedido = self.crear_pedido(self.mesas[0], {0: 1, 2: 1})
+        cocina = next(i for i in pedido['productos_detalle'] if i['producto_nombre'] == self.productos[2].nombre)
+
+        self.client.post(f"/api/pedidos/{pedido['id']}/despachar_producto/", {'item_id': cocina['id']})
+
+        self.assertEqual(self.cola('cocina'), [])
+        self.assertEqual(len(self.cola('barra')), 1)
+        self.assertEqual(list(TiempoDespacho.objects.values_list('item_id', 'estacion')), [(cocina['id'], 'cocina')])
+
+    def test_agregar_conserva_la_antiguedad_y_cancelar_vacia_la_cola(self):
+        pedido = self.crear_pedido(self.mesas[0], {0: 1})
+        fecha = ItemPendiente.objects.get().fecha
+        self.client.post('/api/pedidos/', {
+            'mesa': self.mesas[0].pk, 'mesera': self.mesera.pk, 'force_append': True,
+            'productos': [{'producto_id': self.productos[0].pk, 'cantidad': 1}],
+        }, format='json')
+        self.assertEqual(ItemPendiente.objects.get().fecha, fecha)
+
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'estado': 'cancelado'}, format='json')
+        self.assertFalse(ItemPendiente.objects.exists())
+
+    def test_reconstruir_repara_la_cola_y_reenruta(self):
+        self.crear_pedido(self.mesas[0], {0: 1, 2: 1})
+        ItemPendiente.objects.filter(estacion='cocina').delete()
+        Categoria.objects.filter(pk=self.categoria.pk).update(estacion='barra_vip')
+
+        self.assertEqual(StationService.reconstruir(), 2)
+        self.assertEqual(len(self.cola('barra_vip')), 1)
+        self.assertEqual(len(self.cola('cocina')), 1)
+        self.assertEqual(self.cola('barra'), [])
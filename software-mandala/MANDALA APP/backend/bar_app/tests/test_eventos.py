@@ -0,0 +1,83 @@
+import asyncio
+import contextlib
+import json
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import Group, User
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+from ..services.event_service import EventService
+from ..views import eventos_pedidos
+from .base import BarTestCase
+
+
+@override_settings(EVENT_BROKER='bar_app.services.event_service.InProcessBroker')
+class EventosTests(BarTestCase):
+    """Publicar un evento de pedido y recibirlo por /api/eventos/ con el broker en memoria."""
+
+    def setUp(self):
+        super().setUp()
+        EventService._broker = None
+        self.addCleanup(setattr, EventService, '_broker', None)
+        self.bartender = User.objects.create_user('barra', password='clave')
+        self.bartender.groups.add(Group.objects.create(name='Bartender'))
+        self.tablet = User.objects.create_user('tablet', password='clave')
+
+    def peticion(self, user=None, **params):
+        extra = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=user).key}'} if user else {}
+        return RequestFactory().get('/api/eventos/', params, **extra)
+
+    def crear_pedido_publicado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.crear_pedido(self.mesas[1])
+
+    def recibir(self, request, espera=0.5):
+        """Abre el stream, publica un pedido y retorna (status, eventos recibidos)."""
+        async def escuchar():
+            response = await eventos_pedidos(request)
+            if response.status_code != 200:
+                return response.status_code, []
+            stream = aiter(response.streaming_content)
+            self.assertEqual(await anext(stream), b': conectado\n\n')
+            siguiente = asyncio.ensure_future(anext(stream))
+            broker = EventService.get_broker()
+            while not broker._suscriptores:
+                await asyncio.sleep(0.01)
+
+            await sync_to_async(self.crear_pedido_publicado)()
+            eventos = []
+            try:
+                while True:
+                    eventos.append(await asyncio.wait_for(asyncio.shield(siguiente), espera))
+                    siguiente = asyncio.ensure_future(anext(stream))
+            except asyncio.TimeoutError:
+                siguiente.cancel()
+                with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                    await siguiente
+            await stream.aclose()
+            return response.status_code, [
+                json.loads(evento.decode().split('data: ', 1)[1]) for evento in eventos if evento.startswith(b'event:')
+            ]
+
+        return async_to_sync(escuchar)()
+
+    def test_sin_credenciales_responde_401(self):
+        status, _ = self.recibir(self.peticion(rol='bartender'))
+        self.assertEqual(status, 401)
+
+    def test_bartender_recibe_todos_los_pedidos(self):
+        status, eventos = self.recibir(self.peticion(self.bartender))
+        self.assertEqual(status, 200)
+        self.assertEqual([e['tipo'] for e in eventos], [EventService.PEDIDO_CREADO])
+        self.assertEqual(eventos[0]['mesa_id'], self.mesas[1].pk)
+
+    def test_rol_del_query_string_no_da_acceso_global(self):
+        # Sin filtros un usuario común solo ve sus propios pedidos (este es de una mesera)
+        status, eventos = self.recibir(self.peticion(self.tablet, rol='bartender'), espera=0.2)
+        self.assertEqual(status, 200)
+        self.assertEqual(eventos, [])
+
+    def test_usuario_recibe_los_eventos_de_su_filtro(self):
+        status, eventos = self.recibir(self.peticion(self.tablet, mesa=self.mesas[1].pk))
+        self.assertEqual(status, 200)
+        self.assertEqual([e['tipo'] for e in eventos], [EventService.PEDIDO_CREADO])
+        self.assertEqual(eventos[0]['mesera_id'], self.mesera.pk)
@@ -0,0 +1,51 @@
+from ..models import Pedido, ClaveIdempotencia
+from ..services.idempotency_service import IdempotencyService
+from ..services.offline_service import OfflineSyncService
+from .base import BarTestCase
+
+
+class IdempotencyKeyTests(BarTestCase):
+    """Header Idempotency-Key en POST /api/pedidos/ (IdempotencyService)."""
+
+    def crear(self, clave, cantidad=2):
+        return self.client.post('/api/pedidos/', {
+            'mesa': self.mesas[0].pk, 'mesera': self.mesera.pk,
+            'productos': [{'producto_id': self.productos[0].pk, 'cantidad': cantidad}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_repite_la_respuesta_sin_duplicar(self):
+        primera = self.crear('tablet-1')
+        segunda = self.crear('tablet-1')
+
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual((segunda.status_code, segunda.content), (201, primera.content))
+        self.assertEqual(segunda[IdempotencyService.HEADER_REPETIDA], 'true')
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_misma_clave_con_otro_cuerpo_responde_422(self):
+        self.crear('tablet-1')
+        respuesta = self.crear('tablet-1', cantidad=5)
+
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_error_del_cliente_se_guarda(self):
+        self.crear_pedido()  # La mesa queda ocupada: sin force_append el alta falla
+        primera = self.crear('tablet-1')
+        segunda = self.crear('tablet-1')
+
+        self.assertEqual(primera.status_code, 400)
+        self.assertEqual(segunda[IdempotencyService.HEADER_REPETIDA], 'true')
+
+    def test_rechaza_claves_con_el_prefijo_de_la_sincronizacion_offline(self):
+        uuid = '0b5c7a52-3f3e-4a63-9d3f-2f5b8c1e7a10'
+        ClaveIdempotencia.objects.create(
+            clave=OfflineSyncService.PREFIJO_CLAVE + uuid, huella='x', status_code=201,
+            respuesta={'uuid': uuid, 'estado': OfflineSyncService.CREADO, 'pedido_id': 1}
+        )
+
+        respuesta = self.crear(OfflineSyncService.PREFIJO_CLAVE + uuid)
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertNotIn(IdempotencyService.HEADER_REPETIDA, respuesta)
+        self.assertEqual(Pedido.objects.count(), 0)
@@ -0,0 +1,134 @@
+from django.test import override_settings
+from ..models import Movimiento, DeltaStock, ConteoLinea
+from ..services.inventory_service import InventoryService
+from .base import BarTestCase
+
+
+class MovimientosLoteTests(BarTestCase):
+    """POST /api/movimientos/lote/ (InventoryService.create_movements_batch): todo o nada."""
+
+    def lote(self, movimientos):
+        return self.client.post('/api/movimientos/lote/', {'movimientos': movimientos}, format='json')
+
+    def linea(self, indice, tipo, cantidad):
+        return {'producto': self.productos[indice].pk, 'tipo': tipo, 'cantidad': cantidad, 'motivo': 'Compra'}
+
+    def test_lote_valido_registra_todo_en_orden(self):
+        # La salida de la línea 2 usa lo que entró en la línea 0
+        respuesta = self.lote([
+            self.linea(0, 'entrada', 5), self.linea(1, 'salida', 4), self.linea(0, 'salida', 15),
+        ])
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual([fila['stock'] for fila in respuesta.data['movimientos']], [15, 6, 0])
+        self.assertEqual(Movimiento.objects.count(), 3)
+        self.assertEqual((self.stock(0), self.stock(1)), (0, 6))
+
+    def test_una_linea_invalida_rechaza_el_lote(self):
+        respuesta = self.lote([
+            self.linea(0, 'entrada', 5),
+            {'producto': self.productos[1].pk, 'tipo': 'regalo', 'cantidad': 1},
+            {'producto': 99999, 'tipo': 'entrada', 'cantidad': 1},
+            self.linea(2, 'entrada', 0),
+        ])
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([error['linea'] for error in respuesta.data['errores']], [1, 2, 3])
+        self.assertFalse(Movimiento.objects.exists())
+        self.assertEqual(self.stock(0), self.STOCK)
+
+    def test_stock_insuficiente_rechaza_el_lote(self):
+        respuesta = self.lote([self.linea(0, 'entrada', 5), self.linea(1, 'salida', self.STOCK + 1)])
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([error['linea'] for error in respuesta.data['errores']], [1])
+        self.assertFalse(Movimiento.objects.exists())
+        self.assertEqual((self.stock(0), self.stock(1)), (self.STOCK, self.STOCK))
+
+    def test_lote_vacio_o_demasiado_grande(self):
+        self.assertEqual(self.lote([]).status_code, 400)
+        respuesta = self.lote([self.linea(0, 'entrada', 1)] * (InventoryService.MAX_LOTE + 1))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Movimiento.objects.exists())
+
+    @override_settings(STOCK_DIFERIDO=True)
+    def test_modo_diferido_cuenta_los_deltas_pendientes(self):
+        DeltaStock.objects.create(producto=self.productos[0], delta=-self.STOCK)
+
+        respuesta = self.lote([self.linea(0, 'salida', 1)])
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.lote([self.linea(0, 'entrada', 2), self.linea(0, 'salida', 1)]).status_code, 201)
+        self.assertEqual(self.stock(), 1)
+
+
+class ConteoTests(BarTestCase):
+    """Conteo físico por sesiones (StocktakeService, /api/conteos/)."""
+
+    def setUp(self):
+        super().setUp()
+        respuesta = self.client.post('/api/conteos/', {'notas': 'Cierre de mes'}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.url = f"/api/conteos/{respuesta.data['id']}"
+
+    def contar(self, cantidades):
+        return self.client.post(f'{self.url}/lineas/', {'lineas': [
+            {'producto': self.productos[i].pk, 'cantidad': cantidad} for i, cantidad in cantidades.items()
+        ]}, format='json')
+
+    def vender(self, indice, cantidad, mesa):
+        pedido = self.crear_pedido(self.mesas[mesa], {indice: cantidad})
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'estado': 'despachado'}, format='json')
+
+    def test_cerrar_ajusta_segun_el_stock_al_momento_de_contar(self):
+        self.vender(1, 3, mesa=0)  # Vendido antes de contarlo: el conteo ya lo refleja
+        self.assertEqual(self.contar({0: 9, 1: 7}).status_code, 200)
+        self.vender(0, 2, mesa=1)  # Vendido después de contarlo: no es faltante
+
+        diferencias = self.client.get(f'{self.url}/diferencias/').data
+        self.assertEqual(
+            [(d['producto_id'], d['esperado'], d['diferencia']) for d in diferencias['diferencias']],
+            [(self.productos[0].pk, self.STOCK, -1)]
+        )
+        self.assertEqual((diferencias['productos'], diferencias['contados']), (3, 2))
+
+        cierre = self.client.post(f'{self.url}/cerrar/')
+
+        self.assertEqual(
+            (cierre.data['ajustes'], cierre.data['unidades_salida'], cierre.data['sin_contar']), (1, 1, 1)
+        )
+        self.assertEqual((self.stock(0), self.stock(1), self.stock(2)), (self.STOCK - 3, self.STOCK - 3, self.STOCK))
+        self.assertEqual(
+            list(Movimiento.objects.filter(usuario__startswith='Conteo #').values_list('tipo', 'cantidad')), [('salida', 1)]
+        )
+        self.assertEqual(self.client.get(f'{self.url}/diferencias/').data['diferencias'][0]['diferencia'], -1)
+
+    def test_solo_un_conteo_abierto_y_cerrado_no_admite_cambios(self):
+        self.assertEqual(self.client.post('/api/conteos/', {}, format='json').status_code, 409)
+        self.client.post(f'{self.url}/cerrar/')
+
+        self.assertEqual(self.contar({0: 1}).status_code, 409)
+        self.assertEqual(self.client.post(f'{self.url}/cerrar/').status_code, 409)
+        self.assertEqual(self.client.post('/api/conteos/', {}, format='json').status_code, 201)
+
+    def test_recontar_reemplaza_y_lineas_invalidas_no_registran_nada(self):
+        self.contar({0: 4})
+        self.contar({0: 6})
+        respuesta = self.client.post(f'{self.url}/lineas/', {'lineas': [
+            {'producto': self.productos[1].pk, 'cantidad': 2}, {'producto': 99999, 'cantidad': 1},
+            {'producto': self.productos[2].pk, 'cantidad': -1},
+        ]}, format='json')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([error['linea'] for error in respuesta.data['errores']], [1, 2])
+        self.assertEqual(
+            list(ConteoLinea.objects.filter(contado__isnull=False).values_list('producto_id', 'contado')),
+            [(self.productos[0].pk, 6)]
+        )
+
+    def test_cancelar_no_toca_el_stock(self):
+        self.contar({0: 1})
+        self.assertEqual(self.client.post(f'{self.url}/cancelar/').status_code, 200)
+
+        self.assertEqual(self.stock(), self.STOCK)
+        self.assertFalse(Movimiento.objects.exists())
@@ -0,0 +1,57 @@
+import json
+from ..models import Pedido, PedidoProducto, Producto, Mesa, calcular_jornada
+from .base import BarTestCase
+
+
+class LecturaRapidaTests(BarTestCase):
+    """?rapido=true (ReadService) debe producir el mismo JSON que los serializers."""
+
+    def setUp(self):
+        super().setUp()
+        # Pedido de mesera, pedido de usuario del sistema y pedido sin vendedor
+        self.crear_pedido(self.mesas[0], {0: 2, 1: 1})
+        self.client.post('/api/pedidos/', {
+            'mesa': self.mesas[1].pk, 'usuario': self.admin.pk,
+            'productos': [{'producto_id': self.productos[2].pk, 'cantidad': 3}],
+        }, format='json')
+        huerfano = Pedido.objects.create(mesa=self.mesas[2], jornada=calcular_jornada(), total=0, estado='finalizada')
+        # Item sin precio_unitario: se muestra el precio actual del producto
+        PedidoProducto.objects.create(pedido=huerfano, producto=self.productos[0], cantidad=1, precio_unitario=0)
+        # Producto sin categoría ni imagen, y mesa sin pedido activo
+        Producto.objects.create(nombre='Sin categoría', stock=0, precio=0)
+        Mesa.objects.create(numero='99')
+
+    def resultados(self, url, **params):
+        respuesta = self.client.get(url, params)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = json.loads(respuesta.content)
+        # Los enlaces de paginación repiten los parámetros; se comparan los resultados
+        return datos['results'] if isinstance(datos, dict) and 'results' in datos else datos
+
+    def assertParidad(self, url, **params):
+        completa = self.resultados(url, **params)
+        rapida = self.resultados(url, rapido='true', **params)
+        self.assertTrue(completa)
+        self.assertEqual(rapida, completa)
+        return completa
+
+    def test_pedidos(self):
+        pedidos = self.assertParidad('/api/pedidos/')
+        self.assertEqual(sorted(p['mesera_nombre'] for p in pedidos), ['ADMIN', 'Ana', 'N/A'])
+
+    def test_pedidos_filtrados(self):
+        self.assertParidad('/api/pedidos/', estado='pendiente')
+
+    def test_productos(self):
+        productos = self.assertParidad('/api/productos/')
+        self.assertIn(None, [p['categoria_rel'] for p in productos])
+
+    def test_mesas(self):
+        mesas = self.assertParidad('/api/mesas/')
+        self.assertEqual(
+            sorted((m['ocupada_por_tipo'] or '') for m in mesas), ['', '', 'mesera', 'usuario']
+        )
+
+    def test_representaciones_no_completas_ignoran_rapido(self):
+        for params in ({'vista': 'compacta', 'expand': 'items'}, {'fields': 'id,estado'}):
+            self.assertParidad('/api/pedidos/', **params)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import override_settings
+from django.utils import timezone
+from ..models import Producto, Movimiento, SnapshotStock, calcular_jornada, cierre_jornada
+from ..services.ledger_service import LedgerService
+from .base import BarTestCase
+
+
+class LibroStockTests(BarTestCase):
+    """Snapshots por jornada y stock histórico (LedgerService.snapshot / stock_en)."""
+
+    def setUp(self):
+        super().setUp()
+        self.ayer = calcular_jornada() - timedelta(days=1)
+        self.cierre = cierre_jornada(self.ayer)
+        # Producto 0: salida de 3 antes del cierre de ayer y entrada de 5 después
+        self.mover(0, 'salida', 3, self.cierre - timedelta(hours=2))
+        self.mover(0, 'entrada', 5, self.cierre + timedelta(seconds=1))
+
+    def mover(self, indice, tipo, cantidad, fecha):
+        movimiento = Movimiento.objects.create(
+            producto=self.productos[indice], tipo=tipo, cantidad=cantidad, motivo='Ajuste', usuario='test'
+        )
+        Movimiento.objects.filter(pk=movimiento.pk).update(fecha=fecha)
+        Producto.objects.filter(pk=self.productos[indice].pk).update(
+            stock=F('stock') + (cantidad if tipo == 'entrada' else -cantidad)
+        )
+
+    def stock_en(self, momento):
+        return {fila['producto']: fila['stock'] for fila in LedgerService.stock_en(momento)}
+
+    def test_snapshot_guarda_el_stock_al_cierre(self):
+        self.assertEqual(LedgerService.snapshot(self.ayer), len(self.productos))
+        LedgerService.snapshot(self.ayer)  # Repetirlo reemplaza el anterior
+
+        self.assertEqual(
+            dict(SnapshotStock.objects.values_list('producto_id', 'stock')),
+            {self.productos[0].pk: self.STOCK - 3, self.productos[1].pk: self.STOCK, self.productos[2].pk: self.STOCK}
+        )
+
+    def test_stock_en_es_igual_con_y_sin_snapshot(self):
+        momentos = [self.cierre - timedelta(hours=3), self.cierre, timezone.now()]
+        sin_snapshot = [self.stock_en(momento) for momento in momentos]
+        LedgerService.snapshot(self.ayer)
+
+        self.assertEqual([self.stock_en(momento) for momento in momentos], sin_snapshot)
+        self.assertEqual(
+            [stock[self.productos[0].pk] for stock in sin_snapshot], [self.STOCK, self.STOCK - 3, self.STOCK + 2]
+        )
+
+    def test_jornada_abierta_no_se_guarda(self):
+        with self.assertRaises(ValueError):
+            LedgerService.snapshot(calcular_jornada())
+        with self.assertRaises(CommandError):
+            call_command('snapshot_stock', jornada=str(calcular_jornada()), stdout=StringIO())
+
+    def test_endpoints_stock_en_y_stock_cierre(self):
+        call_command('snapshot_stock', stdout=StringIO())
+
+        respuesta = self.client.get(
+            f'/api/productos/{self.productos[0].pk}/stock_en/', {'fecha': self.cierre.isoformat()}
+        )
+        self.assertEqual(respuesta.data['stock'], self.STOCK - 3)
+        cierre = self.client.get('/api/productos/stock_cierre/', {'jornada': str(self.ayer)})
+        self.assertEqual(cierre.data['productos'][0]['stock'], self.STOCK - 3)
+        self.assertEqual(self.client.get('/api/productos/stock_cierre/').status_code, 400)
+
+    @override_settings(STOCK_DIFERIDO=True)
+    def test_stock_en_incluye_los_deltas_sin_consolidar(self):
+        pedido = self.crear_pedido(cantidades={1: 4})
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'estado': 'despachado'}, format='json')
+
+        self.assertEqual(self.stock_en(timezone.now())[self.productos[1].pk], self.STOCK - 4)
+        self.assertEqual(self.stock_en(self.cierre)[self.productos[1].pk], self.STOCK)
+
+
+class VerificarStockTests(BarTestCase):
+    """Comando verificar_stock y sus modos de reparación."""
+
+    def verificar(self, **opciones):
+        salida = StringIO()
+        call_command('verificar_stock', stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def snapshot(self, stock=None):
+        """Snapshot de hace una hora con el stock actual de todos los productos."""
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        SnapshotStock.objects.bulk_create([
+            SnapshotStock(
+                producto=producto, jornada=calcular_jornada() - timedelta(days=1),
+                fecha=hace_una_hora, stock=self.STOCK if stock is None else stock
+            )
+            for producto in self.productos
+        ])
+
+    def test_sin_snapshot_rechaza_reparar_stock(self):
+        # El stock inicial no tiene movimientos: el libro "espera" 0
+        with self.assertRaises(CommandError):
+            self.verificar(reparar='stock')
+        self.assertEqual(self.stock(), self.STOCK)
+
+    def test_completo_rechaza_reparar_stock_aunque_haya_snapshot(self):
+        self.snapshot()
+        with self.assertRaises(CommandError):
+            self.verificar(reparar='stock', completo=True)
+
+    def test_sin_snapshot_reparar_libro_registra_ajustes(self):
+        self.verificar(reparar='libro')
+
+        self.assertEqual(self.stock(), self.STOCK)
+        self.assertEqual(
+            Movimiento.objects.filter(motivo='Ajuste', tipo='entrada', cantidad=self.STOCK).count(), len(self.productos)
+        )
+        self.assertIn('El stock cuadra', self.verificar())
+
+    def test_con_snapshot_reparar_stock_corrige_la_deriva(self):
+        self.snapshot()
+        Producto.objects.filter(pk=self.productos[0].pk).update(stock=7)  # Cambio sin movimiento
+
+        self.assertIn('1 con diferencias', self.verificar())
+        self.verificar(reparar='stock')
+
+        self.assertEqual(self.stock(), self.STOCK)
+        self.assertIn('El stock cuadra', self.verificar())
@@ -0,0 +1,33 @@
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+from ..pagination import PedidoPagination
+from .base import BarTestCase
+
+
+@mock.patch.object(PedidoPagination, 'limite_sin_paginar', 2)
+class PaginacionPedidosTests(BarTestCase):
+    """Paginación por cursor de /api/pedidos/ y su límite con ?paginar=false."""
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.crear_pedido(mesa)['id'] for mesa in self.mesas]
+
+    def test_sin_paginar_sobre_el_limite_responde_400(self):
+        respuesta = self.client.get('/api/pedidos/', {'mesera': self.mesera.pk, 'paginar': 'false'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_seguir_el_cursor_de_next_trae_todo_el_historial(self):
+        # Lo que hace el historial del frontend (useHistorialPedidos)
+        params = {'mesera': self.mesera.pk, 'page_size': 2}
+        vistos, paginas = [], 0
+        while True:
+            respuesta = self.client.get('/api/pedidos/', params)
+            self.assertEqual(respuesta.status_code, 200)
+            vistos += [pedido['id'] for pedido in respuesta.data['results']]
+            paginas += 1
+            if not respuesta.data['next']:
+                break
+            params['cursor'] = parse_qs(urlparse(respuesta.data['next']).query)['cursor'][0]
+
+        self.assertEqual(paginas, 2)
+        self.assertEqual(vistos, sorted(self.ids, reverse=True))
@@ -0,0 +1,159 @@
+from unittest import mock
+from ..models import Pedido
+from ..serializers import PedidoSerializer
+from ..services.order_service import OrderService, ConflictoEstado
+from .base import BarTestCase
+
+
+class CompareAndSwapTests(BarTestCase):
+    """Cambios de estado concurrentes (OrderService.transicionar_estado / update_order)."""
+
+    def test_segundo_despacho_concurrente_responde_conflicto(self):
+        pedido_id = self.crear_pedido()['id']
+        a, b = Pedido.objects.get(pk=pedido_id), Pedido.objects.get(pk=pedido_id)
+
+        OrderService.transicionar_estado(a, 'despachado')
+        with self.assertRaises(ConflictoEstado):
+            OrderService.transicionar_estado(b, 'despachado')
+
+        self.assertEqual(self.stock(), self.STOCK - 2)
+        self.assertEqual(Pedido.objects.get(pk=pedido_id).version, 1)
+
+    def test_patch_con_version_vieja_responde_409(self):
+        pedido_id = self.crear_pedido()['id']
+        self.client.patch(f'/api/pedidos/{pedido_id}/', {'estado': 'despachado'}, format='json')
+
+        respuesta = self.client.patch(f'/api/pedidos/{pedido_id}/', {'estado': 'cancelado', 'version': 0}, format='json')
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.data['estado'], 'despachado')
+        self.assertEqual(respuesta.data['version'], 1)
+        self.assertEqual(self.stock(), self.STOCK - 2)
+
+    def test_patch_viejo_con_otros_campos_no_pisa_un_pedido_cancelado(self):
+        pedido_id = self.crear_pedido()['id']
+        leido = Pedido.objects.get(pk=pedido_id)  # Lectura del dispositivo que llega tarde
+        OrderService.transicionar_estado(Pedido.objects.get(pk=pedido_id), 'cancelado')
+
+        serializer = PedidoSerializer(leido, data={'estado': 'despachado', 'total': '20.00'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(ConflictoEstado):
+            OrderService.update_order(serializer)
+
+        pedido = Pedido.objects.get(pk=pedido_id)
+        self.assertEqual(pedido.estado, 'cancelado')
+        self.assertEqual(pedido.version, 1)
+        self.assertNotEqual(str(pedido.total), '20.00')
+        self.assertEqual(self.stock(), self.STOCK)
+
+    def test_patch_sin_estado_no_revierte_el_estado(self):
+        pedido_id = self.crear_pedido()['id']
+        leido = Pedido.objects.get(pk=pedido_id)
+        OrderService.transicionar_estado(Pedido.objects.get(pk=pedido_id), 'cancelado')
+
+        serializer = PedidoSerializer(leido, data={'total': '20.00'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        OrderService.update_order(serializer)
+
+        pedido = Pedido.objects.get(pk=pedido_id)
+        self.assertEqual((pedido.estado, pedido.version, str(pedido.total)), ('cancelado', 1, '20.00'))
+
+
+class AgregarYDespacharTests(BarTestCase):
+    """Agregar productos a un pedido activo y despachar items (OrderService, user-013)."""
+
+    def agregar(self, productos):
+        return self.client.post('/api/pedidos/', {
+            'mesa': self.mesas[0].pk, 'mesera': self.mesera.pk, 'force_append': True, 'productos': productos,
+        }, format='json')
+
+    def test_agregar_agrupa_lineas_repetidas(self):
+        pedido_id = self.crear_pedido()['id']
+        respuesta = self.agregar([
+            {'producto_id': self.productos[0].pk, 'cantidad': 1},
+            {'producto_id': self.productos[0].pk, 'cantidad': 2},
+        ])
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['id'], pedido_id)
+        self.assertEqual([item['cantidad'] for item in respuesta.data['productos_detalle']], [5])
+
+    def test_agregar_lineas_invalidas_responde_400(self):
+        self.crear_pedido()
+        for productos in (
+            [{'cantidad': 1}],
+            [{'producto_id': 'abc', 'cantidad': 1}],
+            [{'producto_id': self.productos[0].pk, 'cantidad': 0}],
+        ):
+            respuesta = self.agregar(productos)
+            self.assertEqual(respuesta.status_code, 400, productos)
+            self.assertIn('productos', respuesta.data)
+
+    def test_agregar_producto_inexistente_responde_404(self):
+        self.crear_pedido()
+        respuesta = self.agregar([{'producto_id': 99999, 'cantidad': 1}])
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_despachar_producto_completa_el_pedido(self):
+        pedido = self.crear_pedido(cantidades={0: 2, 1: 1})
+        item_ids = [item['id'] for item in pedido['productos_detalle']]
+
+        primero = self.client.post(f"/api/pedidos/{pedido['id']}/despachar_producto/", {'item_id': item_ids[0]})
+        segundo = self.client.post(f"/api/pedidos/{pedido['id']}/despachar_producto/", {'item_id': item_ids[1]})
+
+        self.assertEqual(primero.data['pedido_estado'], 'pendiente')
+        self.assertEqual(segundo.data['pedido_estado'], 'despachado')
+        self.assertEqual((self.stock(0), self.stock(1)), (self.STOCK - 2, self.STOCK - 1))
+        self.assertEqual(Pedido.objects.get(pk=pedido['id']).version, 1)
+
+    def test_despachar_producto_de_pedido_cancelado_no_descuenta_stock(self):
+        pedido = self.crear_pedido()
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'estado': 'cancelado'}, format='json')
+
+        respuesta = self.client.post(
+            f"/api/pedidos/{pedido['id']}/despachar_producto/", {'item_id': pedido['productos_detalle'][0]['id']}
+        )
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(self.stock(), self.STOCK)
+
+    def test_despachar_lote(self):
+        abierto = self.crear_pedido(self.mesas[0], {0: 2})
+        cancelado = self.crear_pedido(self.mesas[1], {1: 1})
+        self.client.patch(f"/api/pedidos/{cancelado['id']}/", {'estado': 'cancelado'}, format='json')
+        items = [
+            {'pedido': abierto['id'], 'item_id': abierto['productos_detalle'][0]['id']},
+            {'pedido': cancelado['id'], 'item_id': cancelado['productos_detalle'][0]['id']},
+            {'pedido': abierto['id'], 'item_id': 99999},
+        ]
+
+        respuesta = self.client.post('/api/pedidos/despachar_lote/', {'items': items}, format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            list(respuesta.data['resultados'].values()),
+            [OrderService.LOTE_DESPACHADO, OrderService.LOTE_PEDIDO_CERRADO, OrderService.LOTE_NO_ENCONTRADO]
+        )
+        self.assertEqual(respuesta.data['pedidos'], {abierto['id']: 'despachado'})
+        self.assertEqual((self.stock(0), self.stock(1)), (self.STOCK - 2, self.STOCK))
+
+    def test_despachar_lote_con_pedido_eliminado_en_paralelo(self):
+        pedido = self.crear_pedido()
+        item_id = pedido['productos_detalle'][0]['id']
+        original = Pedido.objects.get(pk=pedido['id'])
+        bloquear = OrderService._bloquear_items
+
+        def bloquear_y_eliminar(items):
+            # Otro dispositivo elimina el pedido entre la lectura de los items y la de los estados
+            bloqueados = bloquear(items)
+            eliminado = Pedido.objects.filter(pk=pedido['id'])
+            eliminado._raw_delete(eliminado.db)
+            return bloqueados
+
+        with mock.patch.object(OrderService, '_bloquear_items', staticmethod(bloquear_y_eliminar)):
+            resultado = OrderService.despachar_lote([(pedido['id'], item_id)])
+        original.save(force_insert=True)  # Las FK se verifican al final del test
+
+        self.assertEqual(resultado['status'], 200)
+        self.assertEqual(resultado['resultados'], {item_id: OrderService.LOTE_NO_ENCONTRADO})
+        self.assertEqual(self.stock(), self.STOCK)
@@ -0,0 +1,66 @@
+from ..models import Pedido, PedidoProducto, Mesa, Movimiento, ItemPendiente, TiempoDespacho
+from ..services.purge_service import PurgeService
+from ..services.stock_service import StockService
+from .base import BarTestCase
+
+
+class PurgaTests(BarTestCase):
+    """Borrado por tramos de pedidos (PurgeService, borrar_historial, eliminar_pedidos)."""
+
+    def setUp(self):
+        super().setUp()
+        despachado = self.crear_pedido(self.mesas[0], {0: 2, 1: 1})
+        self.client.patch(f"/api/pedidos/{despachado['id']}/", {'estado': 'despachado'}, format='json')
+        pendiente = self.crear_pedido(self.mesas[1], {0: 4})
+        self.ids = [despachado['id'], pendiente['id']]
+        self.cursor = self.client.get('/api/pedidos/changes/').data['cursor']
+
+    def test_borrar_historial_devuelve_solo_lo_despachado(self):
+        respuesta = self.client.delete('/api/pedidos/borrar_historial/')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(PedidoProducto.objects.exists())
+        self.assertEqual((self.stock(0), self.stock(1)), (self.STOCK, self.STOCK))
+        self.assertEqual(
+            sorted(Movimiento.objects.filter(motivo=StockService.MOTIVO_DEVOLUCION).values_list('cantidad', flat=True)),
+            [1, 2]
+        )
+        self.assertFalse(Mesa.objects.filter(pedido_activo__isnull=False).exists())
+
+    def test_borra_la_cola_y_los_tiempos_de_despacho(self):
+        self.assertTrue(ItemPendiente.objects.exists())
+        self.assertTrue(TiempoDespacho.objects.exists())
+
+        resumen = PurgeService.purgar(Pedido.objects.all())
+
+        self.assertEqual((resumen['pedidos'], resumen['items']), (2, 3))
+        self.assertFalse(ItemPendiente.objects.exists())
+        self.assertFalse(TiempoDespacho.objects.exists())
+
+    def test_la_purga_deja_tombstones_para_la_sincronizacion(self):
+        self.client.delete('/api/pedidos/borrar_historial/')
+
+        cambios = self.client.get('/api/pedidos/changes/', {'since': self.cursor}).data
+        self.assertEqual(sorted(cambios['eliminados']), self.ids)
+        self.assertEqual(cambios['pedidos'], [])
+
+    def test_dry_run_no_modifica_nada(self):
+        respuesta = self.client.delete('/api/pedidos/borrar_historial/?dry_run=true')
+
+        self.assertEqual((respuesta.data['pedidos'], respuesta.data['items']), (2, 3))
+        self.assertEqual(respuesta.data['stock_devuelto'], {self.productos[0].pk: 2, self.productos[1].pk: 1})
+        self.assertEqual(Pedido.objects.count(), 2)
+        self.assertEqual(self.stock(), self.STOCK - 2)
+
+    def test_tramos_y_reanudacion(self):
+        tramos = []
+        resumen = PurgeService.purgar(
+            Pedido.objects.all(), lote=1, desde_pk=self.ids[0] - 1, progreso=lambda r: tramos.append(r['ultimo_pk'])
+        )
+
+        self.assertEqual(tramos, self.ids)
+        self.assertEqual((resumen['pedidos'], resumen['items']), (2, 3))
+        # Volver a correrla con el mismo filtro no encuentra nada más
+        self.assertEqual(PurgeService.purgar(Pedido.objects.all())['pedidos'], 0)
+        self.assertEqual(self.stock(), self.STOCK)
@@ -0,0 +1,56 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from ..models import Producto, DeltaStock
+from ..services.stock_service import StockService
+from .base import BarTestCase
+
+
+@override_settings(STOCK_DIFERIDO=True)
+class StockDiferidoTests(BarTestCase):
+    """Modo STOCK_DIFERIDO: los pedidos registran DeltaStock y consolidar() los aplica."""
+
+    def despachar(self, pedido):
+        respuesta = self.client.patch(f"/api/pedidos/{pedido['id']}/", {'estado': 'despachado'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_despacho_registra_deltas_sin_tocar_producto(self):
+        self.despachar(self.crear_pedido(self.mesas[0], {0: 2}))
+        self.despachar(self.crear_pedido(self.mesas[1], {0: 3}))
+
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, self.STOCK)
+        self.assertEqual(DeltaStock.objects.count(), 2)
+        self.assertEqual(self.stock(), self.STOCK - 5)
+        self.assertEqual(self.client.get(f'/api/productos/{self.productos[0].pk}/').data['stock'], self.STOCK - 5)
+
+    def test_consolidar_stock_aplica_y_elimina_los_deltas(self):
+        self.despachar(self.crear_pedido(self.mesas[0], {0: 2, 1: 1}))
+        self.despachar(self.crear_pedido(self.mesas[1], {0: 3}))
+
+        salida = StringIO()
+        call_command('consolidar_stock', lote=2, stdout=salida)
+
+        self.assertIn('3 deltas de stock consolidados', salida.getvalue())
+        self.assertFalse(DeltaStock.objects.exists())
+        self.assertEqual(
+            list(Producto.objects.filter(pk__in=[p.pk for p in self.productos[:2]]).order_by('pk').values_list('stock', flat=True)),
+            [self.STOCK - 5, self.STOCK - 1]
+        )
+
+    def test_cancelar_devuelve_con_un_delta(self):
+        pedido = self.crear_pedido()
+        self.despachar(pedido)
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'estado': 'cancelado'}, format='json')
+
+        self.assertEqual(self.stock(), self.STOCK)
+        StockService.consolidar()
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).stock, self.STOCK)
+
+    def test_editar_stock_absoluto_consolida_antes(self):
+        self.despachar(self.crear_pedido())
+
+        respuesta = self.client.patch(f'/api/productos/{self.productos[0].pk}/', {'stock': 20}, format='json')
+
+        self.assertEqual(respuesta.data['stock'], 20)
+        self.assertFalse(DeltaStock.objects.filter(producto=self.productos[0]).exists())
+        self.assertEqual(self.stock(), 20)
@@ -0,0 +1,118 @@
+import uuid
+from unittest import mock
+from io import StringIO
+from datetime import timedelta
+from django.utils import timezone
+from django.core.management import call_command
+from ..models import Pedido, Mesa, ClaveIdempotencia
+from ..services import offline_service
+from ..services.offline_service import OfflineSyncService
+from ..services.sync_service import SyncService
+from .base import BarTestCase
+
+
+class SyncOfflineTests(BarTestCase):
+    """Subida en lote de pedidos offline por /api/pedidos/sync/ (OfflineSyncService)."""
+
+    def pedido(self, mesa, cantidades, minutos=10, **extra):
+        return {
+            'uuid': str(uuid.uuid4()),
+            'fecha_hora': (timezone.now() - timedelta(minutes=minutos)).isoformat(),
+            'mesa': mesa.pk, 'mesera': self.mesera.pk,
+            'productos': [{'producto_id': self.productos[i].pk, 'cantidad': c} for i, c in cantidades.items()],
+            **extra,
+        }
+
+    def sync(self, pedidos):
+        respuesta = self.client.post('/api/pedidos/sync/', {'pedidos': pedidos}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return [(r['estado'], r.get('pedido_id')) for r in respuesta.data['resultados']]
+
+    def test_lote_crea_y_agrega_en_orden_de_toma(self):
+        # El agregado llega primero en el lote pero se tomó después
+        agregado = self.pedido(self.mesas[0], {1: 1}, minutos=5)
+        original = self.pedido(self.mesas[0], {0: 2}, minutos=10)
+
+        (estado_agregado, id_agregado), (estado_original, id_original) = self.sync([agregado, original])
+
+        self.assertEqual((estado_original, estado_agregado), (OfflineSyncService.CREADO, OfflineSyncService.AGREGADO))
+        self.assertEqual(id_agregado, id_original)
+        pedido = Pedido.objects.get(pk=id_original)
+        self.assertEqual(sorted(pedido.items.values_list('cantidad', flat=True)), [1, 2])
+        self.assertEqual(Mesa.objects.get(pk=self.mesas[0].pk).pedido_activo_id, pedido.pk)
+
+    def test_reenviar_el_lote_no_duplica(self):
+        lote = [self.pedido(self.mesas[0], {0: 2}), self.pedido(self.mesas[1], {1: 1})]
+        primero = self.sync(lote)
+
+        segundo = self.sync(lote)
+
+        self.assertEqual(segundo, [(OfflineSyncService.DUPLICADO, pedido_id) for _, pedido_id in primero])
+        self.assertEqual(Pedido.objects.count(), 2)
+        self.assertEqual(Pedido.objects.get(pk=primero[0][1]).items.get().cantidad, 2)
+
+    def test_reenviar_despues_de_limpiar_claves_expiradas_no_duplica(self):
+        lote = [self.pedido(self.mesas[0], {0: 2})]
+        primero = self.sync(lote)
+        ClaveIdempotencia.objects.create(clave='tablet-1', huella='x', status_code=201)
+        # Un día sin conexión: la clave del lote ya superó IDEMPOTENCIA_TTL_HORAS
+        ClaveIdempotencia.objects.update(fecha=timezone.now() - timedelta(days=2))
+        call_command('limpiar_claves_idempotencia', stdout=StringIO())
+
+        self.assertFalse(ClaveIdempotencia.objects.filter(clave='tablet-1').exists())
+        self.assertEqual(self.sync(lote), [(OfflineSyncService.DUPLICADO, primero[0][1])])
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_reenvio_parcial_solo_aplica_los_nuevos(self):
+        subido = self.pedido(self.mesas[0], {0: 2})
+        self.sync([subido])
+
+        resultados = self.sync([subido, self.pedido(self.mesas[1], {1: 1})])
+
+        self.assertEqual([estado for estado, _ in resultados], [OfflineSyncService.DUPLICADO, OfflineSyncService.CREADO])
+        self.assertEqual(Pedido.objects.count(), 2)
+
+    def test_errores_por_pedido_no_detienen_el_lote(self):
+        repetido = self.pedido(self.mesas[0], {0: 1})
+        resultados = self.sync([
+            repetido,
+            repetido,
+            {**self.pedido(self.mesas[1], {0: 1}), 'mesa': 99999},
+            self.pedido(self.mesas[2], {}, productos=[{'producto_id': 99999, 'cantidad': 1}]),
+        ])
+
+        self.assertEqual(
+            [estado for estado, _ in resultados],
+            [OfflineSyncService.CREADO] + [OfflineSyncService.ERROR] * 3
+        )
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(self.stock(), self.STOCK)  # El stock se descuenta al despachar
+
+    def sync_con_pedido_en_paralelo(self, pedido):
+        """Sincroniza mientras un pedido online ocupa la mesa entre la lectura de punteros y el bloqueo."""
+        creados = []
+
+        class SyncConPedidoOnline(SyncService):
+            @staticmethod
+            def transaccion():
+                if not creados:
+                    creados.append(self.crear_pedido(self.mesas[0], {1: 1}))
+                return SyncService.transaccion()
+
+        with mock.patch.object(offline_service, 'SyncService', SyncConPedidoOnline):
+            resultados = self.sync([pedido])
+        return creados[0], resultados
+
+    def test_pedido_online_en_paralelo_recibe_los_productos(self):
+        online, resultados = self.sync_con_pedido_en_paralelo(self.pedido(self.mesas[0], {0: 2}))
+
+        self.assertEqual(resultados, [(OfflineSyncService.AGREGADO, online['id'])])
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Mesa.objects.get(pk=self.mesas[0].pk).pedido_activo_id, online['id'])
+
+    def test_pedido_online_en_paralelo_sin_force_append_no_se_pisa(self):
+        online, resultados = self.sync_con_pedido_en_paralelo(self.pedido(self.mesas[0], {0: 2}, force_append=False))
+
+        self.assertEqual(resultados, [(OfflineSyncService.ERROR, None)])
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Mesa.objects.get(pk=self.mesas[0].pk).pedido_activo_id, online['id'])
@@ -12,7 +12,8 @@ from .auth_views import (
     debug_users_view, 
     fix_users_view
 )
-from .inventory_views import ProductoViewSet, MovimientoViewSet
+from .inventory_views import ProductoViewSet, MovimientoViewSet, ConteoViewSet
 from .order_views import PedidoViewSet, PedidoFilter
-from .report_views import MeseraTotalPedidosView, ReporteVentasDiariasView, total_pedidos_mesera_hoy
+from .report_views import MeseraTotalPedidosView, ReporteVentasDiariasView, total_pedidos_mesera_hoy, tiempos_despacho
 from .mesera_views import MeseraViewSet
+from .event_views import eventos_pedidos
@@ -1,5 +1,5 @@
 from rest_framework import viewsets, permissions, generics, status
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, action
 from rest_framework.response import Response
 from django.conf import settings
 from django.core.files.storage import default_storage
@@ -8,6 +8,9 @@ import logging
 from ..models import Mesa, EmpresaConfig
 from ..serializers import MesaSerializer, EmpresaConfigSerializer
 from ..authentication import GlobalAuthentication, IsSuperUser
+from ..services.sync_service import SyncService
+from ..services.read_service import ReadService
+from django.db.models import Q
 
 logger = logging.getLogger(__name__)
 
@@ -64,25 +67,70 @@ class MesaViewSet(viewsets.ModelViewSet):
     serializer_class = MesaSerializer
     authentication_classes = [GlobalAuthentication]
 
+    def get_queryset(self):
+        """
+        Anota la ocupación actual de cada mesa en la misma query del listado.
+        """
+        return Mesa.objects.con_ocupacion().order_by('numero')
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'changes']:
             return [permissions.IsAuthenticated()]
         return [IsSuperUser()]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Con ?rapido=true arma la respuesta con ReadService, sin MesaSerializer.
+        """
+        if not ReadService.solicitada(request):
+            return super().list(request, *args, **kwargs)
+        filas = self.filter_queryset(self.get_queryset()).values(*ReadService.CAMPOS_MESA)
+        return Response(ReadService.mesas(filas))
     
     def perform_create(self, serializer):
         """Log al crear mesa"""
-        mesa = serializer.save()
+        with SyncService.transaccion():
+            mesa = serializer.save(cambio=SyncService.marca())
         logger.info(f"Mesa creada: {mesa.numero} (ID: {mesa.id})")
     
     def perform_update(self, serializer):
         """Log al actualizar mesa"""
-        mesa = serializer.save()
+        with SyncService.transaccion():
+            mesa = serializer.save(cambio=SyncService.marca())
         logger.info(f"Mesa actualizada: {mesa.numero} (ID: {mesa.id})")
     
     def perform_destroy(self, instance):
         """Log al eliminar mesa"""
         logger.warning(f"Mesa eliminada: {instance.numero} (ID: {instance.id})")
-        instance.delete()
+        with SyncService.transaccion():
+            SyncService.registrar_eliminados(SyncService.MODELO_MESA, [instance.pk])
+            instance.delete()
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """
+        Sincronización incremental de mesas: retorna las mesas cuya ocupación o datos
+        cambiaron después del cursor `since`, los IDs eliminados y el nuevo cursor.
+        """
+        cursor = SyncService.cursor_actual()
+        queryset = self.get_queryset()
+        eliminados = []
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                desde = SyncService.parse_cursor(since)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(Q(cambio__gt=desde) | Q(pedido_activo__cambio__gt=desde))
+            eliminados = SyncService.eliminados_desde(SyncService.MODELO_MESA, desde)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response({
+            "cursor": cursor,
+            "mesas": serializer.data,
+            "eliminados": eliminados
+        })
 
 
 class EmpresaConfigViewSet(viewsets.ModelViewSet):
@@ -0,0 +1,62 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.request import Request
+from ..authentication import GlobalAuthentication
+from ..services.event_service import EventService
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _autenticar(request):
+    """
+    Autentica igual que las vistas REST (GlobalAuthentication: token, sesión o basic)
+    y retorna (usuario, rol), o (None, None) si no hay credenciales válidas.
+    """
+    try:
+        user = Request(request, authenticators=[GlobalAuthentication()]).user
+    except exceptions.AuthenticationFailed:
+        return None, None
+    if not user or not user.is_authenticated:
+        return None, None
+    return user, EventService.rol(user)
+
+
+@require_GET
+async def eventos_pedidos(request):
+    """
+    Canal Server-Sent Events con los cambios de pedidos. Requiere autenticación
+    (header Authorization: Token o la cookie de sesión del login).
+    Administradores y bartenders reciben todo; los demás usuarios solo lo que
+    piden con ?mesera=<id>, ?usuario=<id> o ?mesa=<id>, y sin filtros sus propios pedidos.
+    Requiere servir la aplicación con ASGI (backend/asgi.py).
+    """
+    user, rol = await sync_to_async(_autenticar)(request)
+    if user is None:
+        return JsonResponse({"detail": "Las credenciales de autenticación no se proveyeron."}, status=401)
+
+    filtros = {
+        campo: request.GET[campo]
+        for campo in ('mesera', 'usuario', 'mesa')
+        if request.GET.get(campo)
+    }
+    if rol not in EventService.ROLES_GLOBALES and not filtros:
+        filtros['usuario'] = user.pk
+    filtros['rol'] = rol
+    logger.info(f"Suscripción a eventos de pedidos de {user.username}: {filtros}")
+
+    async def stream():
+        yield ': conectado\n\n'
+        async for message in EventService.suscribir(filtros):
+            if message is None:
+                yield ': ping\n\n'
+                continue
+            yield f"event: {message['tipo']}\ndata: {json.dumps(message, default=str)}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,8 +1,18 @@
-from rest_framework import viewsets
-from ..models import Producto, Movimiento
-from ..serializers import ProductoSerializer, MovimientoSerializer
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from ..models import Producto, Movimiento, ConteoInventario
+from ..serializers import ProductoSerializer, MovimientoSerializer, ConteoInventarioSerializer
 from ..authentication import GlobalAuthentication, IsSuperUser
+from ..pagination import MovimientoPagination
 from ..services.inventory_service import InventoryService
+from ..services.read_service import ReadService
+from ..services.stock_service import StockService
+from ..services.ledger_service import LedgerService
+from ..services.stocktake_service import StocktakeService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,15 +27,45 @@ class ProductoViewSet(viewsets.ModelViewSet):
     serializer_class = ProductoSerializer
     authentication_classes = [GlobalAuthentication]
     permission_classes = [IsSuperUser]  # Solo admin puede gestionar productos
+
+    def get_queryset(self):
+        """
+        Anota los deltas de stock pendientes para reportar el stock exacto sin N+1.
+        """
+        return Producto.objects.con_stock_pendiente().select_related('categoria_rel').order_by('-id')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Con ?rapido=true arma la respuesta con ReadService, sin ProductoSerializer.
+        """
+        if not ReadService.solicitada(request):
+            return super().list(request, *args, **kwargs)
+        filas = self.filter_queryset(self.get_queryset()).values(*ReadService.CAMPOS_PRODUCTO)
+        return Response(ReadService.productos(filas, request))
     
     def perform_create(self, serializer):
         """Log al crear producto"""
-        producto = serializer.save()
+        with transaction.atomic():
+            producto = serializer.save()
+            InventoryService.registrar_ajuste(producto, producto.stock, self.request.user)
         logger.info(f"Producto creado: {producto.nombre} (ID: {producto.id}, Stock: {producto.stock})")
     
     def perform_update(self, serializer):
         """Log al actualizar producto"""
-        producto = serializer.save()
+        with transaction.atomic():
+            anterior = None
+            if 'stock' in serializer.validated_data:
+                # El stock enviado es absoluto: consolidar antes los deltas pendientes
+                if StockService.diferido():
+                    StockService.consolidar_producto(serializer.instance.pk)
+                anterior = Producto.objects.select_for_update().values_list('stock', flat=True).get(
+                    pk=serializer.instance.pk
+                )
+            producto = serializer.save()
+            if anterior is not None:
+                InventoryService.registrar_ajuste(producto, producto.stock - anterior, self.request.user)
+        # Releer con el stock vigente para la respuesta
+        serializer.instance = self.get_queryset().get(pk=producto.pk)
         logger.info(f"Producto actualizado: {producto.nombre} (ID: {producto.id}, Stock: {producto.stock})")
     
     def perform_destroy(self, instance):
@@ -33,6 +73,33 @@ class ProductoViewSet(viewsets.ModelViewSet):
         logger.warning(f"Producto eliminado: {instance.nombre} (ID: {instance.id})")
         instance.delete()
 
+    @action(detail=True, methods=['get'], url_path='stock_en')
+    def stock_en(self, request, pk=None):
+        """
+        Stock del producto en un instante, según el libro de movimientos.
+        Query: ?fecha=AAAA-MM-DDTHH:MM[:SS][zona] (sin zona, hora local)
+        """
+        producto = self.get_object()
+        momento = parse_datetime(request.query_params.get('fecha') or '')
+        if momento is None:
+            return Response({"detail": "Se requiere 'fecha' como fecha y hora ISO."}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+
+        resultado = LedgerService.stock_en(momento, producto_ids=[producto.pk])[0]
+        return Response({**resultado, "fecha": momento})
+
+    @action(detail=False, methods=['get'], url_path='stock_cierre')
+    def stock_cierre(self, request):
+        """
+        Stock de todos los productos al cierre de una jornada.
+        Query: ?jornada=AAAA-MM-DD
+        """
+        jornada = parse_date(request.query_params.get('jornada') or '')
+        if jornada is None:
+            return Response({"detail": "Se requiere 'jornada' como AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"jornada": jornada, "productos": LedgerService.stock_al_cierre(jornada)})
+
 
 class MovimientoViewSet(viewsets.ModelViewSet):
     """
@@ -41,6 +108,7 @@ class MovimientoViewSet(viewsets.ModelViewSet):
     """
     queryset = Movimiento.objects.all().select_related('producto').order_by('-id')
     serializer_class = MovimientoSerializer
+    pagination_class = MovimientoPagination
     authentication_classes = [GlobalAuthentication]
     permission_classes = [IsSuperUser]  # Solo admin puede ver/gestionar movimientos
 
@@ -51,3 +119,61 @@ class MovimientoViewSet(viewsets.ModelViewSet):
         """
         return InventoryService.create_movement(request.data, user=request.user)
 
+    @action(detail=False, methods=['post'], url_path='lote')
+    def lote(self, request):
+        """
+        Registra varios movimientos en una sola transacción (todo o nada).
+        Body: {"movimientos": [{"producto", "tipo", "cantidad", "motivo"}, ...]}
+        """
+        return InventoryService.create_movements_batch(request.data.get('movimientos'), user=request.user)
+
+
+class ConteoViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Conteos físicos de inventario. La lógica está en StocktakeService.
+    POST /conteos/ abre uno, POST /conteos/{id}/lineas/ registra cantidades,
+    GET /conteos/{id}/diferencias/ las compara y POST /conteos/{id}/cerrar/ ajusta el stock.
+    """
+    queryset = ConteoInventario.objects.all().order_by('-id')
+    serializer_class = ConteoInventarioSerializer
+    authentication_classes = [GlobalAuthentication]
+    permission_classes = [IsSuperUser]
+
+    @staticmethod
+    def _respuesta(result):
+        if result.get("error"):
+            cuerpo = {"detail": result["error"]}
+            if result.get("errores"):
+                cuerpo["errores"] = result["errores"]
+            return Response(cuerpo, status=result["status"])
+        return Response({k: v for k, v in result.items() if k != "status"}, status=result["status"])
+
+    def create(self, request, *args, **kwargs):
+        """Abre un conteo congelando el stock actual de todos los productos."""
+        result = StocktakeService.abrir(request.data.get('notas', ''), user=request.user)
+        if result.get("error"):
+            return self._respuesta(result)
+        return Response(self.get_serializer(result["conteo"]).data, status=result["status"])
+
+    @action(detail=True, methods=['post'])
+    def lineas(self, request, pk=None):
+        """
+        Registra cantidades contadas (reemplaza las anteriores del mismo producto).
+        Body: {"lineas": [{"producto", "cantidad"}, ...]}
+        """
+        return self._respuesta(StocktakeService.registrar(pk, request.data.get('lineas'), user=request.user))
+
+    @action(detail=True, methods=['get'])
+    def diferencias(self, request, pk=None):
+        """Productos contados cuya cantidad no coincide con el stock esperado."""
+        return self._respuesta(StocktakeService.diferencias(pk))
+
+    @action(detail=True, methods=['post'])
+    def cerrar(self, request, pk=None):
+        """Cierra el conteo y aplica las diferencias como movimientos de Ajuste."""
+        return self._respuesta(StocktakeService.cerrar(pk, user=request.user))
+
+    @action(detail=True, methods=['post'])
+    def cancelar(self, request, pk=None):
+        """Descarta el conteo sin modificar el stock."""
+        return self._respuesta(StocktakeService.cancelar(pk))
@@ -1,14 +1,22 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, DateFilter
 from django_filters import rest_framework as filters
 from django.utils import timezone
 from datetime import timedelta
-from ..models import Pedido, Mesa
-from ..serializers import PedidoSerializer
+from ..models import Categoria, Pedido, Mesa
+from ..serializers import PedidoSerializer, PedidoListSerializer
 from ..authentication import GlobalAuthentication, IsSuperUser
+from ..pagination import PedidoPagination
 from ..services.order_service import OrderService
+from ..services.sync_service import SyncService
+from ..services.read_service import ReadService
+from ..services.idempotency_service import IdempotencyService
+from ..services.offline_service import OfflineSyncService
+from ..services.purge_service import PurgeService
+from ..services.station_service import StationService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,7 +24,7 @@ logger = logging.getLogger(__name__)
 
 # --- Crear un FilterSet para Pedido ---
 class PedidoFilter(FilterSet):
-    fecha = DateFilter(field_name='fecha_hora__date')
+    fecha = DateFilter(field_name='jornada')
     mesera = filters.NumberFilter(field_name='mesera_id')
     usuario = filters.NumberFilter(field_name='usuario_id')
     sistema = filters.BooleanFilter(method='filter_sistema')
@@ -35,28 +43,85 @@ class PedidoViewSet(viewsets.ModelViewSet):
     serializer_class = PedidoSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = PedidoFilter
+    pagination_class = PedidoPagination
     authentication_classes = [GlobalAuthentication]
 
+    def get_serializer_class(self):
+        """
+        ?vista=compacta usa la representación liviana en los listados.
+        """
+        if self.action in ['list', 'changes'] and self.request.query_params.get('vista') == 'compacta':
+            return PedidoListSerializer
+        return PedidoSerializer
+
     def get_queryset(self):
         """
         Retorna el queryset base para los pedidos.
         El filtrado real lo hace DjangoFilterBackend con PedidoFilter.
+        Solo hace joins y prefetch de lo que la respuesta realmente va a serializar.
+        """
+        queryset = Pedido.objects.all().order_by('-fecha_hora').select_related('mesa')
+        if self.request.method != 'GET':
+            return queryset.select_related('mesera', 'usuario').prefetch_related('items', 'items__producto')
+
+        campos = set(self.get_serializer().fields)
+        if 'mesera_nombre' in campos:
+            queryset = queryset.select_related('mesera', 'usuario')
+        if 'productos_detalle' in campos:
+            queryset = queryset.prefetch_related('items', 'items__producto')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Con ?rapido=true arma la respuesta con ReadService desde filas .values(),
+        con el mismo JSON que PedidoSerializer. Respeta filtros y paginación.
+        """
+        if not ReadService.solicitada(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        filas = queryset.values(*ReadService.CAMPOS_PEDIDO)
+        page = self.paginate_queryset(filas)
+        if page is not None:
+            return self.get_paginated_response(ReadService.pedidos(page))
+        return Response(ReadService.pedidos(filas))
+
+    def perform_create(self, serializer):
+        """
+        Crea el pedido y lo registra como activo en su mesa usando OrderService.
         """
-        return Pedido.objects.all().order_by('-fecha_hora').select_related('mesera', 'usuario', 'mesa').prefetch_related('items', 'items__producto')
+        OrderService.create_order(serializer)
 
     def perform_update(self, serializer):
         """
-        Maneja actualizaciones de estado usando OrderService.
+        Maneja actualizaciones usando OrderService. El cambio de estado es un
+        compare-and-swap: si otro dispositivo lo cambió antes, responde 409 con
+        el estado actual. El cliente puede enviar `version` para exigir además
+        que el pedido no haya cambiado desde su última lectura.
         """
-        previous_estado = serializer.instance.estado
-        instance = serializer.save()
-        OrderService.process_order_update(instance, previous_estado)
+        version = self.request.data.get('version')
+        if version is not None:
+            try:
+                version = int(version)
+            except (TypeError, ValueError):
+                raise ValidationError({"version": "Debe ser un número entero."})
+        OrderService.update_order(serializer, version=version)
 
+    def perform_destroy(self, instance):
+        """
+        Elimina el pedido liberando su mesa usando OrderService.
+        """
+        OrderService.delete_order(instance)
 
     def create(self, request, *args, **kwargs):
         """
         Crea un nuevo pedido o agrega productos a uno existente si 'force_append' es True.
+        Con el header Idempotency-Key los reintentos reciben la respuesta original
+        sin crear ni agregar nada otra vez.
         """
+        return IdempotencyService.ejecutar(request, lambda: self._crear(request, *args, **kwargs))
+
+    def _crear(self, request, *args, **kwargs):
         force_append = request.data.get('force_append', False)
         mesa_id = request.data.get('mesa')
 
@@ -75,12 +140,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
         
         # CASO 2: Validar que no exista pedido duplicado (solo si NO es force_append)
         if mesa_id and not force_append:
-            today = timezone.localdate()
-            pedido_existente = Pedido.objects.filter(
-                mesa_id=mesa_id,
-                fecha_hora__date=today,
-                estado__in=OrderService.ESTADOS_ACTIVOS
-            ).select_related('mesa').first()
+            pedido_existente = OrderService.get_pedido_activo(mesa_id)
             
             if pedido_existente:
                 mesa_numero = pedido_existente.mesa.numero if pedido_existente.mesa else mesa_id
@@ -103,13 +163,105 @@ class PedidoViewSet(viewsets.ModelViewSet):
         return super().create(request, *args, **kwargs)
 
 
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """
+        Sincronización incremental: retorna los pedidos creados o modificados y los
+        IDs eliminados después del cursor `since`, junto con el nuevo cursor.
+        Sin `since` retorna el listado completo. Respeta los filtros de PedidoFilter.
+        """
+        cursor = SyncService.cursor_actual()
+        queryset = self.filter_queryset(self.get_queryset())
+        eliminados = []
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                desde = SyncService.parse_cursor(since)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(cambio__gt=desde)
+            eliminados = SyncService.eliminados_desde(SyncService.MODELO_PEDIDO, desde)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response({
+            "cursor": cursor,
+            "pedidos": serializer.data,
+            "eliminados": eliminados
+        })
+
+    @action(detail=False, methods=['get'], url_path='cola')
+    def cola(self, request):
+        """
+        Cola de trabajo de una estación: items con unidades por despachar de pedidos
+        abiertos, del más antiguo al más reciente.
+        Query: ?estacion=barra|barra_vip|cocina
+        """
+        estacion = request.query_params.get('estacion', Categoria.ESTACION_DEFECTO)
+        if not StationService.es_valida(estacion):
+            return Response(
+                {"detail": f"Estación inválida. Opciones: {', '.join(dict(Categoria.ESTACIONES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"estacion": estacion, "items": StationService.cola(estacion)})
+
+    @action(detail=False, methods=['post'], url_path='sync')
+    def sync(self, request):
+        """
+        Sube en lote los pedidos tomados sin conexión.
+        Body: {"pedidos": [{"uuid", "fecha_hora", "mesa", "mesera"|"usuario",
+        "productos": [{"producto_id", "cantidad"}], "force_append"}, ...]}
+        Retorna un resultado por pedido (creado, agregado, duplicado o error).
+        Reenviar el mismo lote es seguro: los pedidos ya subidos salen como duplicados.
+        """
+        pedidos = request.data.get('pedidos')
+        if not isinstance(pedidos, list) or not pedidos:
+            return Response({"detail": "Se requiere una lista 'pedidos' no vacía"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = OfflineSyncService.sincronizar(pedidos)
+
+        if result.get("error"):
+            return Response({"detail": result["error"]}, status=result["status"])
+
+        return Response({"resultados": result["resultados"]}, status=result["status"])
+
     @action(detail=False, methods=['delete'], url_path='borrar_historial')
     def borrar_historial(self, request, *args, **kwargs):
         """
-        Elimina los pedidos que coinciden con los filtros de mesera y/o fecha.
+        Elimina los pedidos que coinciden con los filtros de PedidoFilter (mesera, fecha...)
+        y devuelve el stock despachado, por tramos cortos (ver PurgeService).
+        Con ?dry_run=true solo informa cuántos pedidos y cuánto stock se verían afectados.
         """
-        queryset = self.get_queryset()
-        return OrderService.delete_order_history(queryset)
+        queryset = self.filter_queryset(Pedido.objects.all())
+        if not queryset.exists():
+            return Response(
+                {"detail": "No hay pedidos que coincidan con los filtros para eliminar."}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        dry_run = request.query_params.get('dry_run') == 'true'
+        try:
+            resumen = PurgeService.purgar(queryset, dry_run=dry_run)
+        except Exception as e:
+            # Los tramos ya confirmados quedan eliminados; repetir la petición continúa la purga
+            logger.error(f"Error al intentar borrar el historial de pedidos: {e}", exc_info=True)
+            return Response(
+                {"detail": "Ocurrió un error al eliminar el historial. Repite la operación para continuar."}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if dry_run:
+            return Response({
+                "detail": f"Se eliminarían {resumen['pedidos']} pedidos.",
+                "pedidos": resumen['pedidos'],
+                "items": resumen['items'],
+                "stock_devuelto": resumen['stock_devuelto']
+            }, status=status.HTTP_200_OK)
+
+        return Response(
+            {"detail": f"Se eliminaron {resumen['pedidos']} pedidos exitosamente y se restauró el stock."}, 
+            status=status.HTTP_200_OK
+        )
 
     @action(detail=True, methods=['post'], url_path='despachar_producto')
     def despachar_producto(self, request, pk=None):
@@ -130,3 +282,29 @@ class PedidoViewSet(viewsets.ModelViewSet):
             
         return Response({"detail": result["detail"], "pedido_estado": result["pedido_estado"]}, status=result["status"])
 
+
+    @action(detail=False, methods=['post'], url_path='despachar_lote')
+    def despachar_lote(self, request):
+        """
+        Despacha varios productos, de uno o más pedidos, en una sola petición.
+        Body: {"items": [{"pedido": <id>, "item_id": <id>}, ...]}
+        Retorna el resultado por item y el estado final de cada pedido.
+        """
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Se requiere una lista 'items' no vacía"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            pares = [(int(item['pedido']), int(item['item_id'])) for item in items]
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"detail": "Cada item requiere 'pedido' e 'item_id' numéricos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = OrderService.despachar_lote(pares)
+
+        if result.get("error"):
+            return Response({"detail": result["error"]}, status=result["status"])
+
+        return Response({"resultados": result["resultados"], "pedidos": result["pedidos"]}, status=result["status"])
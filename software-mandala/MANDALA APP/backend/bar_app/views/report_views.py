@@ -1,4 +1,5 @@
-from rest_framework import generics
+from django.utils.dateparse import parse_date
+from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from ..serializers import MeseraTotalPedidosSerializer
@@ -49,3 +50,16 @@ def total_pedidos_mesera_hoy(request):
     return Response(resultado)
 
 
+
+
+@api_view(['GET'])
+def tiempos_despacho(request):
+    """
+    Percentiles de espera de los productos por estación, hora y vendedor.
+    Query: ?fecha=AAAA-MM-DD (por defecto la jornada actual)
+    """
+    fecha_str = request.query_params.get('fecha')
+    fecha = parse_date(fecha_str) if fecha_str else None
+    if fecha_str and fecha is None:
+        return Response({"detail": "Fecha inválida. Usa AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ReportService.get_tiempos_despacho(fecha))
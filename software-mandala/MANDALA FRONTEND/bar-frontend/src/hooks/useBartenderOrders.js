@@ -16,7 +16,7 @@ export const useBartenderOrders = () => {
     } = useQuery({
         queryKey: ['pedidos', 'pendiente'],
         queryFn: async () => {
-            const response = await apiClient.get('/pedidos/?estado=pendiente');
+            const response = await apiClient.get('/pedidos/?estado=pendiente&paginar=false');
             return response.data;
         },
         refetchInterval: 30000, // Auto-refresh every 30 seconds
@@ -2,6 +2,9 @@ import React, { useState, useEffect, useCallback } from 'react';
 import apiClient from '../utils/apiClient';
 import toast from 'react-hot-toast';
 
+// Máximo que acepta la paginación de /pedidos/ (KeysetPagination.max_page_size)
+const PAGE_SIZE = 200;
+
 /**
  * Hook to manage order history logic, filtering, and printing.
  */
@@ -56,9 +59,19 @@ export const useHistorialPedidos = () => {
                 }
             }
             if (fechaSeleccionada) params.append('fecha', fechaSeleccionada);
-            
-            const response = await apiClient.get(`/pedidos/?${params.toString()}`);
-            setPedidos(Array.isArray(response.data) ? response.data : []);
+            // Sin fecha el historial de un vendedor puede superar el límite de ?paginar=false:
+            // se recorren las páginas siguiendo el cursor de `next`
+            params.append('page_size', PAGE_SIZE);
+
+            const todos = [];
+            let cursor = null;
+            do {
+                if (cursor) params.set('cursor', cursor);
+                const response = await apiClient.get(`/pedidos/?${params.toString()}`);
+                todos.push(...(response.data?.results || []));
+                cursor = response.data?.next ? new URL(response.data.next).searchParams.get('cursor') : null;
+            } while (cursor);
+            setPedidos(todos);
         } catch (error) {
             console.error('Error loading orders:', error);
             setPedidos([]);
@@ -23,7 +23,7 @@ export const useMisPedidos = (userId, role) => {
                 // Si es admin/bartender usamos el filtro 'usuario', si es mesera usamos 'mesera'
                 const filterParam = isSystemUser ? `usuario=${userId}` : `mesera=${userId}`;
 
-                const response = await axios.get(`${API_URL}/pedidos/?${filterParam}&fecha=${hoy}`);
+                const response = await axios.get(`${API_URL}/pedidos/?${filterParam}&fecha=${hoy}&paginar=false`);
                 const sorted = response.data.sort((a, b) => new Date(b.fecha_hora) - new Date(a.fecha_hora));
                 setPedidos(sorted);
             } catch (error) {
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import apiClient from '../utils/apiClient';
 
 /**
@@ -9,6 +9,9 @@ export const usePedido = () => {
     const [selectedMesaId, setSelectedMesaId] = useState('');
     const [isTableLocked, setIsTableLocked] = useState(false);
     const [isLoadingMesas, setIsLoadingMesas] = useState(true);
+    // Idempotency-Key del último envío: si se reintenta el mismo pedido (p. ej. tras
+    // un timeout que sí llegó al servidor) se reutiliza y el backend no lo duplica
+    const idempotencia = useRef({ payload: null, key: null });
 
     const fetchMesas = useCallback(async () => {
         try {
@@ -36,7 +39,14 @@ export const usePedido = () => {
 
     const finalizarPedido = useCallback(async (pedidoData) => {
         try {
-            await apiClient.post('/pedidos/', pedidoData);
+            const payload = JSON.stringify(pedidoData);
+            if (idempotencia.current.payload !== payload) {
+                idempotencia.current = { payload, key: crypto.randomUUID() };
+            }
+            await apiClient.post('/pedidos/', pedidoData, {
+                headers: { 'Idempotency-Key': idempotencia.current.key }
+            });
+            idempotencia.current = { payload: null, key: null };
             return { success: true, message: "¡Pedido finalizado y guardado con éxito!" };
         } catch (error) {
             console.error("Error finalizing order:", error.response?.data || error.message);